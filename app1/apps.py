@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class App1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app1'
+
+    def ready(self):
+        from . import qr_firmado, routers, signals  # noqa: F401
+        qr_firmado.comprobar_claves()
+        routers.comprobar_cache()
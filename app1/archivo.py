@@ -0,0 +1,108 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Asistencia, AsistenciaArchivada, MarcaResumen
+from . import resumenes
+
+# --------------------------
+# Archivo de asistencias
+#
+# Las asistencias de semestres cerrados (enero-junio, julio-diciembre) pasan de Asistencia
+# a AsistenciaArchivada, mes por mes y de la más antigua a la más reciente, así que todo lo
+# archivado es anterior a lo que queda en Asistencia. En PostgreSQL cada mes es una
+# partición que se crea antes de copiar sus filas; una consulta con rango de fechas solo
+# lee las particiones de ese rango. En otros motores el archivo es una tabla normal y el
+# índice (usuario, fecha_registro, id) cumple el mismo papel.
+#
+# Los contadores del dashboard y los resúmenes incluyen el archivo: mover filas no los
+# cambia y borrar un usuario o evento descuenta también sus asistencias archivadas.
+
+COLUMNAS = ['id', 'usuario_id', 'evento_id', 'punto_id', 'fecha_registro', 'metodo', 'estado']
+
+
+def inicio_semestre(fecha):
+    return fecha.replace(month=1 if fecha.month <= 6 else 7, day=1)
+
+
+def _mes_siguiente(mes):
+    return (mes.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _medianoche(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time()))
+
+
+def crear_particion(mes):
+    if connection.vendor != 'postgresql':
+        return
+    tabla = AsistenciaArchivada._meta.db_table
+    particion = connection.ops.quote_name(f'{tabla}_{mes:%Y_%m}')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {particion} PARTITION OF {connection.ops.quote_name(tabla)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [_medianoche(mes), _medianoche(_mes_siguiente(mes))],
+        )
+
+
+def _mover(ids):
+    # Copia y borra en SQL: el borrado no pasa por las signals, así que los contadores
+    # (que incluyen el archivo) no cambian
+    origen = connection.ops.quote_name(Asistencia._meta.db_table)
+    destino = connection.ops.quote_name(AsistenciaArchivada._meta.db_table)
+    columnas = ', '.join(COLUMNAS)
+    marcadores = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {destino} ({columnas}) SELECT {columnas} FROM {origen} WHERE id IN ({marcadores})', ids,
+        )
+        cursor.execute(f'DELETE FROM {origen} WHERE id IN ({marcadores})', ids)
+
+
+def archivar(hasta=None, chunk=None):
+    # Mueve las asistencias anteriores a `hasta` (inicio de un semestre); devuelve cuántas
+    hasta = inicio_semestre(hasta or timezone.localdate())
+    chunk = chunk or settings.ARCHIVO_CHUNK
+
+    # Los resúmenes avanzan por id sobre Asistencia: lo que aún no sumaron no se mueve
+    resumenes.actualizar()
+    marca = MarcaResumen.objects.filter(nombre=resumenes.MARCA).values_list('ultimo_id', flat=True).first() or 0
+    pendientes = Asistencia.objects.filter(fecha_registro__lt=_medianoche(hasta), id__lte=marca)
+    primera = pendientes.aggregate(primera=Min('fecha_registro'))['primera']
+    if primera is None:
+        return 0
+
+    movidas = 0
+    mes = timezone.localdate(primera).replace(day=1)
+    while mes < hasta:
+        crear_particion(mes)
+        del_mes = pendientes.filter(
+            fecha_registro__gte=_medianoche(mes), fecha_registro__lt=_medianoche(_mes_siguiente(mes)),
+        ).order_by('id').values_list('id', flat=True)
+        while True:
+            ids = list(del_mes[:chunk])
+            if not ids:
+                break
+            with transaction.atomic():
+                _mover(ids)
+            movidas += len(ids)
+        mes = _mes_siguiente(mes)
+    return movidas
+
+
+def historial(usuario, desde=None, hasta=None):
+    # Fuentes del historial de un usuario en orden descendente: primero Asistencia y luego
+    # el archivo, que solo se consulta si la página no se llenó con la primera
+    rango = {}
+    if desde is not None:
+        rango['fecha_registro__gte'] = desde
+    if hasta is not None:
+        rango['fecha_registro__lt'] = hasta
+    return [
+        Asistencia.objects.filter(usuario=usuario, **rango),
+        AsistenciaArchivada.objects.filter(usuario=usuario, **rango),
+    ]
@@ -0,0 +1,122 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import routers
+from .models import User
+
+# --------------------------
+# Autenticación JWT sin consultar la tabla de usuarios en cada petición
+#
+# JWTCacheAuthentication (por defecto) guarda el usuario en cache durante
+# AUTENTICACION_CACHE_TTL segundos; los signals de User lo invalidan al editar o
+# eliminar, así que una desactivación tarda como mucho ese TTL en los demás procesos.
+# JWTClaimsAuthentication no lee nada: confía en id, rol e is_active firmados en el
+# token, y una desactivación solo se aplica cuando el access token expira.
+
+
+def emitir_tokens(user):
+    refresh = RefreshToken.for_user(user)
+    # El access token hereda estos claims del refresh
+    refresh['rol'] = user.rol
+    refresh['is_active'] = user.is_active
+    return refresh
+
+
+def clave_usuario(usuario_id):
+    return f'autenticacion:usuario:{usuario_id}'
+
+
+def invalidar_usuario(usuario_id):
+    caches[settings.AUTENTICACION_CACHE].delete(clave_usuario(usuario_id))
+
+
+def usuario_completo(user):
+    # Con JWTClaimsAuthentication request.user solo trae id, rol e is_active
+    if getattr(user, 'desde_token', False):
+        return User.objects.get(pk=user.pk)
+    return user
+
+
+async def ausuario_completo(user):
+    if getattr(user, 'desde_token', False):
+        return await User.objects.aget(pk=user.pk)
+    return user
+
+
+async def aautenticar(request):
+    # Equivalente asíncrono de la autenticación de DRF para las vistas de app1.views_async;
+    # usa la primera clase de DEFAULT_AUTHENTICATION_CLASSES. Devuelve None sin credenciales
+    autenticador = drf_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+    header = autenticador.get_header(request)
+    if header is None:
+        return None
+    raw_token = autenticador.get_raw_token(header)
+    if raw_token is None:
+        return None
+    validated_token = autenticador.get_validated_token(raw_token)
+    if hasattr(autenticador, 'aget_user'):
+        return await autenticador.aget_user(validated_token)
+    return await sync_to_async(autenticador.get_user)(validated_token)
+
+
+def _verificar_activo(user):
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("Usuario inactivo", code="user_inactive")
+    return user
+
+
+def _id_usuario(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("El token no identifica a ningún usuario")
+
+
+class JWTCacheAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        usuario_id = _id_usuario(validated_token)
+        cache = caches[settings.AUTENTICACION_CACHE]
+        user = cache.get(clave_usuario(usuario_id))
+        if user is None:
+            # De la primaria: lo leído de una réplica atrasada quedaría en cache todo el TTL
+            with routers.primaria():
+                user = super().get_user(validated_token)
+            cache.set(clave_usuario(usuario_id), user, settings.AUTENTICACION_CACHE_TTL)
+        return _verificar_activo(user)
+
+    async def aget_user(self, validated_token):
+        usuario_id = _id_usuario(validated_token)
+        cache = caches[settings.AUTENTICACION_CACHE]
+        user = await cache.aget(clave_usuario(usuario_id))
+        if user is None:
+            try:
+                with routers.primaria():
+                    user = await User.objects.aget(pk=usuario_id)
+            except User.DoesNotExist:
+                raise AuthenticationFailed("Usuario no encontrado", code="user_not_found")
+            await cache.aset(clave_usuario(usuario_id), user, settings.AUTENTICACION_CACHE_TTL)
+        return _verificar_activo(user)
+
+
+class JWTClaimsAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        usuario_id = _id_usuario(validated_token)
+        if 'rol' not in validated_token:
+            # Token emitido antes de incluir los claims: se resuelve contra la base de datos
+            return super().get_user(validated_token)
+        # simplejwt guarda el id como texto en el token
+        user = User(pk=User._meta.pk.to_python(usuario_id), rol=validated_token['rol'], is_active=validated_token.get('is_active', True))
+        user._state.adding = False
+        user.desde_token = True
+        return _verificar_activo(user)
+
+    async def aget_user(self, validated_token):
+        if 'rol' not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+        return self.get_user(validated_token)
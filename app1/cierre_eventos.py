@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import User, Asistencia
+from .registro_asistencias import COLUMNAS
+from .signals import creacion_masiva
+
+# --------------------------
+# Cierre de eventos: materializa las ausencias
+#
+# Los participantes esperados son los usuarios activos con uno de los roles pedidos, de la
+# jornada del evento (un evento mixto o sin jornada abarca todas) y, si se indican, de las
+# fichas pedidas. Cada bloque de CIERRE_CHUNK participantes (por id) se inserta con una
+# sola sentencia INSERT ... SELECT ... WHERE NOT EXISTS que excluye a quienes ya tienen
+# asistencia en el evento. ON CONFLICT DO NOTHING y la restricción asistencia_unica_sin_punto
+# hacen que repetir el cierre, o un registro simultáneo, no duplique filas.
+
+ROLES = ('Aprendiz',)
+
+
+def participantes(evento, fichas=None, roles=ROLES, jornadas=None):
+    # Sin jornadas explícitas se usa la del evento
+    usuarios = User.objects.filter(is_active=True, rol__in=roles)
+    if jornadas:
+        usuarios = usuarios.filter(jornada__in=jornadas)
+    elif evento.jornada and evento.jornada != 'mixto':
+        usuarios = usuarios.filter(jornada__in=[evento.jornada, 'mixto'])
+    if fichas:
+        usuarios = usuarios.filter(ficha__in=fichas)
+    return usuarios
+
+
+def _insertar_ausentes(evento, usuarios):
+    tabla = connection.ops.quote_name(Asistencia._meta.db_table)
+    faltantes = (
+        usuarios.annotate(registrada=Exists(Asistencia.objects.filter(evento=evento, usuario=OuterRef('pk'))))
+        .filter(registrada=False)
+        .values(usuario_id=F('pk'))
+    )
+    seleccion, params = faltantes.query.sql_with_params()
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    # "WHERE TRUE" evita que SQLite lea ON CONFLICT como parte del FROM
+    sql = (
+        f'INSERT INTO {tabla} ({", ".join(COLUMNAS[1:])}) '
+        f"SELECT faltante.usuario_id, %s, NULL, %s, 'manual', 'ausente', NULL FROM ({seleccion}) faltante WHERE TRUE "
+        f'ON CONFLICT DO NOTHING RETURNING {", ".join(COLUMNAS)}'
+    )
+    return list(Asistencia.objects.raw(sql, [evento.pk, ahora, *params]))
+
+
+def cerrar(evento, fichas=None, roles=ROLES, chunk=None):
+    # Desactiva el evento y devuelve cuántas ausencias se registraron
+    chunk = chunk or settings.CIERRE_CHUNK
+    if evento.activo:
+        evento.activo = False
+        evento.save(update_fields=['activo'])
+
+    candidatos = participantes(evento, fichas, roles).order_by('pk')
+    registradas = 0
+    desde = 0
+    while True:
+        # Límite superior del bloque por id; el último bloque queda abierto
+        limite = candidatos.filter(pk__gt=desde).values_list('pk', flat=True)[chunk - 1:chunk].first()
+        bloque = candidatos.filter(pk__gt=desde)
+        if limite is not None:
+            bloque = bloque.filter(pk__lte=limite)
+        with transaction.atomic():
+            ausentes = _insertar_ausentes(evento, bloque.order_by())
+            if ausentes:
+                creacion_masiva.send(sender=Asistencia, instancias=ausentes)
+        registradas += len(ausentes)
+        if limite is None:
+            return registradas
+        desde = limite
@@ -0,0 +1,85 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import User, Evento, Asistencia, AsistenciaArchivada, Estadisticas, AsistenciasPorDia
+
+# --------------------------
+# Contadores del dashboard
+#
+# Se actualizan con UPDATE ... SET campo = campo + n en la misma transacción que el
+# cambio que los origina. El comando recalcular_estadisticas los reconstruye desde cero.
+#
+# Costo: cada asistencia nueva actualiza la única fila de Estadisticas y la fila del día
+# en AsistenciasPorDia, y sus bloqueos duran hasta el final de la transacción. Los
+# registros simultáneos se serializan en esas dos filas, por eso la transacción de
+# registro_asistencias termina apenas se insertan (el lote suma todo en una sola
+# actualización). Si el volumen de escaneos lo exige, el paso siguiente es repartir el
+# contador en N filas por fecha y sumarlas al leer.
+
+ID_ESTADISTICAS = 1
+
+
+def actualizar(**deltas):
+    cambios = {campo: F(campo) + delta for campo, delta in deltas.items() if delta}
+    if not cambios:
+        return
+    if not Estadisticas.objects.filter(pk=ID_ESTADISTICAS).update(**cambios):
+        # Sin fila todavía: los conteos en vivo ya incluyen el cambio actual
+        guardar(contar())
+
+
+def sumar_asistencias(fechas_registro, signo=1):
+    por_dia = Counter(timezone.localdate(fecha) for fecha in fechas_registro)
+    if not por_dia:
+        return
+    actualizar(total_asistencias=signo * sum(por_dia.values()))
+
+    tabla = connection.ops.quote_name(AsistenciasPorDia._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (fecha, total) VALUES (%s, %s) '
+            f'ON CONFLICT (fecha) DO UPDATE SET total = {tabla}.total + EXCLUDED.total',
+            [(connection.ops.adapt_datefield_value(fecha), signo * total) for fecha, total in por_dia.items()],
+        )
+
+
+def contar():
+    return {
+        'total_usuarios': User.objects.count(),
+        'total_aprendices': User.objects.filter(rol='Aprendiz').count(),
+        'total_eventos': Evento.objects.count(),
+        'eventos_activos': Evento.objects.filter(activo=True).count(),
+        # Las asistencias archivadas (app1.archivo) siguen contando
+        'total_asistencias': Asistencia.objects.count() + AsistenciaArchivada.objects.count(),
+    }
+
+
+def contar_por_dia():
+    por_dia = Counter()
+    for modelo in (Asistencia, AsistenciaArchivada):
+        for fila in modelo.objects.annotate(fecha=TruncDate('fecha_registro')).values('fecha').annotate(total=Count('id')).order_by():
+            por_dia[fila['fecha']] += fila['total']
+    return dict(por_dia)
+
+
+def guardar(conteos, por_dia=None):
+    with transaction.atomic():
+        Estadisticas.objects.update_or_create(pk=ID_ESTADISTICAS, defaults=conteos)
+        if por_dia is not None:
+            AsistenciasPorDia.objects.all().delete()
+            AsistenciasPorDia.objects.bulk_create(
+                AsistenciasPorDia(fecha=fecha, total=total) for fecha, total in por_dia.items()
+            )
+
+
+def leer(fecha):
+    return Estadisticas.objects.annotate(
+        asistencias_del_dia=Coalesce(
+            Subquery(AsistenciasPorDia.objects.filter(fecha=fecha).values('total')[:1]),
+            Value(0),
+        )
+    ).filter(pk=ID_ESTADISTICAS).first()
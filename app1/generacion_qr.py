@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import QR
+from .signals import creacion_masiva
+from . import qr_firmado
+
+# --------------------------
+# Generación masiva de QR de un evento
+#
+# Los usuarios elegibles sin QR para el evento se leen por bloques de GENERACION_QR_CHUNK
+# (anti-join con NOT EXISTS) y cada bloque se inserta con un solo INSERT de varias filas.
+# ON CONFLICT DO NOTHING sobre la restricción qr_unico_por_evento descarta a quien
+# generó su QR al mismo tiempo por GenerarQRView, así que repetir la operación es seguro.
+# Un QR desactivado o expirado cuenta como existente: no se crea otro para ese usuario.
+
+COLUMNAS = ['usuario_id', 'evento_id', 'codigo', 'fecha_creacion', 'activo']
+
+
+def _insertar(evento, usuario_ids, ahora):
+    tabla = connection.ops.quote_name(QR._meta.db_table)
+    ahora = connection.ops.adapt_datetimefield_value(ahora)
+    filas, valores = [], []
+    for usuario_id in usuario_ids:
+        filas.append('(%s, %s, %s, %s, %s)')
+        valores += [usuario_id, evento.pk, qr_firmado.emitir(usuario_id, evento.pk), ahora, True]
+    sql = (
+        f'INSERT INTO {tabla} ({", ".join(COLUMNAS)}) VALUES {", ".join(filas)} '
+        f'ON CONFLICT DO NOTHING RETURNING id, {", ".join(COLUMNAS)}'
+    )
+    return list(QR.objects.raw(sql, valores))
+
+
+def generar(evento, usuarios, chunk=None):
+    # Devuelve el conjunto de ids de los QR que insertó esta llamada
+    chunk = chunk or settings.GENERACION_QR_CHUNK
+    ahora = timezone.now()
+    pendientes = (
+        usuarios.annotate(tiene_qr=Exists(QR.objects.filter(evento=evento, usuario=OuterRef('pk'))))
+        .filter(tiene_qr=False).order_by('pk').values_list('pk', flat=True)
+    )
+    creados = set()
+    desde = 0
+    while True:
+        ids = list(pendientes.filter(pk__gt=desde)[:chunk])
+        if not ids:
+            return creados
+        with transaction.atomic():
+            qrs = _insertar(evento, ids, ahora)
+            if qrs:
+                creacion_masiva.send(sender=QR, instancias=qrs)
+        creados.update(qr.pk for qr in qrs)
+        desde = ids[-1]
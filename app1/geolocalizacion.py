@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import PuntoDeControl
+
+# --------------------------
+# Índice espacial de puntos de control para el registro por GPS
+#
+# Por cada evento se arma en memoria una grilla de celdas del tamaño del radio de
+# búsqueda; una coordenada solo se compara con los puntos de su celda y de las ocho
+# vecinas. El índice se reconstruye cuando cambia un punto del evento (signals) o
+# cuando cumple GPS_INDICE_TTL segundos, que acota el desfase entre procesos.
+
+RADIO_TIERRA_METROS = 6371008.8
+METROS_POR_GRADO = 111320.0
+
+
+class IndiceEspacial:
+    def __init__(self, puntos, radio_metros):
+        self.radio = radio_metros
+        self.creado = time.monotonic()
+        latitudes = [float(punto['latitud']) for punto in puntos] or [0.0]
+        # Alto de celda fijo en grados de latitud; el ancho se corrige por la latitud media
+        self.alto = radio_metros / METROS_POR_GRADO
+        self.ancho = self.alto / max(math.cos(math.radians(sum(latitudes) / len(latitudes))), 0.01)
+        self.celdas = defaultdict(list)
+        for punto in puntos:
+            latitud, longitud = float(punto['latitud']), float(punto['longitud'])
+            self.celdas[self._celda(latitud, longitud)].append(
+                (punto['id'], math.radians(latitud), math.radians(longitud), math.cos(math.radians(latitud)))
+            )
+
+    def _celda(self, latitud, longitud):
+        return math.floor(latitud / self.alto), math.floor(longitud / self.ancho)
+
+    def candidatos(self, latitud, longitud):
+        fila, columna = self._celda(latitud, longitud)
+        for df in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                yield from self.celdas.get((fila + df, columna + dc), ())
+
+    def cercano(self, latitud, longitud):
+        candidatos = list(self.candidatos(latitud, longitud))
+        if not candidatos:
+            return None
+        distancias = distancias_haversine(math.radians(latitud), math.radians(longitud), candidatos)
+        distancia, punto_id = min(zip(distancias, (candidato[0] for candidato in candidatos)))
+        if distancia > self.radio:
+            return None
+        return {'id': punto_id, 'distancia': distancia}
+
+
+def distancias_haversine(latitud, longitud, candidatos):
+    # Distancia en metros desde (latitud, longitud) en radianes a todos los candidatos de una pasada.
+    # Es un ciclo escalar a propósito: la grilla deja unos pocos candidatos (los puntos de nueve
+    # celdas del tamaño del radio) y con tan pocos elementos armar arreglos de numpy cuesta más
+    # que el cálculo; además numpy no es dependencia del proyecto. Lo que se vectoriza es el
+    # trabajo fijo: el coseno de cada punto se calcula al armar el índice y el de la coordenada
+    # una sola vez por consulta
+    cos_latitud = math.cos(latitud)
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    return [
+        2 * RADIO_TIERRA_METROS * asin(sqrt(
+            sin((lat - latitud) / 2) ** 2 + cos_latitud * cos_lat * sin((lon - longitud) / 2) ** 2
+        ))
+        for _, lat, lon, cos_lat in candidatos
+    ]
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def obtener_indice(evento_id):
+    indice = _indices.get(evento_id)
+    if indice is None or time.monotonic() - indice.creado > settings.GPS_INDICE_TTL:
+        with _lock:
+            indice = _indices.get(evento_id)
+            if indice is None or time.monotonic() - indice.creado > settings.GPS_INDICE_TTL:
+                puntos = PuntoDeControl.objects.filter(evento_id=evento_id, activo=True).values('id', 'latitud', 'longitud')
+                indice = IndiceEspacial(list(puntos), settings.GPS_RADIO_METROS)
+                _indices[evento_id] = indice
+    return indice
+
+
+def punto_cercano(evento_id, latitud, longitud):
+    return obtener_indice(evento_id).cercano(latitud, longitud)
+
+
+async def apunto_cercano(evento_id, latitud, longitud):
+    indice = _indices.get(evento_id)
+    if indice is None or time.monotonic() - indice.creado > settings.GPS_INDICE_TTL:
+        # Dos reconstrucciones simultáneas del mismo evento solo repiten la consulta
+        puntos = PuntoDeControl.objects.filter(evento_id=evento_id, activo=True).values('id', 'latitud', 'longitud')
+        indice = IndiceEspacial([punto async for punto in puntos], settings.GPS_RADIO_METROS)
+        _indices[evento_id] = indice
+    return indice.cercano(latitud, longitud)
+
+
+def invalidar(evento_id):
+    _indices.pop(evento_id, None)
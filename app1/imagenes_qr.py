@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import segno
+from django.conf import settings
+
+# --------------------------
+# Imágenes de códigos QR
+#
+# Cada imagen se guarda en QR_IMAGENES_DIR con el sha256 de lo que la determina (código,
+# formato, escala y versión del render) como nombre, así que un archivo nunca cambia y se
+# puede servir con Cache-Control immutable. Servir una imagen ya generada es leer un
+# archivo; si falta (otro servidor, directorio limpiado) se vuelve a generar.
+
+FORMATOS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+VERSION = '1'  # Cambiarla invalida las imágenes generadas con otro render
+
+
+def huella(codigo, formato):
+    contenido = f'{VERSION}:{formato}:{settings.QR_IMAGEN_ESCALA}:{codigo}'
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def es_huella(valor):
+    return len(valor) == 64 and all(caracter in '0123456789abcdef' for caracter in valor)
+
+
+def ruta(huella_imagen, formato):
+    # Un subdirectorio por los dos primeros caracteres para no llenar uno solo
+    return os.path.join(settings.QR_IMAGENES_DIR, huella_imagen[:2], f'{huella_imagen}.{formato}')
+
+
+def _render(codigo, formato):
+    contenido = io.BytesIO()
+    segno.make(codigo, error='m').save(contenido, kind=formato, scale=settings.QR_IMAGEN_ESCALA, border=4)
+    return contenido.getvalue()
+
+
+def generar(codigo, formato):
+    destino = ruta(huella(codigo, formato), formato)
+    if os.path.exists(destino):
+        return destino
+    contenido = _render(codigo, formato)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    # Escritura atómica: otro proceso nunca lee un archivo a medias
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, destino)
+    return destino
+
+
+def abrir(codigo, formato):
+    # Genera la imagen si falta y la abre. Si una limpieza del directorio la borra entre
+    # generar y abrir se intenta otra vez, y al final se sirve desde memoria
+    for _ in range(2):
+        try:
+            return open(generar(codigo, formato), 'rb')
+        except FileNotFoundError:
+            pass
+    return io.BytesIO(_render(codigo, formato))
+
+
+def _inicializar_proceso():
+    # Con el método spawn el proceso hijo no hereda la configuración de Django
+    import django
+    django.setup()
+
+
+def _generar(par):
+    return generar(*par)
+
+
+def precalentar(codigos, formatos, procesos=None):
+    # Genera las imágenes que falten; devuelve cuántas se crearon
+    pendientes = [
+        (codigo, formato)
+        for codigo in codigos for formato in formatos
+        if not os.path.exists(ruta(huella(codigo, formato), formato))
+    ]
+    procesos = procesos or settings.QR_IMAGENES_PROCESOS or os.cpu_count()
+    if len(pendientes) < 2 or procesos == 1:
+        for par in pendientes:
+            _generar(par)
+        return len(pendientes)
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as pool:
+        list(pool.map(_generar, pendientes, chunksize=max(1, len(pendientes) // (4 * procesos))))
+    return len(pendientes)
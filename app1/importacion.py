@@ -0,0 +1,166 @@
+import csv
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import User, QR
+from .signals import creacion_masiva
+from . import qr_firmado
+
+# --------------------------
+# Importación masiva de usuarios desde CSV
+#
+# Todas las filas se validan antes de escribir nada; las contraseñas se hashean en un
+# pool de procesos (PBKDF2 es CPU puro) y usuarios y QR se insertan con bulk_create.
+# Las importaciones por HTTP comparten un pool de IMPORTACION_PROCESOS procesos que vive
+# lo mismo que el worker; el comando importar_usuarios crea el suyo con --procesos.
+
+COLUMNAS = ['documento', 'tipo_documento', 'nombre', 'apellido', 'email', 'rol', 'ficha', 'jornada', 'acepta_terminos', 'password']
+OBLIGATORIAS = ['documento', 'nombre', 'apellido', 'email', 'rol']
+VERDADEROS = {'1', 'true', 'si', 'sí', 'x'}
+
+
+def leer_csv(texto):
+    lector = csv.DictReader(io.StringIO(texto.lstrip('\ufeff')))
+    faltantes = [columna for columna in OBLIGATORIAS if columna not in (lector.fieldnames or [])]
+    if faltantes:
+        raise ValidationError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    return [
+        {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+        for fila in lector
+    ]
+
+
+def validar(filas):
+    validas, errores = [], []
+    documentos, emails = {}, {}
+    for numero, fila in enumerate(filas, start=2):  # la fila 1 es el encabezado
+        mensajes = [f"{campo}: obligatorio" for campo in OBLIGATORIAS if not fila[campo]]
+        usuario = User(
+            documento=fila['documento'],
+            tipo_documento=fila['tipo_documento'] or None,
+            nombre=fila['nombre'],
+            apellido=fila['apellido'],
+            email=fila['email'],
+            rol=fila['rol'],
+            ficha=fila['ficha'] or None,
+            jornada=fila['jornada'] or None,
+            acepta_terminos=fila['acepta_terminos'].lower() in VERDADEROS,
+        )
+        if not mensajes:
+            try:
+                usuario.clean_fields(exclude=['password'])
+            except ValidationError as e:
+                mensajes += [f"{campo}: {' '.join(errores_campo)}" for campo, errores_campo in e.message_dict.items()]
+        if usuario.documento and usuario.documento in documentos:
+            mensajes.append(f"documento: repetido en la fila {documentos[usuario.documento]}")
+        if usuario.email and usuario.email in emails:
+            mensajes.append(f"email: repetido en la fila {emails[usuario.email]}")
+        documentos.setdefault(usuario.documento, numero)
+        emails.setdefault(usuario.email, numero)
+
+        if mensajes:
+            errores.append({'fila': numero, 'errores': mensajes})
+        else:
+            # Sin contraseña se usa el documento, como en CreateUserView
+            validas.append((numero, usuario, fila['password'] or usuario.documento))
+
+    # Unicidad contra la base de datos con una consulta por campo
+    existentes_doc = set(User.objects.filter(documento__in=[u.documento for _, u, _ in validas]).values_list('documento', flat=True))
+    existentes_email = set(User.objects.filter(email__in=[u.email for _, u, _ in validas]).values_list('email', flat=True))
+    if existentes_doc or existentes_email:
+        disponibles = []
+        for numero, usuario, password in validas:
+            mensajes = []
+            if usuario.documento in existentes_doc:
+                mensajes.append("documento: ya existe un usuario con este documento")
+            if usuario.email in existentes_email:
+                mensajes.append("email: ya existe un usuario con este email")
+            if mensajes:
+                errores.append({'fila': numero, 'errores': mensajes})
+            else:
+                disponibles.append((numero, usuario, password))
+        validas = disponibles
+
+    errores.sort(key=lambda error: error['fila'])
+    return validas, errores
+
+
+def inicializar_proceso():
+    # Con el método spawn el proceso hijo no hereda la configuración de Django
+    import django
+    django.setup()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_compartido():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.IMPORTACION_PROCESOS, initializer=inicializar_proceso)
+        return _pool
+
+
+def hashear(passwords, procesos=None):
+    # Sin procesos se usa el pool compartido; con procesos, uno propio que se cierra al terminar
+    cantidad = procesos or settings.IMPORTACION_PROCESOS
+    if len(passwords) < 2 or cantidad == 1:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (4 * cantidad))
+    if procesos:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=inicializar_proceso) as pool:
+            return list(pool.map(make_password, passwords, chunksize=chunksize))
+    pool = pool_compartido()
+    try:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # Un proceso murió: la siguiente importación arma el pool de nuevo
+        global _pool
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def guardar(validas, passwords):
+    usuarios = [usuario for _, usuario, _ in validas]
+    for numero, usuario, _ in validas:
+        usuario.password = passwords[numero]
+
+    lote = settings.IMPORTACION_CHUNK
+    with transaction.atomic():
+        creados = User.objects.bulk_create(usuarios, batch_size=lote)
+        qrs = QR.objects.bulk_create(
+            (QR(usuario=usuario, codigo=qr_firmado.emitir(usuario.pk)) for usuario in creados),
+            batch_size=lote,
+        )
+        creacion_masiva.send(sender=User, instancias=creados)
+        creacion_masiva.send(sender=QR, instancias=qrs)
+    return creados
+
+
+def importar(filas, parcial=False, procesos=None):
+    validas, errores = validar(filas)
+    if errores and not parcial:
+        return [], errores
+
+    numeros = [numero for numero, _, _ in validas]
+    passwords = dict(zip(numeros, hashear([password for _, _, password in validas], procesos)))
+    try:
+        return guardar(validas, passwords), errores
+    except IntegrityError:
+        # Otro registro creó alguno de estos documentos o emails mientras se hasheaba: se
+        # validan de nuevo las filas para reportarlo por fila. Un segundo conflicto se propaga
+        validas, errores = validar(filas)
+        if errores and not parcial:
+            return [], errores
+        return guardar(validas, passwords), errores
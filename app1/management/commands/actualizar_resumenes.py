@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from app1 import resumenes
+from app1.models import MarcaResumen
+
+
+class Command(BaseCommand):
+    help = (
+        "Suma a los resúmenes por hora y por día las asistencias registradas desde la última "
+        "corrida. Pensado para ejecutarse cada minuto desde cron"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, help="Asistencias procesadas por transacción (por defecto RESUMEN_CHUNK)")
+        parser.add_argument(
+            '--margen', type=int,
+            help="Segundos recientes que se dejan para la siguiente corrida (por defecto RESUMEN_MARGEN_SEGUNDOS)",
+        )
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help="Borra los resúmenes y los recalcula desde la tabla de asistencias",
+        )
+
+    def handle(self, *args, **options):
+        actualizar = resumenes.reconstruir if options['reconstruir'] else resumenes.actualizar
+        procesadas = actualizar(options['chunk'], options['margen'])
+        marca = MarcaResumen.objects.filter(nombre=resumenes.MARCA).values_list('ultimo_id', flat=True).first()
+        self.stdout.write(self.style.SUCCESS(f"{procesadas} asistencias sumadas (marca en id {marca or 0})"))
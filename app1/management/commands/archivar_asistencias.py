@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app1 import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las asistencias de semestres cerrados a la tabla de archivo (particionada por mes en "
+        "PostgreSQL). El historial y los reportes siguen mostrándolas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasta', type=datetime.date.fromisoformat,
+            help="Archiva los semestres que terminan antes de esta fecha (AAAA-MM-DD; por defecto, el semestre actual)",
+        )
+        parser.add_argument('--chunk', type=int, help="Asistencias movidas por transacción (por defecto ARCHIVO_CHUNK)")
+
+    def handle(self, *args, **options):
+        actual = archivo.inicio_semestre(timezone.localdate())
+        hasta = archivo.inicio_semestre(options['hasta']) if options['hasta'] else actual
+        if hasta > actual:
+            raise CommandError(f"Solo se archivan semestres cerrados (antes de {actual})")
+
+        movidas = archivo.archivar(hasta, options['chunk'])
+        self.stdout.write(self.style.SUCCESS(f"{movidas} asistencias anteriores a {hasta} archivadas"))
@@ -0,0 +1,139 @@
+import datetime
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from app1.authentication import emitir_tokens
+from app1.models import User, Evento, QR
+from app1.signals import creacion_masiva
+
+# Ruta de la vista sync (DRF) y de su versión asíncrona para cada endpoint
+ENDPOINTS = {
+    'registrar': ('POST', '/api/asistencias/registrar/', '/api/asistencias/registrar/async/'),
+    'perfil': ('GET', '/api/perfil/', '/api/perfil/async/'),
+}
+PREFIJO = 'bench-asgi-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara throughput y latencias (p50/p99) de un servidor WSGI (vistas sync) contra uno "
+        "ASGI (vistas async). Ambos servidores deben usar la misma base de datos que este comando"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', required=True, help="URL base del servidor WSGI, p. ej. http://127.0.0.1:8001")
+        parser.add_argument('--asgi', required=True, help="URL base del servidor ASGI, p. ej. http://127.0.0.1:8002")
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='registrar')
+        parser.add_argument('--usuarios', type=int, default=500, help="Usuarios sembrados; uno por petición de registro")
+        parser.add_argument('--peticiones', type=int, default=2000, help="Peticiones de perfil por servidor")
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--conservar', action='store_true', help="No eliminar los datos sembrados al terminar")
+
+    def handle(self, *args, **options):
+        metodo, ruta_sync, ruta_async = ENDPOINTS[options['endpoint']]
+        if User.objects.filter(documento__startswith=PREFIJO).exists():
+            raise CommandError(f"Ya existen usuarios {PREFIJO}*; elimínelos antes de repetir la prueba")
+
+        try:
+            resultados = []
+            for nombre, base, ruta in (('WSGI', options['wsgi'], ruta_sync), ('ASGI', options['asgi'], ruta_async)):
+                # Cada servidor recibe su propio evento para que todos los registros sean inserciones nuevas
+                peticiones = self.sembrar(nombre, options['usuarios'], options['endpoint'], options['peticiones'])
+                resultados.append((nombre, self.cargar(base, metodo, ruta, peticiones, options['concurrencia'])))
+        finally:
+            if not options['conservar']:
+                Evento.objects.filter(nombre__startswith=PREFIJO).delete()
+                User.objects.filter(documento__startswith=PREFIJO).delete()
+
+        self.stdout.write(f"{'servidor':<10}{'peticiones':>11}{'errores':>9}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+        for nombre, (latencias, errores, duracion) in resultados:
+            if len(latencias) < 2:
+                self.stdout.write(f"{nombre:<10}{len(latencias):>11}{errores:>9}   sin datos suficientes")
+                continue
+            percentiles = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f"{nombre:<10}{len(latencias):>11}{errores:>9}{len(latencias) / duracion:>10.1f}"
+                f"{percentiles[49] * 1000:>10.1f}{percentiles[98] * 1000:>10.1f}"
+            )
+
+    def sembrar(self, servidor, cantidad, endpoint, peticiones):
+        ahora = timezone.now()
+        with transaction.atomic():
+            evento = Evento.objects.create(
+                nombre=f'{PREFIJO}{servidor}', tipo='evento', activo=True,
+                fecha_inicio=ahora, fecha_fin=ahora + datetime.timedelta(hours=2),
+            )
+            usuarios = User.objects.bulk_create(
+                User(documento=f'{PREFIJO}{servidor}-{i}', nombre='Bench', apellido=servidor,
+                     email=f'{PREFIJO}{servidor}-{i}@cba.test', rol='Aprendiz', password='!')
+                for i in range(cantidad)
+            )
+            qrs = QR.objects.bulk_create(
+                QR(usuario=usuario, evento=evento, codigo=f'{PREFIJO}{servidor}-{usuario.pk}') for usuario in usuarios
+            )
+            creacion_masiva.send(sender=User, instancias=usuarios)
+            creacion_masiva.send(sender=QR, instancias=qrs)
+
+        tokens = [str(emitir_tokens(usuario).access_token) for usuario in usuarios]
+        if endpoint == 'registrar':
+            return [
+                (token, {'evento_id': evento.pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': qr.codigo})
+                for token, qr in zip(tokens, qrs)
+            ]
+        return [(tokens[i % len(tokens)], None) for i in range(peticiones)]
+
+    def cargar(self, base, metodo, ruta, peticiones, concurrencia):
+        url = urlsplit(base)
+        clase = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        latencias, errores = [], [0]
+        lock = threading.Lock()
+        pendientes = iter(peticiones)
+
+        def trabajador():
+            # Una conexión keep-alive por hilo, como un scanner que reutiliza su conexión
+            conexion = clase(url.hostname, url.port)
+            propias, fallidas = [], 0
+            while True:
+                with lock:
+                    siguiente = next(pendientes, None)
+                if siguiente is None:
+                    break
+                token, cuerpo = siguiente
+                headers = {'Authorization': f'Bearer {token}'}
+                if cuerpo is not None:
+                    headers['Content-Type'] = 'application/json'
+                inicio = time.perf_counter()
+                try:
+                    conexion.request(metodo, url.path.rstrip('/') + ruta,
+                                     body=json.dumps(cuerpo) if cuerpo is not None else None, headers=headers)
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                    if respuesta.status >= 400:
+                        fallidas += 1
+                        continue
+                except (OSError, http.client.HTTPException):
+                    conexion.close()
+                    conexion = clase(url.hostname, url.port)
+                    fallidas += 1
+                    continue
+                propias.append(time.perf_counter() - inicio)
+            conexion.close()
+            with lock:
+                latencias.extend(propias)
+                errores[0] += fallidas
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return latencias, errores[0], time.perf_counter() - inicio
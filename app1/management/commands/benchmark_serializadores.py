@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from app1.models import User, Evento, Asistencia, QR
+from app1.serializers import (
+    UserSerializer, EventoSerializer, AsistenciaSerializer, QRSerializer,
+    user_listado, evento_listado, asistencia_listado, qr_listado,
+)
+
+
+class Command(BaseCommand):
+    help = "Compara los serializadores de DRF con la serialización rápida de listados"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help="Filas por modelo")
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        # Los datos de prueba se crean en una transacción que se revierte al terminar
+        with transaction.atomic():
+            self.crear_datos(filas)
+            casos = [
+                ('User', UserSerializer, user_listado, User.objects.filter(documento__startswith='bench-')),
+                ('Evento', EventoSerializer, evento_listado, Evento.objects.filter(nombre__startswith='bench-')),
+                ('Asistencia', AsistenciaSerializer, asistencia_listado, Asistencia.objects.filter(evento__nombre='bench-0')),
+                ('QR', QRSerializer, qr_listado, QR.objects.filter(codigo__startswith='bench-')),
+            ]
+            self.stdout.write(f"{'modelo':<12}{'filas':>8}{'DRF (ms)':>12}{'rápido (ms)':>14}{'mejora':>9}")
+            for nombre, serializer_class, listado, queryset in casos:
+                queryset = queryset.order_by('id')
+                drf = self.medir(lambda: JSONRenderer().render(serializer_class(queryset, many=True).data), options['repeticiones'])
+                rapido = self.medir(lambda: JSONRenderer().render(listado.serializar(listado.valores(queryset))), options['repeticiones'])
+                self.stdout.write(
+                    f"{nombre:<12}{queryset.count():>8}{drf * 1000:>12.1f}{rapido * 1000:>14.1f}{drf / rapido:>8.1f}x"
+                )
+            transaction.set_rollback(True)
+
+    def medir(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
+
+    def crear_datos(self, filas):
+        ahora = timezone.now()
+        usuarios = User.objects.bulk_create(
+            User(documento=f'bench-{i}', nombre='Nombre', apellido='Apellido', email=f'bench-{i}@cba.test',
+                 rol='Aprendiz', ficha='F1', jornada='mañana', password='!')
+            for i in range(filas)
+        )
+        eventos = Evento.objects.bulk_create(
+            Evento(nombre=f'bench-{i}', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora, docente=usuarios[0])
+            for i in range(filas)
+        )
+        Asistencia.objects.bulk_create(
+            Asistencia(usuario=usuario, evento=eventos[0], metodo='qr', estado='presente') for usuario in usuarios
+        )
+        QR.objects.bulk_create(
+            QR(usuario=usuario, evento=eventos[0], codigo=f'bench-{usuario.pk}') for usuario in usuarios
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app1 import cierre_eventos
+from app1.models import Evento
+
+
+class Command(BaseCommand):
+    help = (
+        "Cierra un evento y registra como 'ausente' a los participantes esperados sin asistencia. "
+        "Se puede repetir sin duplicar ausencias"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('evento_id', type=int)
+        parser.add_argument('--ficha', action='append', dest='fichas', help="Limita a esta ficha; se puede repetir")
+        parser.add_argument(
+            '--rol', action='append', dest='roles',
+            help=f"Rol esperado; se puede repetir (por defecto {', '.join(cierre_eventos.ROLES)})",
+        )
+        parser.add_argument('--chunk', type=int, help="Participantes por INSERT (por defecto CIERRE_CHUNK)")
+
+    def handle(self, *args, **options):
+        try:
+            evento = Evento.objects.get(pk=options['evento_id'])
+        except Evento.DoesNotExist:
+            raise CommandError(f"Evento {options['evento_id']} no encontrado")
+
+        inicio = time.perf_counter()
+        ausentes = cierre_eventos.cerrar(
+            evento, options['fichas'], options['roles'] or cierre_eventos.ROLES, options['chunk'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Evento {evento.pk} cerrado: {ausentes} ausencias registradas en {time.perf_counter() - inicio:.2f} s"
+        ))
@@ -0,0 +1,38 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from app1 import importacion
+
+
+class Command(BaseCommand):
+    help = "Importa usuarios (y su QR) desde un archivo CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del CSV con encabezado: " + ','.join(importacion.COLUMNAS))
+        parser.add_argument(
+            '--parcial', action='store_true',
+            help="Importa las filas válidas aunque otras tengan errores",
+        )
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count(),
+            help="Procesos para hashear contraseñas (por defecto, uno por CPU)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], encoding='utf-8') as archivo:
+                filas = importacion.leer_csv(archivo.read())
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        creados, errores = importacion.importar(filas, parcial=options['parcial'], procesos=options['procesos'])
+        for error in errores:
+            self.stderr.write(f"Fila {error['fila']}: {'; '.join(error['errores'])}")
+
+        if errores and not options['parcial']:
+            raise CommandError(f"{len(errores)} filas con errores, no se importó ningún usuario")
+        self.stdout.write(self.style.SUCCESS(f"{len(creados)} usuarios importados"))
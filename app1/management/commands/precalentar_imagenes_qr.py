@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app1 import imagenes_qr
+from app1.models import Evento, QR
+
+
+class Command(BaseCommand):
+    help = "Genera por adelantado las imágenes (SVG/PNG) de los QR activos de un evento"
+
+    def add_arguments(self, parser):
+        parser.add_argument('evento_id', type=int)
+        parser.add_argument(
+            '--formato', action='append', dest='formatos', choices=sorted(imagenes_qr.FORMATOS),
+            help="Formato a generar; se puede repetir (por defecto svg y png)",
+        )
+        parser.add_argument('--procesos', type=int, help="Procesos para generar las imágenes (por defecto QR_IMAGENES_PROCESOS)")
+
+    def handle(self, *args, **options):
+        if not Evento.objects.filter(pk=options['evento_id']).exists():
+            raise CommandError(f"Evento {options['evento_id']} no encontrado")
+
+        codigos = QR.objects.filter(evento_id=options['evento_id'], activo=True).values_list('codigo', flat=True)
+        formatos = options['formatos'] or sorted(imagenes_qr.FORMATOS)
+        inicio = time.perf_counter()
+        creadas = imagenes_qr.precalentar(list(codigos), formatos, options['procesos'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{creadas} imágenes generadas en {time.perf_counter() - inicio:.1f} s ({', '.join(formatos)})"
+        ))
@@ -0,0 +1,241 @@
+import datetime
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+
+from app1.models import User, Evento, QR
+from app1.signals import creacion_masiva
+
+PREFIJO = 'carga-'
+PASSWORD = 'carga-password'
+
+
+class ClienteLocal:
+    # Ejecuta las peticiones en este proceso con el cliente de pruebas de Django y
+    # cuenta las consultas SQL de cada una
+    def __init__(self):
+        self.locales = threading.local()
+
+    def pedir(self, metodo, ruta, cuerpo=None, token=None):
+        if not hasattr(self.locales, 'cliente'):
+            self.locales.cliente = Client(raise_request_exception=False)
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            respuesta = self.locales.cliente.generic(
+                metodo, ruta, json.dumps(cuerpo) if cuerpo is not None else '',
+                content_type='application/json', headers=headers,
+            )
+        return respuesta.status_code, _json(respuesta.content), consultas[0]
+
+
+class ClienteHTTP:
+    # Peticiones a un servidor en marcha; una conexión keep-alive por hilo
+    def __init__(self, url):
+        self.url = urlsplit(url)
+        self.clase = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        self.locales = threading.local()
+
+    def pedir(self, metodo, ruta, cuerpo=None, token=None):
+        if not hasattr(self.locales, 'conexion'):
+            self.locales.conexion = self.clase(self.url.hostname, self.url.port, timeout=60)
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            self.locales.conexion.request(
+                metodo, self.url.path.rstrip('/') + ruta,
+                body=json.dumps(cuerpo) if cuerpo is not None else None, headers=headers,
+            )
+            respuesta = self.locales.conexion.getresponse()
+            contenido = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            self.locales.conexion.close()
+            del self.locales.conexion
+            return 0, None, None
+        # InstrumentacionMiddleware informa las consultas en Server-Timing (solo peticiones muestreadas)
+        consultas = re.search(r'db;[^,]*desc="(\d+) consultas"', respuesta.getheader('Server-Timing') or '')
+        return respuesta.status, _json(contenido), int(consultas.group(1)) if consultas else None
+
+
+def _json(contenido):
+    try:
+        return json.loads(contenido)
+    except ValueError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula la entrada de la mañana: siembra aprendices, eventos y QR y reproduce una curva de "
+        "llegadas con login, generación de QR y registro de asistencia. Reporta throughput, "
+        "p50/p95/p99 y consultas SQL por endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="URL base de un servidor en marcha; sin ella las peticiones se hacen en este proceso")
+        parser.add_argument('--aprendices', type=int, default=300)
+        parser.add_argument('--eventos', type=int, default=3)
+        parser.add_argument('--con-qr', type=float, default=0.7, help="Fracción de aprendices con QR pregenerado")
+        parser.add_argument('--duracion', type=float, default=60, help="Segundos de la ventana de llegadas")
+        parser.add_argument('--pico', type=float, default=0.4, help="Momento del pico de llegadas, como fracción de la duración")
+        parser.add_argument('--dispersion', type=float, default=0.15, help="Desviación de las llegadas, como fracción de la duración")
+        parser.add_argument('--concurrencia', type=int, default=50, help="Sesiones simultáneas como máximo")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--conservar', action='store_true', help="No eliminar los datos sembrados al terminar")
+
+    def handle(self, *args, **options):
+        if options['url'] is None and connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError("La prueba en proceso usa varios hilos y necesita una base de datos en archivo o PostgreSQL")
+        if User.objects.filter(documento__startswith=PREFIJO).exists():
+            raise CommandError(f"Ya existen usuarios {PREFIJO}*; elimínelos antes de repetir la prueba")
+
+        aleatorio = random.Random(options['semilla'])
+        cliente = ClienteHTTP(options['url']) if options['url'] else ClienteLocal()
+        self.mediciones = defaultdict(list)
+        self.lock = threading.Lock()
+        try:
+            sesiones = self.sembrar(options, aleatorio)
+            duracion = self.reproducir(cliente, sesiones, options)
+        finally:
+            if not options['conservar']:
+                Evento.objects.filter(nombre__startswith=PREFIJO).delete()
+                User.objects.filter(documento__startswith=PREFIJO).delete()
+        self.reportar(duracion)
+
+    # --------------------------
+    # Datos
+
+    def sembrar(self, options, aleatorio):
+        ahora = timezone.now()
+        # Un único hash para todos: sembrar miles de contraseñas PBKDF2 tardaría minutos
+        encoded = make_password(PASSWORD)
+        with transaction.atomic():
+            eventos = [
+                Evento.objects.create(
+                    nombre=f'{PREFIJO}{i}', tipo='clase', jornada='mañana', activo=True,
+                    fecha_inicio=ahora, fecha_fin=ahora + datetime.timedelta(hours=4),
+                )
+                for i in range(options['eventos'])
+            ]
+            usuarios = User.objects.bulk_create(
+                User(documento=f'{PREFIJO}{i}', nombre='Carga', apellido=str(i), email=f'{PREFIJO}{i}@cba.test',
+                     rol='Aprendiz', ficha=f'F{i % 10}', jornada='mañana', password=encoded)
+                for i in range(options['aprendices'])
+            )
+            sesiones = []
+            for usuario in usuarios:
+                evento = aleatorio.choice(eventos)
+                con_qr = aleatorio.random() < options['con_qr']
+                sesiones.append({
+                    'documento': usuario.documento,
+                    'evento_id': evento.pk,
+                    'codigo_qr': f'{PREFIJO}{usuario.pk}-{evento.pk}' if con_qr else None,
+                    'llegada': self.llegada(aleatorio, options),
+                    'usuario': usuario,
+                })
+            qrs = QR.objects.bulk_create(
+                QR(usuario=sesion['usuario'], evento_id=sesion['evento_id'], codigo=sesion['codigo_qr'])
+                for sesion in sesiones if sesion['codigo_qr']
+            )
+            creacion_masiva.send(sender=User, instancias=usuarios)
+            creacion_masiva.send(sender=QR, instancias=qrs)
+        return sorted(sesiones, key=lambda sesion: sesion['llegada'])
+
+    def llegada(self, aleatorio, options):
+        # Curva normal truncada a la ventana: casi todos llegan cerca de la hora de entrada
+        duracion = options['duracion']
+        while True:
+            t = aleatorio.gauss(options['pico'] * duracion, options['dispersion'] * duracion)
+            if 0 <= t <= duracion:
+                return t
+
+    # --------------------------
+    # Reproducción
+
+    def reproducir(self, cliente, sesiones, options):
+        self.stdout.write(
+            f"{len(sesiones)} sesiones en {options['duracion']:.0f} s "
+            f"({'servidor ' + options['url'] if options['url'] else 'en proceso'})"
+        )
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            for sesion in sesiones:
+                espera = sesion['llegada'] - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+                pool.submit(self.sesion, cliente, sesion)
+        if options['url'] is None:
+            connection.close()
+        return time.perf_counter() - inicio
+
+    def sesion(self, cliente, sesion):
+        try:
+            status, datos, _ = self.medir(cliente, 'login', 'POST', '/api/login/',
+                                          {'documento': sesion['documento'], 'password': PASSWORD})
+            if status != 200:
+                return
+            token = datos['access']
+
+            codigo = sesion['codigo_qr']
+            if codigo is None:
+                status, datos, _ = self.medir(cliente, 'qr/crear', 'POST', '/api/qr/crear/',
+                                              {'evento_id': sesion['evento_id']}, token)
+                if status != 201:
+                    return
+                codigo = datos['codigo']
+
+            self.medir(cliente, 'asistencias/registrar', 'POST', '/api/asistencias/registrar/', {
+                'evento_id': sesion['evento_id'], 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': codigo,
+            }, token)
+        finally:
+            if isinstance(cliente, ClienteLocal):
+                # Cada hilo del pool abre su propia conexión
+                connection.close()
+
+    def medir(self, cliente, endpoint, metodo, ruta, cuerpo=None, token=None):
+        inicio = time.perf_counter()
+        status, datos, consultas = cliente.pedir(metodo, ruta, cuerpo, token)
+        latencia = time.perf_counter() - inicio
+        with self.lock:
+            self.mediciones[endpoint].append((latencia, status, consultas))
+        return status, datos, consultas
+
+    # --------------------------
+    # Reporte
+
+    def reportar(self, duracion):
+        self.stdout.write(
+            f"{'endpoint':<24}{'peticiones':>11}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'consultas':>11}  códigos"
+        )
+        for endpoint, mediciones in self.mediciones.items():
+            latencias = sorted(latencia for latencia, _, _ in mediciones)
+            percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+            consultas = [c for _, _, c in mediciones if c is not None]
+            promedio = f"{statistics.mean(consultas):.1f}/{max(consultas)}" if consultas else '-'
+            codigos = ' '.join(f'{codigo}:{n}' for codigo, n in sorted(Counter(s for _, s, _ in mediciones).items()))
+            self.stdout.write(
+                f"{endpoint:<24}{len(mediciones):>11}{len(mediciones) / duracion:>8.1f}"
+                f"{percentiles[49] * 1000:>9.1f}{percentiles[94] * 1000:>9.1f}{percentiles[98] * 1000:>9.1f}"
+                f"{promedio:>11}  {codigos}"
+            )
+        self.stdout.write("consultas: promedio/máximo por petición; código 0 = error de conexión")
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app1 import sincronizacion
+
+
+class Command(BaseCommand):
+    help = "Borra el registro de cambios para escáneres más viejo que SYNC_RETENCION_DIAS"
+
+    def handle(self, *args, **options):
+        borrados = sincronizacion.purgar()
+        self.stdout.write(self.style.SUCCESS(
+            f"{borrados} cambios anteriores a {settings.SYNC_RETENCION_DIAS} días borrados"
+        ))
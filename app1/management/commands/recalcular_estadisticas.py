@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app1 import estadisticas
+from app1.models import Estadisticas, AsistenciasPorDia
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los contadores del dashboard desde las tablas y los compara con los guardados"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help="Solo compara los contadores guardados con los reales, sin modificarlos",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            conteos = estadisticas.contar()
+            por_dia = estadisticas.contar_por_dia()
+            diferencias = self.comparar(conteos, por_dia)
+            if not options['verificar']:
+                estadisticas.guardar(conteos, por_dia)
+
+        for diferencia in diferencias:
+            self.stdout.write(diferencia)
+
+        if options['verificar']:
+            if diferencias:
+                raise CommandError(f"{len(diferencias)} contadores no coinciden con las tablas")
+            self.stdout.write(self.style.SUCCESS("Los contadores coinciden con las tablas"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Contadores reconstruidos ({len(diferencias)} corregidos, {len(por_dia)} días)"
+            ))
+
+    def comparar(self, conteos, por_dia):
+        diferencias = []
+        guardadas = Estadisticas.objects.filter(pk=estadisticas.ID_ESTADISTICAS).values().first() or {}
+        for campo, real in conteos.items():
+            if guardadas.get(campo) != real:
+                diferencias.append(f"{campo}: guardado={guardadas.get(campo)} real={real}")
+
+        dias = dict(AsistenciasPorDia.objects.values_list('fecha', 'total'))
+        for fecha in sorted(set(dias) | set(por_dia)):
+            if dias.get(fecha, 0) != por_dia.get(fecha, 0):
+                diferencias.append(f"asistencias {fecha}: guardado={dias.get(fecha, 0)} real={por_dia.get(fecha, 0)}")
+        return diferencias
@@ -0,0 +1,113 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# --------------------------
+# Métricas de rendimiento por vista
+#
+# InstrumentacionMiddleware abre una Medicion por petición muestreada; el execute
+# wrapper de cada conexión suma en ella las consultas y su tiempo. La Medicion viaja en
+# una ContextVar, así que también se cuentan las consultas que las vistas async hacen
+# desde el hilo de sync_to_async. Los histogramas viven en memoria de cada proceso: con
+# varios workers cada uno expone los suyos.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    __slots__ = ('inicio', 'consultas', 'tiempo_db', 'inicio_render', 'tiempo_render')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.inicio_render = None
+        self.tiempo_render = 0.0
+
+
+def contar_consulta(execute, sql, params, many, context):
+    medicion = medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.consultas += 1
+        medicion.tiempo_db += time.perf_counter() - inicio
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.buckets = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.buckets[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.duracion = {}
+        self.consultas = {}
+        self.tiempo_db = {}
+        self.tiempo_render = {}
+
+    def registrar(self, vista, duracion, medicion):
+        with self.lock:
+            if vista not in self.duracion:
+                self.duracion[vista] = Histograma(BUCKETS)
+                self.consultas[vista] = Histograma(BUCKETS_CONSULTAS)
+                self.tiempo_db[vista] = 0.0
+                self.tiempo_render[vista] = 0.0
+            self.duracion[vista].observar(duracion)
+            self.consultas[vista].observar(medicion.consultas)
+            self.tiempo_db[vista] += medicion.tiempo_db
+            self.tiempo_render[vista] += medicion.tiempo_render
+
+    def prometheus(self, extra=None):
+        with self.lock:
+            lineas = []
+            lineas += _histograma('cbapoint_peticion_segundos', 'Duración de las peticiones por vista', self.duracion)
+            lineas += _histograma('cbapoint_peticion_consultas', 'Consultas SQL por petición y vista', self.consultas)
+            lineas += _contador('cbapoint_db_segundos_total', 'Tiempo en la base de datos por vista', self.tiempo_db)
+            lineas += _contador('cbapoint_render_segundos_total', 'Tiempo de serialización de la respuesta por vista', self.tiempo_render)
+        for nombre, ayuda, valor in extra or ():
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} gauge', f'{nombre} {valor}']
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _histograma(nombre, ayuda, histogramas):
+    lineas = [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+    for vista, histograma in sorted(histogramas.items()):
+        vista = _etiqueta(vista)
+        acumulado = 0
+        for limite, cantidad in zip(histograma.limites, histograma.buckets):
+            acumulado += cantidad
+            lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{vista="{vista}",le="+Inf"}} {histograma.total}')
+        lineas.append(f'{nombre}_sum{{vista="{vista}"}} {histograma.suma}')
+        lineas.append(f'{nombre}_count{{vista="{vista}"}} {histograma.total}')
+    return lineas
+
+
+def _contador(nombre, ayuda, valores):
+    lineas = [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+    lineas += [f'{nombre}{{vista="{_etiqueta(vista)}"}} {valor}' for vista, valor in sorted(valores.items())]
+    return lineas
+
+
+registro = RegistroMetricas()
@@ -0,0 +1,136 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import routers
+from .metricas import Medicion, medicion_actual, registro
+
+# --------------------------
+# Instrumentación de /api/*
+#
+# Para una fracción INSTRUMENTACION_MUESTREO de las peticiones mide el tiempo total, las
+# consultas SQL y su tiempo, y el render de la respuesta (serialización a JSON de DRF).
+# Responde con Server-Timing y acumula los histogramas que expone MetricasView. Las
+# peticiones no muestreadas solo pagan un random().
+
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        medicion = self.iniciar(request)
+        if medicion is None:
+            return self.get_response(request)
+        token = medicion_actual.set(medicion)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            medicion_actual.reset(token)
+        return self.terminar(request, respuesta, medicion)
+
+    async def __acall__(self, request):
+        medicion = self.iniciar(request)
+        if medicion is None:
+            return await self.get_response(request)
+        token = medicion_actual.set(medicion)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            medicion_actual.reset(token)
+        return self.terminar(request, respuesta, medicion)
+
+    def iniciar(self, request):
+        if not request.path.startswith('/api/') or random.random() >= settings.INSTRUMENTACION_MUESTREO:
+            return None
+        medicion = Medicion()
+        request.medicion = medicion
+        return medicion
+
+    def process_template_response(self, request, response):
+        # Se llama justo antes de response.render(); el callback marca el final
+        medicion = getattr(request, 'medicion', None)
+        if medicion is not None:
+            medicion.inicio_render = time.perf_counter()
+            response.add_post_render_callback(lambda _: self.fin_render(medicion))
+        return response
+
+    def fin_render(self, medicion):
+        medicion.tiempo_render += time.perf_counter() - medicion.inicio_render
+
+    def terminar(self, request, respuesta, medicion):
+        duracion = time.perf_counter() - medicion.inicio
+        registro.registrar(_vista(request), duracion, medicion)
+        respuesta.headers['Server-Timing'] = (
+            f'app;dur={duracion * 1000:.1f}, '
+            f'db;dur={medicion.tiempo_db * 1000:.1f};desc="{medicion.consultas} consultas", '
+            f'render;dur={medicion.tiempo_render * 1000:.1f}'
+        )
+        return respuesta
+
+
+class ReplicaMiddleware:
+    # Ver app1.routers
+    sync_capable = True
+    async_capable = True
+    metodos_lectura = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        request.lectura_replica, token = routers.iniciar()
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            routers.terminar(token)
+        return self.terminar(request, respuesta)
+
+    async def __acall__(self, request):
+        request.lectura_replica, token = routers.iniciar()
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            routers.terminar(token)
+        return self.terminar(request, respuesta)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        vista = getattr(view_func, 'view_class', None)
+        if (
+            settings.DATABASE_REPLICAS
+            and getattr(vista, 'lectura_en_replica', False)
+            and request.method in self.metodos_lectura
+            and not routers.fijado_en_primaria(request)
+        ):
+            # Se modifica el objeto y no la variable de contexto: process_view puede correr
+            # en otro contexto (sync_to_async bajo ASGI)
+            request.lectura_replica.permitida = True
+        return None
+
+    def terminar(self, request, respuesta):
+        if request.method not in self.metodos_lectura and respuesta.status_code < 400:
+            routers.fijar_en_primaria(request)
+        return respuesta
+
+
+def _vista(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'sin_vista'
+    vista = getattr(match.func, 'view_class', None)
+    return vista.__name__ if vista is not None else match.view_name or match._func_path
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:31
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def inicializar_contadores(apps, schema_editor):
+    User = apps.get_model('app1', 'User')
+    Evento = apps.get_model('app1', 'Evento')
+    Asistencia = apps.get_model('app1', 'Asistencia')
+    Estadisticas = apps.get_model('app1', 'Estadisticas')
+    AsistenciasPorDia = apps.get_model('app1', 'AsistenciasPorDia')
+
+    Estadisticas.objects.create(
+        pk=1,
+        total_usuarios=User.objects.count(),
+        total_aprendices=User.objects.filter(rol='Aprendiz').count(),
+        total_eventos=Evento.objects.count(),
+        eventos_activos=Evento.objects.filter(activo=True).count(),
+        total_asistencias=Asistencia.objects.count(),
+    )
+    AsistenciasPorDia.objects.bulk_create(
+        AsistenciasPorDia(fecha=fila['fecha'], total=fila['total'])
+        for fila in Asistencia.objects.annotate(fecha=TruncDate('fecha_registro'))
+        .values('fecha').annotate(total=Count('id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0006_evento_jornada_puntodecontrol_activo_qr_activo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciasPorDia',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('total', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Estadisticas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_usuarios', models.IntegerField(default=0)),
+                ('total_aprendices', models.IntegerField(default=0)),
+                ('total_eventos', models.IntegerField(default=0)),
+                ('eventos_activos', models.IntegerField(default=0)),
+                ('total_asistencias', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
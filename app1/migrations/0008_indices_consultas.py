@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0007_estadisticas'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['usuario', 'fecha_registro', 'id'], name='asistencia_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['evento', 'fecha_registro'], name='asistencia_evento_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['fecha_registro'], name='asistencia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qr',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['evento', 'codigo'], name='qr_activos_evento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qr',
+            index=models.Index(fields=['usuario', 'evento'], name='qr_usuario_evento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['rol'], name='user_rol_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['fecha_registro', 'id'], name='user_registro_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:36
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def comprobar_duplicados(apps, schema_editor):
+    # Las restricciones únicas no se pueden crear con asistencias repetidas. No se borran
+    # aquí: cuál conservar es una decisión de quien administra los datos
+    Asistencia = apps.get_model('app1', 'Asistencia')
+    repetidas = list(
+        Asistencia.objects.values('usuario_id', 'evento_id', 'punto_id')
+        .annotate(total=Count('id')).filter(total__gt=1).order_by('usuario_id', 'evento_id', 'punto_id')
+    )
+    if not repetidas:
+        return
+    ejemplos = []
+    for grupo in repetidas[:20]:
+        ids = Asistencia.objects.filter(
+            usuario_id=grupo['usuario_id'], evento_id=grupo['evento_id'], punto_id=grupo['punto_id'],
+        ).order_by('id').values_list('id', flat=True)
+        ejemplos.append(
+            f"  usuario {grupo['usuario_id']}, evento {grupo['evento_id']}, punto {grupo['punto_id']}: ids {list(ids)}"
+        )
+    raise RuntimeError(
+        f"Hay {len(repetidas)} combinaciones (usuario, evento, punto) con más de una asistencia:\n"
+        + '\n'.join(ejemplos) + "\n"
+        "Elimine las sobrantes (normalmente todas menos la de menor id), ejecute de nuevo migrate y "
+        "luego recalcular_estadisticas para corregir los contadores del dashboard."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0008_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprobar_duplicados, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='asistencia',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='asistencia',
+            constraint=models.UniqueConstraint(fields=('usuario', 'evento', 'punto'), name='asistencia_unica_por_punto'),
+        ),
+        migrations.AddConstraint(
+            model_name='asistencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('punto__isnull', True)), fields=('usuario', 'evento'), name='asistencia_unica_sin_punto'),
+        ),
+        migrations.AddConstraint(
+            model_name='asistencia',
+            constraint=models.UniqueConstraint(fields=('usuario', 'clave_idempotencia'), name='asistencia_clave_por_usuario'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0010_versiones_recursos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaResumen',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenAsistencias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], max_length=10)),
+                ('dimension', models.CharField(choices=[('evento', 'Evento'), ('punto', 'Punto de control'), ('ficha', 'Ficha'), ('jornada', 'Jornada')], max_length=10)),
+                ('valor', models.CharField(blank=True, max_length=50)),
+                ('periodo', models.DateTimeField()),
+                ('estado', models.CharField(max_length=50)),
+                ('metodo', models.CharField(max_length=50)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularidad', 'dimension', 'valor', 'periodo', 'estado', 'metodo'), name='resumen_asistencias_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def particionar(apps, schema_editor):
+    # En PostgreSQL el archivo se recrea como tabla particionada por rango de fecha_registro.
+    # La clave primaria debe incluir la columna de partición; Django sigue usando solo id,
+    # que es único porque viene de Asistencia. Las particiones mensuales las crea
+    # archivar_asistencias antes de copiar cada mes. No hay partición DEFAULT: con ella,
+    # CREATE TABLE ... PARTITION OF revisa sus filas y falla si alguna cae en el mes nuevo
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AsistenciaArchivada = apps.get_model('app1', 'AsistenciaArchivada')
+    tabla = AsistenciaArchivada._meta.db_table
+    q = schema_editor.quote_name
+    # Al eliminar la plantilla se eliminan sus índices y los nombres quedan libres
+    schema_editor.execute(f'ALTER TABLE {q(tabla)} RENAME TO {q(tabla + "_plantilla")}')
+    schema_editor.execute(
+        f'CREATE TABLE {q(tabla)} (LIKE {q(tabla + "_plantilla")} INCLUDING DEFAULTS, '
+        f'PRIMARY KEY (id, fecha_registro)) PARTITION BY RANGE (fecha_registro)'
+    )
+    schema_editor.execute(f'DROP TABLE {q(tabla + "_plantilla")}')
+    for index in AsistenciaArchivada._meta.indexes:
+        schema_editor.add_index(AsistenciaArchivada, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0011_resumenes_asistencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_registro', models.DateTimeField()),
+                ('metodo', models.CharField(choices=[('qr', 'QR'), ('gps', 'GPS'), ('manual', 'Manual')], max_length=50)),
+                ('estado', models.CharField(choices=[('presente', 'Presente'), ('ausente', 'Ausente'), ('tarde', 'Tarde')], max_length=50)),
+                ('evento', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app1.evento')),
+                ('punto', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='app1.puntodecontrol')),
+                ('usuario', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'fecha_registro', 'id'], name='archivada_usuario_fecha_idx'), models.Index(fields=['evento', 'fecha_registro'], name='archivada_evento_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
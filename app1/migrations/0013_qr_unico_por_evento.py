@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def comprobar_duplicados(apps, schema_editor):
+    # La restricción única no se puede crear con QR repetidos por (usuario, evento). No se
+    # borran aquí: alguno pudo haberse impreso o entregado
+    QR = apps.get_model('app1', 'QR')
+    repetidos = list(
+        QR.objects.filter(evento__isnull=False).values('usuario_id', 'evento_id')
+        .annotate(total=Count('id')).filter(total__gt=1).order_by('usuario_id', 'evento_id')
+    )
+    if not repetidos:
+        return
+    ejemplos = []
+    for grupo in repetidos[:20]:
+        qrs = QR.objects.filter(usuario_id=grupo['usuario_id'], evento_id=grupo['evento_id']).order_by('id')
+        ejemplos.append(
+            f"  usuario {grupo['usuario_id']}, evento {grupo['evento_id']}: "
+            + ', '.join(f"id {qr_id} ({'activo' if activo else 'inactivo'})" for qr_id, activo in qrs.values_list('id', 'activo'))
+        )
+    raise RuntimeError(
+        f"Hay {len(repetidos)} combinaciones (usuario, evento) con más de un QR:\n"
+        + '\n'.join(ejemplos) + "\n"
+        "Deje un QR por combinación (normalmente el activo más antiguo) y ejecute de nuevo migrate."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0012_asistencias_archivadas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='qr',
+            name='qr_usuario_evento_idx',
+        ),
+        migrations.RunPython(comprobar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='qr',
+            constraint=models.UniqueConstraint(fields=('usuario', 'evento'), name='qr_unico_por_evento'),
+        ),
+    ]
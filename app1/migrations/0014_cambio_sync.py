@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0013_qr_unico_por_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioSync',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(choices=[('qr', 'QR'), ('evento', 'Evento'), ('usuario', 'Usuario')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('evento_id', models.BigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['evento_id', 'id'], name='cambio_sync_evento_idx'), models.Index(fields=['fecha'], name='cambio_sync_fecha_idx')],
+            },
+        ),
+    ]
@@ -6,7 +6,7 @@ import datetime
 # --------------------------
 # MANAGER DE USUARIOS
 class CustomUserManager(BaseUserManager):
-    def create_user(self, documento, nombre, apellido, email, rol, tipo_documento=None, acepta_terminos=False, ficha=None, password=None):
+    def create_user(self, documento, nombre, apellido, email, rol, tipo_documento=None, acepta_terminos=False, ficha=None, jornada=None, password=None):
         if not email:
             raise ValueError('El email debe ser proporcionado')
         user = self.model(
@@ -17,7 +17,8 @@ class CustomUserManager(BaseUserManager):
             rol=rol,
             tipo_documento=tipo_documento,
             acepta_terminos=acepta_terminos,
-            ficha=ficha
+            ficha=ficha,
+            jornada=jornada
         )
         user.set_password(password)
         user.save(using=self._db)
@@ -74,6 +75,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'documento'
     REQUIRED_FIELDS = ['nombre', 'apellido', 'email']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['rol'], name='user_rol_idx'),
+            # Orden de GetUsersView (paginación por keyset)
+            models.Index(fields=['fecha_registro', 'id'], name='user_registro_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
@@ -121,10 +129,57 @@ class Asistencia(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True)
     metodo = models.CharField(max_length=50, choices=[('qr','QR'), ('gps','GPS'), ('manual','Manual')])
     estado = models.CharField(max_length=50, choices=[('presente','Presente'), ('ausente','Ausente'), ('tarde','Tarde')])
+    # Clave enviada por el escáner para que los reintentos no creen asistencias nuevas; es
+    # única por usuario (ver Meta)
+    clave_idempotencia = models.CharField(max_length=100, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Una asistencia por usuario, evento y punto de control
+            models.UniqueConstraint(fields=['usuario', 'evento', 'punto'], name='asistencia_unica_por_punto'),
+            # NULL no cuenta como repetido en un UNIQUE, así que sin punto se necesita otra restricción
+            models.UniqueConstraint(fields=['usuario', 'evento'], condition=models.Q(punto__isnull=True), name='asistencia_unica_sin_punto'),
+            # La misma clave de dos usuarios son dos asistencias distintas
+            models.UniqueConstraint(fields=['usuario', 'clave_idempotencia'], name='asistencia_clave_por_usuario'),
+        ]
+        indexes = [
+            # Historial del usuario en orden (fecha_registro, id)
+            models.Index(fields=['usuario', 'fecha_registro', 'id'], name='asistencia_usuario_fecha_idx'),
+            # Asistencias de un evento (exportación, reportes) y rangos de fecha por evento
+            models.Index(fields=['evento', 'fecha_registro'], name='asistencia_evento_fecha_idx'),
+            # Asistencias de un día o rango de fechas
+            models.Index(fields=['fecha_registro'], name='asistencia_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.usuario.nombre} - {self.evento.nombre}"
 
+# --------------------------
+# ASISTENCIAS ARCHIVADAS
+# Asistencias de semestres cerrados, movidas por el comando archivar_asistencias. En
+# PostgreSQL la tabla está particionada por mes de fecha_registro (ver migración 0012);
+# las columnas son las de Asistencia sin la clave de idempotencia
+class AsistenciaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # El mismo id que tenía en Asistencia
+    # Sin FOREIGN KEY en la base de datos: una tabla particionada no las necesita para el
+    # borrado en cascada, que hace Django
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    evento = models.ForeignKey(Evento, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    # El punto queda como se registró aunque luego se elimine
+    punto = models.ForeignKey(PuntoDeControl, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, blank=True)
+    fecha_registro = models.DateTimeField()
+    metodo = models.CharField(max_length=50, choices=Asistencia._meta.get_field('metodo').choices)
+    estado = models.CharField(max_length=50, choices=Asistencia._meta.get_field('estado').choices)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_registro', 'id'], name='archivada_usuario_fecha_idx'),
+            models.Index(fields=['evento', 'fecha_registro'], name='archivada_evento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.evento_id} ({self.fecha_registro:%Y-%m-%d})"
+
 # --------------------------
 # CÓDIGOS QR
 class QR(models.Model):
@@ -136,5 +191,113 @@ class QR(models.Model):
     fecha_expiracion = models.DateTimeField(null=True, blank=True)
     activo = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Un QR por usuario y evento (GenerarQRView, generación masiva); también sirve de
+            # índice para buscar el QR de un usuario en un evento
+            models.UniqueConstraint(fields=['usuario', 'evento'], name='qr_unico_por_evento'),
+        ]
+        indexes = [
+            # Precarga de los códigos activos de un evento (app1.validacion_qr)
+            models.Index(fields=['evento', 'codigo'], condition=models.Q(activo=True), name='qr_activos_evento_idx'),
+        ]
+
+    def __str__(self):
+        return self.codigo
+
+# --------------------------
+# ESTADÍSTICAS DEL DASHBOARD
+# Contadores mantenidos al crear o eliminar usuarios, eventos y asistencias
+class Estadisticas(models.Model):
+    total_usuarios = models.IntegerField(default=0)
+    total_aprendices = models.IntegerField(default=0)
+    total_eventos = models.IntegerField(default=0)
+    eventos_activos = models.IntegerField(default=0)
+    total_asistencias = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Estadísticas #{self.pk}"
+
+
+class AsistenciasPorDia(models.Model):
+    fecha = models.DateField(primary_key=True)
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha}: {self.total}"
+
+
+# --------------------------
+# VERSIONES DE RECURSOS
+# Contador por recurso ('eventos', 'qrs:<usuario>', 'usuario:<id>') que se incrementa
+# en la misma transacción que cualquier cambio; de él salen los ETag de los listados
+class VersionRecurso(models.Model):
+    clave = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.clave}: {self.version}"
+
+
+# --------------------------
+# RESÚMENES DE ASISTENCIA
+# Conteos por hora y por día de cada evento, punto de control, ficha y jornada, separados
+# por estado y método. Los mantiene el comando actualizar_resumenes a partir de una marca
+class ResumenAsistencias(models.Model):
+    GRANULARIDADES = [('hora', 'Hora'), ('dia', 'Día')]
+    DIMENSIONES = [('evento', 'Evento'), ('punto', 'Punto de control'), ('ficha', 'Ficha'), ('jornada', 'Jornada')]
+
+    granularidad = models.CharField(max_length=10, choices=GRANULARIDADES)
+    dimension = models.CharField(max_length=10, choices=DIMENSIONES)
+    valor = models.CharField(max_length=50, blank=True)  # id o texto; '' = sin punto, ficha o jornada
+    periodo = models.DateTimeField()  # Inicio de la hora o del día en la zona horaria del proyecto
+    estado = models.CharField(max_length=50)
+    metodo = models.CharField(max_length=50)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularidad', 'dimension', 'valor', 'periodo', 'estado', 'metodo'],
+                name='resumen_asistencias_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.valor} {self.periodo:%Y-%m-%d %H:%M} {self.estado}/{self.metodo}: {self.total}"
+
+
+class MarcaResumen(models.Model):
+    # Mayor id de Asistencia ya sumado en los resúmenes
+    nombre = models.CharField(max_length=50, primary_key=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_id}"
+
+
+# --------------------------
+# REGISTRO DE CAMBIOS PARA SINCRONIZACIÓN
+# Una fila por cada alta, edición o baja de un QR, evento o usuario, en la misma
+# transacción que el cambio. El id es el cursor de los escáneres sin conexión
+# (app1.sincronizacion); la fila no guarda datos, solo qué objeto hay que volver a leer
+class CambioSync(models.Model):
+    MODELOS = [('qr', 'QR'), ('evento', 'Evento'), ('usuario', 'Usuario')]
+
+    id = models.BigAutoField(primary_key=True)
+    modelo = models.CharField(max_length=10, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    evento_id = models.BigIntegerField(null=True, blank=True)  # Sin FK: la fila sobrevive al evento; NULL en usuarios
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Cambios de los eventos de un escáner posteriores a su cursor
+            models.Index(fields=['evento_id', 'id'], name='cambio_sync_evento_idx'),
+            # Purga por antigüedad (comando purgar_cambios_sync)
+            models.Index(fields=['fecha'], name='cambio_sync_fecha_idx'),
+        ]
+
     def __str__(self):
-        return self.codigo
\ No newline at end of file
+        return f"#{self.id} {self.modelo} {self.objeto_id}"
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+# --------------------------
+# Paginación por keyset (cursor)
+#
+# En lugar de OFFSET se filtra por la posición del último elemento de la página anterior,
+# p. ej. (fecha_registro, id) > (f, i), así que cualquier página cuesta lo mismo que la
+# primera mientras exista un índice con ese orden. El cursor es la posición codificada
+# en base64 y el cliente solo debe reenviarlo.
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    ordering = ('id',)
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        # Varias fuentes con las mismas columnas cuyos rangos no se cruzan en el orden de la
+        # vista (p. ej. Asistencia y su archivo): la siguiente solo se consulta si las
+        # anteriores no llenaron la página
+        self.request = request
+        self.ordering = tuple(getattr(view, 'ordering', self.ordering))
+        self.campos = [campo.lstrip('-') for campo in self.ordering]
+        self.descendente = self.ordering[0].startswith('-')
+        self.modelo = querysets[0].model
+        # Con values_list() las filas son tuplas en el orden de estas columnas
+        self.columnas = list(querysets[0].query.values_select)
+        tamano = self.get_page_size(request)
+
+        posicion = self.decode_cursor(request)
+        filas = []
+        for queryset in querysets:
+            if posicion is not None:
+                queryset = queryset.filter(self.filtro_posterior(posicion))
+            filas += queryset.order_by(*self.ordering)[:tamano + 1 - len(filas)]
+            if len(filas) > tamano:
+                break
+        self.has_next = len(filas) > tamano
+        filas = filas[:tamano]
+        self.siguiente = self.posicion(filas[-1]) if self.has_next else None
+        return filas
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if tamano <= 0:
+            return self.page_size
+        return min(tamano, self.max_page_size)
+
+    def filtro_posterior(self, posicion):
+        # (a, b) > (x, y)  ==  a >= x AND (a > x OR (a = x AND b > y)); la primera
+        # condición le permite al planificador empezar el recorrido del índice en x
+        operador = 'lt' if self.descendente else 'gt'
+        filtro = Q()
+        for i, campo in enumerate(self.campos):
+            iguales = {self.campos[j]: posicion[j] for j in range(i)}
+            filtro |= Q(**iguales, **{f'{campo}__{operador}': posicion[i]})
+        return Q(**{f'{self.campos[0]}__{operador}e': posicion[0]}) & filtro
+
+    def posicion(self, fila):
+        if isinstance(fila, tuple):
+            return [fila[self.columnas.index(campo)] for campo in self.campos]
+        if isinstance(fila, dict):
+            return [fila[campo] for campo in self.campos]
+        return [getattr(fila, campo) for campo in self.campos]
+
+    def encode_cursor(self, posicion):
+        valores = [valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in posicion]
+        cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(valores, list) or len(valores) != len(self.campos):
+                raise ValueError
+            return [
+                self.modelo._meta.get_field(campo).to_python(valor)
+                for campo, valor in zip(self.campos, valores)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        return self.encode_cursor(self.siguiente)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,104 @@
+import base64
+import datetime
+import hmac
+import secrets
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.dateparse import parse_datetime
+
+# --------------------------
+# Códigos QR firmados
+#
+# v1.<clave>.<usuario>.<evento>.<punto>.<expiración>.<nonce>.<firma>
+#
+# El código lleva los datos del QR y un HMAC-SHA256 (truncado a 16 bytes) calculado con
+# la clave <clave> de QR_FIRMA_CLAVES, así que validarlo no necesita la base de datos y un
+# escáner sin conexión puede hacerlo con la misma clave. evento, punto y expiración
+# (segundos Unix) quedan vacíos si no aplican; el nonce hace único cada código emitido.
+#
+# Rotación: los códigos nuevos se firman con QR_FIRMA_CLAVE_ACTUAL. Una clave anterior
+# sigue aceptándose hasta la fecha indicada en QR_FIRMA_RETIRO y después se rechaza.
+# Los códigos uuid emitidos antes de este formato se siguen validando contra la tabla QR.
+
+VERSION = 'v1'
+PARTES = 8
+SAL = 'app1.qr_firmado'
+
+
+def comprobar_claves():
+    # Se llama al arrancar (App1Config.ready): con una clave pública cualquiera podría
+    # fabricar un QR válido para cualquier usuario y evento
+    if settings.QR_FIRMA_CLAVE_ACTUAL not in settings.QR_FIRMA_CLAVES:
+        raise ImproperlyConfigured("QR_FIRMA_CLAVE_ACTUAL no está en QR_FIRMA_CLAVES")
+    if settings.DEBUG:
+        return
+    for clave, secreto in settings.QR_FIRMA_CLAVES.items():
+        if not secreto or secreto.startswith('django-insecure-'):
+            raise ImproperlyConfigured(
+                f"La clave {clave} de QR_FIRMA_CLAVES falta o es la de desarrollo; defina QR_FIRMA_CLAVE"
+            )
+
+
+def _firma(clave, mensaje):
+    digest = salted_hmac(SAL, mensaje, secret=settings.QR_FIRMA_CLAVES[clave], algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b'=').decode()
+
+
+def _vigente(clave):
+    if clave == settings.QR_FIRMA_CLAVE_ACTUAL:
+        return True
+    if clave not in settings.QR_FIRMA_CLAVES:
+        return False
+    retiro = settings.QR_FIRMA_RETIRO.get(clave)
+    if retiro is None:
+        return False
+    retiro = parse_datetime(retiro) if isinstance(retiro, str) else retiro
+    if timezone.is_naive(retiro):
+        retiro = timezone.make_aware(retiro)
+    return timezone.now() < retiro
+
+
+def emitir(usuario_id, evento_id=None, punto_id=None, fecha_expiracion=None):
+    expiracion = int(fecha_expiracion.timestamp()) if fecha_expiracion else ''
+    clave = settings.QR_FIRMA_CLAVE_ACTUAL
+    mensaje = '.'.join([
+        VERSION, clave, str(usuario_id), str(evento_id or ''), str(punto_id or ''), str(expiracion),
+        secrets.token_urlsafe(6),
+    ])
+    return f'{mensaje}.{_firma(clave, mensaje)}'
+
+
+def es_firmado(codigo):
+    return isinstance(codigo, str) and codigo.startswith(VERSION + '.')
+
+
+def verificar(codigo):
+    # Devuelve los datos del código si la firma es válida y no expiró; None en otro caso
+    if not es_firmado(codigo):
+        return None
+    partes = codigo.split('.')
+    if len(partes) != PARTES:
+        return None
+    _, clave, usuario, evento, punto, expiracion, _, firma = partes
+    if not _vigente(clave):
+        return None
+    if not hmac.compare_digest(firma, _firma(clave, codigo.rsplit('.', 1)[0])):
+        return None
+    try:
+        datos = {
+            'codigo': codigo,
+            'usuario_id': int(usuario),
+            'evento_id': int(evento) if evento else None,
+            'punto_id': int(punto) if punto else None,
+            'fecha_expiracion': (
+                datetime.datetime.fromtimestamp(int(expiracion), tz=datetime.timezone.utc) if expiracion else None
+            ),
+        }
+    except ValueError:
+        return None
+    if datos['fecha_expiracion'] and datos['fecha_expiracion'] <= timezone.now():
+        return None
+    return datos
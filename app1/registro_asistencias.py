@@ -0,0 +1,113 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Asistencia
+from .signals import creacion_masiva
+
+# --------------------------
+# Registro idempotente de asistencias
+#
+# La base de datos garantiza una asistencia por (usuario, evento, punto) y por (usuario,
+# clave de idempotencia): la clave de otro usuario nunca devuelve su asistencia. Un reintento o un escaneo repetido recibe la asistencia que ya existe:
+# en PostgreSQL el INSERT y la lectura del registro existente van en una sola sentencia.
+# Los escaneos repetidos dentro de ASISTENCIAS_VENTANA_SEGUNDOS se responden desde
+# memoria sin llegar a la base de datos.
+
+COLUMNAS = ['id', 'usuario_id', 'evento_id', 'punto_id', 'fecha_registro', 'metodo', 'estado', 'clave_idempotencia']
+METODOS = {valor for valor, _ in Asistencia._meta.get_field('metodo').choices}
+ESTADOS = {valor for valor, _ in Asistencia._meta.get_field('estado').choices}
+LARGO_CLAVE = Asistencia._meta.get_field('clave_idempotencia').max_length
+
+
+def validar(metodo, estado, clave):
+    # Datos que no dependen de la base de datos; devuelve el mensaje de error o None
+    if metodo not in METODOS:
+        return f'metodo debe ser uno de {", ".join(sorted(METODOS))}'
+    if estado not in ESTADOS:
+        return f'estado debe ser uno de {", ".join(sorted(ESTADOS))}'
+    if clave is not None and (not isinstance(clave, str) or len(clave) > LARGO_CLAVE):
+        return f'La clave de idempotencia debe ser texto de hasta {LARGO_CLAVE} caracteres'
+    return None
+
+
+def _ventana():
+    return caches[settings.ASISTENCIAS_VENTANA_CACHE]
+
+
+def _claves_ventana(usuario_id, evento_id, punto_id, clave):
+    claves = [f'asistencia:{usuario_id}:{evento_id}:{punto_id}']
+    if clave:
+        claves.append(f'asistencia:{usuario_id}:clave:{clave}')
+    return claves
+
+
+def buscar_en_ventana(usuario_id, evento_id, punto_id=None, clave=None):
+    encontradas = _ventana().get_many(_claves_ventana(usuario_id, evento_id, punto_id, clave))
+    return next(iter(encontradas.values()), None)
+
+
+def guardar_en_ventana(datos, clave=None):
+    claves = _claves_ventana(datos['usuario'], datos['evento'], datos['punto'], clave)
+    _ventana().set_many(dict.fromkeys(claves, datos), timeout=settings.ASISTENCIAS_VENTANA_SEGUNDOS)
+
+
+async def abuscar_en_ventana(usuario_id, evento_id, punto_id=None, clave=None):
+    encontradas = await _ventana().aget_many(_claves_ventana(usuario_id, evento_id, punto_id, clave))
+    return next(iter(encontradas.values()), None)
+
+
+async def aguardar_en_ventana(datos, clave=None):
+    claves = _claves_ventana(datos['usuario'], datos['evento'], datos['punto'], clave)
+    await _ventana().aset_many(dict.fromkeys(claves, datos), timeout=settings.ASISTENCIAS_VENTANA_SEGUNDOS)
+
+
+def _sentencias(punto_id, clave):
+    tabla = connection.ops.quote_name(Asistencia._meta.db_table)
+    columnas = ', '.join(COLUMNAS[1:])
+    retorno = ', '.join(COLUMNAS)
+    # Mismo criterio de unicidad que las restricciones del modelo
+    existente = 'usuario_id = %s AND evento_id = %s AND ' + ('punto_id = %s' if punto_id is not None else 'punto_id IS NULL')
+    if clave:
+        existente = f'({existente}) OR (usuario_id = %s AND clave_idempotencia = %s)'
+    insertar = f'INSERT INTO {tabla} ({columnas}) VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING'
+    leer = f'SELECT {retorno}, FALSE AS creada FROM {tabla} WHERE ({existente})'
+
+    if connection.vendor == 'postgresql':
+        # Inserta o, si ya existía, devuelve el registro existente en la misma sentencia
+        insertar = (
+            f'WITH nueva AS ({insertar} RETURNING {retorno}, TRUE AS creada) '
+            f'SELECT * FROM nueva UNION ALL ({leer} AND NOT EXISTS (SELECT 1 FROM nueva))'
+        )
+    else:
+        insertar = f'{insertar} RETURNING {retorno}, TRUE AS creada'
+    return insertar, leer
+
+
+def registrar(usuario_id, evento_id, metodo, estado, punto_id=None, clave=None):
+    # Devuelve (asistencia, creada)
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    valores = [usuario_id, evento_id, punto_id, ahora, metodo, estado, clave or None]
+    existente = [usuario_id, evento_id] + ([punto_id] if punto_id is not None else []) + ([usuario_id, clave] if clave else [])
+    insertar, leer = _sentencias(punto_id, clave)
+    if connection.vendor == 'postgresql':
+        valores += existente
+
+    with transaction.atomic():
+        filas = list(Asistencia.objects.raw(insertar, valores))
+        if not filas:
+            # Otros motores no leen el registro existente en el INSERT; en PostgreSQL esto
+            # solo ocurre si la inserción concurrente confirmó después de nuestra instantánea
+            filas = list(Asistencia.objects.raw(leer, existente))
+        asistencia = filas[0]
+        asistencia.creada = bool(asistencia.creada)
+        if asistencia.creada:
+            creacion_masiva.send(sender=Asistencia, instancias=[asistencia])
+    return asistencia, asistencia.creada
+
+
+# raw() y transaction.atomic() no tienen API asíncrona: el INSERT va en un solo salto
+# al hilo de la base de datos
+aregistrar = sync_to_async(registrar)
@@ -0,0 +1,112 @@
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Asistencia, AsistenciaArchivada, ResumenAsistencias, MarcaResumen
+
+# --------------------------
+# Resúmenes de asistencia por hora y por día
+#
+# Cada corrida toma las asistencias con id mayor que la marca, en bloques de
+# RESUMEN_CHUNK, y las agrupa en una sola consulta al grano más fino (hora, evento,
+# punto, ficha, jornada, estado, método). Desde ahí se suman en Python las filas de
+# cada dimensión por hora y por día, y se aplican con INSERT ... ON CONFLICT en la
+# misma transacción que avanza la marca. Así cada asistencia se suma una sola vez.
+#
+# Los ids no siempre se confirman en orden: la marca no pasa de asistencias más
+# recientes que RESUMEN_MARGEN_SEGUNDOS para que una transacción lenta no quede atrás.
+# Los resúmenes son históricos: borrar usuarios o eventos no los descuenta
+# (--reconstruir los recalcula desde la tabla).
+
+MARCA = 'asistencias'
+
+
+def _marca():
+    marca, _ = MarcaResumen.objects.select_for_update().get_or_create(nombre=MARCA)
+    return marca
+
+
+def _limite(desde, chunk, corte):
+    # Mayor id del bloque cuyas filas son todas anteriores al corte
+    hasta = desde
+    filas = Asistencia.objects.filter(id__gt=desde).order_by('id').values_list('id', 'fecha_registro')[:chunk]
+    for asistencia_id, fecha in filas:
+        if fecha >= corte:
+            break
+        hasta = asistencia_id
+    return hasta
+
+
+def _sumar(asistencias):
+    grupos = (
+        asistencias
+        .annotate(hora=TruncHour('fecha_registro'))
+        .values('hora', 'evento_id', 'punto_id', 'usuario__ficha', 'usuario__jornada', 'estado', 'metodo')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    totales = Counter()
+    for grupo in grupos:
+        hora = grupo['hora']
+        dia = timezone.localtime(hora).replace(hour=0) if settings.USE_TZ else hora.replace(hour=0)
+        valores = {
+            'evento': str(grupo['evento_id']),
+            'punto': str(grupo['punto_id'] or ''),
+            'ficha': grupo['usuario__ficha'] or '',
+            'jornada': grupo['usuario__jornada'] or '',
+        }
+        for dimension, valor in valores.items():
+            for granularidad, periodo in (('hora', hora), ('dia', dia)):
+                totales[granularidad, dimension, valor, periodo, grupo['estado'], grupo['metodo']] += grupo['total']
+    return totales
+
+
+def _guardar(totales):
+    if not totales:
+        return
+    tabla = connection.ops.quote_name(ResumenAsistencias._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (granularidad, dimension, valor, periodo, estado, metodo, total) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (granularidad, dimension, valor, periodo, estado, metodo) '
+            f'DO UPDATE SET total = {tabla}.total + EXCLUDED.total',
+            [
+                (granularidad, dimension, valor, connection.ops.adapt_datetimefield_value(periodo), estado, metodo, total)
+                for (granularidad, dimension, valor, periodo, estado, metodo), total in totales.items()
+            ],
+        )
+
+
+def actualizar(chunk=None, margen=None):
+    # Procesa todos los bloques pendientes; devuelve cuántas asistencias sumó
+    chunk = chunk or settings.RESUMEN_CHUNK
+    margen = settings.RESUMEN_MARGEN_SEGUNDOS if margen is None else margen
+    corte = timezone.now() - datetime.timedelta(seconds=margen)
+    procesadas = 0
+    while True:
+        with transaction.atomic():
+            # select_for_update serializa corridas simultáneas del comando
+            marca = _marca()
+            hasta = _limite(marca.ultimo_id, chunk, corte)
+            if hasta == marca.ultimo_id:
+                return procesadas
+            procesadas += Asistencia.objects.filter(id__gt=marca.ultimo_id, id__lte=hasta).count()
+            _guardar(_sumar(Asistencia.objects.filter(id__gt=marca.ultimo_id, id__lte=hasta)))
+            marca.ultimo_id = hasta
+            marca.save()
+
+
+def reconstruir(chunk=None, margen=None):
+    # El archivo (app1.archivo) se suma completo; luego Asistencia desde el id 0
+    with transaction.atomic():
+        _marca()
+        ResumenAsistencias.objects.all().delete()
+        MarcaResumen.objects.filter(nombre=MARCA).update(ultimo_id=0)
+        _guardar(_sumar(AsistenciaArchivada.objects.all()))
+    return AsistenciaArchivada.objects.count() + actualizar(chunk, margen)
@@ -0,0 +1,144 @@
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# --------------------------
+# Réplicas de lectura
+#
+# ReplicaMiddleware marca las peticiones GET/HEAD a vistas con lectura_en_replica = True
+# (listados, reportes, dashboard) y ReplicaRouter manda sus lecturas a una de las réplicas
+# de DATABASE_REPLICAS, la misma durante toda la petición. Todo lo demás, las escrituras y
+# las lecturas dentro de una transacción van a 'default'.
+#
+# Lectura de lo propio: una petición de escritura exitosa fija a su cliente (su header
+# Authorization) en la primaria durante REPLICA_FIJAR_SEGUNDOS, así el listado que pide
+# justo después ya ve su registro o su edición. El retraso de cada réplica se mide cada
+# REPLICA_LAG_INTERVALO segundos; una réplica caída o con más de REPLICA_LAG_MAXIMO
+# segundos de retraso no recibe lecturas y, si no queda ninguna, se lee de la primaria.
+
+# En una réplica al día (todo lo recibido ya aplicado) el retraso es 0 aunque la primaria
+# no haya escrito nada en un rato. En la primaria ambas funciones devuelven NULL
+SQL_RETRASO = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+_lectura = ContextVar('lectura_en_replica', default=None)
+_retrasos = {}  # alias -> (segundos de retraso, momento de la medición)
+
+
+class _Lectura:
+    __slots__ = ('permitida', 'alias', 'transacciones')
+
+    def __init__(self):
+        self.permitida = False  # La activa ReplicaMiddleware.process_view
+        self.alias = None
+        # Transacciones ya abiertas al empezar la petición (las de TestCase en las pruebas)
+        self.transacciones = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+def comprobar_cache():
+    # Se llama al arrancar (App1Config.ready): con una cache de un solo proceso la fijación
+    # solo vale en el worker que atendió la escritura y el cliente puede no ver lo que escribió
+    if not settings.DATABASE_REPLICAS or settings.DEBUG:
+        return
+    if isinstance(caches[settings.REPLICA_CACHE], (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f"REPLICA_CACHE ('{settings.REPLICA_CACHE}') no se comparte entre workers; "
+            "configure Redis o Memcached, o quite las réplicas de DATABASES"
+        )
+
+
+def clave_cliente(request):
+    autorizacion = request.META.get('HTTP_AUTHORIZATION')
+    return f'replica:primaria:{hashlib.sha1(autorizacion.encode()).hexdigest()}' if autorizacion else None
+
+
+def fijar_en_primaria(request):
+    clave = clave_cliente(request)
+    if clave and settings.DATABASE_REPLICAS:
+        caches[settings.REPLICA_CACHE].set(clave, True, settings.REPLICA_FIJAR_SEGUNDOS)
+
+
+def fijado_en_primaria(request):
+    clave = clave_cliente(request)
+    return clave is not None and caches[settings.REPLICA_CACHE].get(clave, False)
+
+
+def iniciar():
+    lectura = _Lectura()
+    return lectura, _lectura.set(lectura)
+
+
+def terminar(token):
+    _lectura.reset(token)
+
+
+@contextmanager
+def primaria():
+    # Lecturas que no pueden estar atrasadas aunque la vista use réplica
+    token = _lectura.set(None)
+    try:
+        yield
+    finally:
+        _lectura.reset(token)
+
+
+def retraso(alias):
+    medicion = _retrasos.get(alias)
+    if medicion and time.monotonic() - medicion[1] < settings.REPLICA_LAG_INTERVALO:
+        return medicion[0]
+    try:
+        conexion = connections[alias]
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                cursor.execute(SQL_RETRASO)
+                segundos = float(cursor.fetchone()[0] or 0)
+            else:
+                cursor.execute('SELECT 1')
+                segundos = 0.0
+    except DatabaseError:
+        segundos = float('inf')
+    _retrasos[alias] = (segundos, time.monotonic())
+    return segundos
+
+
+def elegir_replica():
+    disponibles = [alias for alias in settings.DATABASE_REPLICAS if retraso(alias) <= settings.REPLICA_LAG_MAXIMO]
+    return random.choice(disponibles) if disponibles else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        lectura = _lectura.get()
+        if lectura is None or not lectura.permitida:
+            return None
+        if len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > lectura.transacciones:
+            # Lo leído dentro de una transacción de la vista tiene que ver sus propias escrituras
+            return None
+        if lectura.alias is None:
+            lectura.alias = elegir_replica()
+        return lectura.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas son copias de 'default': un objeto leído de una se puede relacionar con otro de la primaria
+        bases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        return db not in settings.DATABASE_REPLICAS
@@ -36,12 +36,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('confirm')
-        password = validated_data.pop('password', None)
-        user = User.objects.create_user(**validated_data)
-        if password:
-            user.set_password(password)
-            user.save()
-        return user
+        # create_user ya hashea la contraseña; no volver a hacerlo aquí
+        return User.objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
         validated_data.pop('confirm', None)
@@ -110,4 +106,57 @@ class QRSerializer(serializers.ModelSerializer):
     def validate_fecha_expiracion(self, value):
         if value and value <= timezone.now():
             raise serializers.ValidationError("La fecha de expiración debe ser futura")
-        return value
\ No newline at end of file
+        return value
+
+# --------------------------
+# SERIALIZACIÓN RÁPIDA PARA LISTADOS
+# Arma el mismo JSON que el serializador a partir de tuplas de values_list(), sin crear
+# instancias del modelo ni recorrer los campos de DRF por cada fila. Solo se llama a
+# to_representation en los campos que transforman el valor (fechas); el resto se copia tal cual.
+class SerializadorListado:
+    campos_directos = (
+        serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+        serializers.ChoiceField, serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.campos = None
+
+    def compilar(self):
+        modelo = self.serializer_class.Meta.model
+        columnas, campos = [], []
+        for nombre, campo in self.serializer_class().fields.items():
+            if campo.write_only:
+                continue
+            # Las relaciones se leen de la columna del id (docente -> docente_id)
+            columna = modelo._meta.get_field(campo.source).attname
+            if columna not in columnas:
+                columnas.append(columna)
+            convertir = None if isinstance(campo, self.campos_directos) else campo.to_representation
+            campos.append((nombre, columnas.index(columna), convertir))
+        self.columnas = tuple(columnas)
+        self.campos = tuple(campos)
+
+    def valores(self, queryset):
+        if self.campos is None:
+            self.compilar()
+        return queryset.values_list(*self.columnas)
+
+    def serializar(self, filas):
+        if self.campos is None:
+            self.compilar()
+        campos = self.campos
+        return [
+            {
+                nombre: fila[posicion] if convertir is None or fila[posicion] is None else convertir(fila[posicion])
+                for nombre, posicion, convertir in campos
+            }
+            for fila in filas
+        ]
+
+
+user_listado = SerializadorListado(UserSerializer)
+evento_listado = SerializadorListado(EventoSerializer)
+asistencia_listado = SerializadorListado(AsistenciaSerializer)
+qr_listado = SerializadorListado(QRSerializer)
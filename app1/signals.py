@@ -0,0 +1,268 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver, Signal
+
+from . import authentication, estadisticas, geolocalizacion, metricas, sincronizacion, validacion_qr, versiones
+from .models import User, QR, Evento, Asistencia, AsistenciaArchivada, PuntoDeControl
+
+# Enviada por las vistas que usan bulk_create (que no dispara post_save),
+# con sender=<modelo> e instancias=<objetos creados>
+creacion_masiva = Signal()
+
+
+def _acumular_en_origen(instance, origin, atributo, valor):
+    # En un borrado en cascada desde un usuario o evento, los post_delete de cada fila
+    # dependiente acumulan su efecto en el origen, que lo aplica una sola vez en su propio
+    # post_delete (Django borra y notifica las dependencias antes que el origen)
+    if origin is instance or not isinstance(origin, (User, Evento)):
+        return False
+    origin.__dict__.setdefault(atributo, []).append(valor)
+    return True
+
+
+# --------------------------
+# Instrumentación de consultas (app1.middleware)
+
+@receiver(connection_created)
+def instrumentar_conexion(sender, connection, **kwargs):
+    if metricas.contar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metricas.contar_consulta)
+
+
+# --------------------------
+# Cache de validación de QR
+
+@receiver([post_save, post_delete], sender=QR)
+def invalidar_cache_qr(sender, instance, **kwargs):
+    codigo = instance.codigo
+    transaction.on_commit(lambda: validacion_qr.invalidar_qr(codigo))
+
+
+@receiver([post_save, post_delete], sender=Evento)
+def invalidar_cache_evento(sender, instance, **kwargs):
+    evento_id = instance.pk
+    transaction.on_commit(lambda: validacion_qr.invalidar_evento(evento_id))
+
+
+# --------------------------
+# Índice espacial de puntos de control
+
+@receiver([post_save, post_delete], sender=PuntoDeControl)
+def invalidar_indice_puntos(sender, instance, **kwargs):
+    evento_id = instance.evento_id
+    transaction.on_commit(lambda: geolocalizacion.invalidar(evento_id))
+
+
+@receiver(post_delete, sender=Evento)
+def eliminar_indice_evento(sender, instance, **kwargs):
+    evento_id = instance.pk
+    transaction.on_commit(lambda: geolocalizacion.invalidar(evento_id))
+
+
+# --------------------------
+# Cache de usuarios autenticados
+
+@receiver([post_save, post_delete], sender=User)
+def invalidar_usuario_autenticado(sender, instance, **kwargs):
+    usuario_id = instance.pk
+    transaction.on_commit(lambda: authentication.invalidar_usuario(usuario_id))
+
+
+# --------------------------
+# Versiones para ETag
+
+@receiver([post_save, post_delete], sender=Evento)
+def versionar_evento(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versiones.incrementar(versiones.EVENTOS, *getattr(instance, '_usuarios_qr', ()))
+
+
+@receiver([post_save, post_delete], sender=QR)
+def versionar_qr(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _acumular_en_origen(instance, origin, '_usuarios_qr', versiones.qrs(instance.usuario_id)):
+        return
+    versiones.incrementar(versiones.qrs(instance.usuario_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def versionar_usuario(sender, instance, raw=False, signal=None, **kwargs):
+    if raw:
+        return
+    claves = [versiones.usuario(instance.pk)]
+    if signal is post_delete:
+        # Sus eventos quedan con docente NULL mediante un UPDATE que no emite signals
+        claves += [versiones.EVENTOS, *instance.__dict__.pop('_usuarios_qr', ())]
+    versiones.incrementar(*claves)
+
+
+@receiver(pre_delete, sender=Evento)
+@receiver(pre_delete, sender=PuntoDeControl)
+def recordar_usuarios_qr(sender, instance, origin=None, **kwargs):
+    # on_delete=SET_NULL en QR cambia sus listados sin pasar por post_save
+    if sender is Evento:
+        # Incluye los QR de los puntos del evento, que se borran en la misma cascada
+        filtro = Q(evento=instance) | Q(punto__evento=instance)
+    elif isinstance(origin, Evento):
+        return
+    else:
+        filtro = Q(punto=instance)
+    instance._usuarios_qr = [
+        versiones.qrs(usuario_id)
+        for usuario_id in QR.objects.filter(filtro).values_list('usuario_id', flat=True).distinct()
+    ]
+
+
+@receiver(post_delete, sender=PuntoDeControl)
+def versionar_punto(sender, instance, **kwargs):
+    versiones.incrementar(*getattr(instance, '_usuarios_qr', ()))
+
+
+@receiver(creacion_masiva, sender=User)
+def versionar_usuarios_masivos(sender, instancias, **kwargs):
+    versiones.incrementar(*(versiones.usuario(usuario.pk) for usuario in instancias))
+
+
+@receiver(creacion_masiva, sender=QR)
+def versionar_qrs_masivos(sender, instancias, **kwargs):
+    versiones.incrementar(*(versiones.qrs(qr.usuario_id) for qr in instancias))
+
+
+# --------------------------
+# Registro de cambios para escáneres sin conexión (app1.sincronizacion)
+
+# Campos de User que forman parte del padrón de un escáner
+CAMPOS_PADRON = set(sincronizacion.CAMPOS_USUARIO)
+
+
+@receiver([post_save, post_delete], sender=QR)
+def registrar_cambio_qr(sender, instance, raw=False, origin=None, **kwargs):
+    cambio = (instance.pk, instance.evento_id)
+    if raw or _acumular_en_origen(instance, origin, '_cambios_qr', cambio):
+        return
+    sincronizacion.registrar('qr', [cambio])
+
+
+@receiver([post_save, post_delete], sender=Evento)
+def registrar_cambio_evento(sender, instance, raw=False, **kwargs):
+    # Al borrarlo sus QR quedan con evento NULL sin signals: el escáner descarta los del evento
+    if not raw:
+        sincronizacion.registrar('evento', [(instance.pk, instance.pk)])
+
+
+@receiver(post_save, sender=User)
+def registrar_cambio_usuario(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Un usuario nuevo no tiene QR todavía: llega al padrón con su primer código
+    if raw or created or (update_fields is not None and not CAMPOS_PADRON & set(update_fields)):
+        return
+    sincronizacion.registrar('usuario', [(instance.pk, None)])
+
+
+@receiver(post_delete, sender=User)
+def registrar_cambios_en_cascada(sender, instance, **kwargs):
+    # Los QR borrados con el usuario se registran juntos; el escáner lo saca del padrón
+    # cuando se queda sin códigos
+    cambios = instance.__dict__.pop('_cambios_qr', None)
+    if cambios:
+        sincronizacion.registrar('qr', cambios)
+
+
+@receiver(creacion_masiva, sender=QR)
+def registrar_qrs_masivos(sender, instancias, **kwargs):
+    sincronizacion.registrar('qr', [(qr.pk, qr.evento_id) for qr in instancias])
+
+
+# --------------------------
+# Contadores del dashboard
+
+@receiver(pre_save, sender=User)
+def recordar_rol(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and 'rol' not in update_fields):
+        return
+    instance._rol_anterior = sender.objects.filter(pk=instance.pk).values_list('rol', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def contar_usuario(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    es_aprendiz = int(instance.rol == 'Aprendiz')
+    if created:
+        estadisticas.actualizar(total_usuarios=1, total_aprendices=es_aprendiz)
+    elif hasattr(instance, '_rol_anterior'):
+        estadisticas.actualizar(total_aprendices=es_aprendiz - int(instance._rol_anterior == 'Aprendiz'))
+        del instance._rol_anterior
+
+
+@receiver(post_delete, sender=User)
+def descontar_usuario(sender, instance, **kwargs):
+    estadisticas.actualizar(total_usuarios=-1, total_aprendices=-int(instance.rol == 'Aprendiz'))
+
+
+@receiver(pre_save, sender=Evento)
+def recordar_activo(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and 'activo' not in update_fields):
+        return
+    instance._activo_anterior = sender.objects.filter(pk=instance.pk).values_list('activo', flat=True).first()
+
+
+@receiver(post_save, sender=Evento)
+def contar_evento(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    activo = int(bool(instance.activo))
+    if created:
+        estadisticas.actualizar(total_eventos=1, eventos_activos=activo)
+    elif hasattr(instance, '_activo_anterior'):
+        estadisticas.actualizar(eventos_activos=activo - int(bool(instance._activo_anterior)))
+        del instance._activo_anterior
+
+
+@receiver(post_delete, sender=Evento)
+def descontar_evento(sender, instance, **kwargs):
+    estadisticas.actualizar(total_eventos=-1, eventos_activos=-int(bool(instance.activo)))
+
+
+@receiver(post_save, sender=Asistencia)
+def contar_asistencia(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        estadisticas.sumar_asistencias([instance.fecha_registro])
+
+
+@receiver(post_delete, sender=Asistencia)
+def descontar_asistencia(sender, instance, origin=None, **kwargs):
+    if not _acumular_en_origen(instance, origin, '_fechas_asistencias', instance.fecha_registro):
+        estadisticas.sumar_asistencias([instance.fecha_registro], signo=-1)
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Evento)
+def recordar_asistencias_archivadas(sender, instance, **kwargs):
+    # Django borra el archivo con un DELETE directo, sin signals por fila: sus fechas se
+    # descuentan junto con las de Asistencia en descontar_asistencias_en_cascada
+    filtro = {'usuario': instance} if sender is User else {'evento': instance}
+    fechas = list(AsistenciaArchivada.objects.filter(**filtro).values_list('fecha_registro', flat=True))
+    if fechas:
+        instance.__dict__.setdefault('_fechas_asistencias', []).extend(fechas)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Evento)
+def descontar_asistencias_en_cascada(sender, instance, **kwargs):
+    fechas = instance.__dict__.pop('_fechas_asistencias', None)
+    if fechas:
+        estadisticas.sumar_asistencias(fechas, signo=-1)
+
+
+@receiver(creacion_masiva, sender=User)
+def contar_usuarios_masivos(sender, instancias, **kwargs):
+    estadisticas.actualizar(
+        total_usuarios=len(instancias),
+        total_aprendices=sum(1 for usuario in instancias if usuario.rol == 'Aprendiz'),
+    )
+
+
+@receiver(creacion_masiva, sender=Asistencia)
+def contar_asistencias_masivas(sender, instancias, **kwargs):
+    estadisticas.sumar_asistencias([asistencia.fecha_registro for asistencia in instancias])
@@ -0,0 +1,158 @@
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import User, Evento, QR, CambioSync
+
+# --------------------------
+# Sincronización de escáneres sin conexión
+#
+# Un escáner pide los códigos válidos y el padrón de sus eventos una vez (completo) y
+# después solo lo que cambió desde su cursor. Los signals registran en CambioSync qué QR,
+# evento o usuario cambió, en la misma transacción que el cambio; la respuesta vuelve a
+# leer esos objetos, así que su tamaño depende de los cambios y no del total de filas.
+# Las expiraciones no escriben nada: se calculan con fecha_expiracion entre la fecha del
+# cursor anterior y ahora.
+#
+# Los ids no siempre se confirman en orden: el cursor no pasa de cambios más recientes que
+# SYNC_MARGEN_SEGUNDOS, que se vuelven a enviar en la siguiente sincronización (aplicarlos
+# dos veces da lo mismo). Un cursor más viejo que SYNC_RETENCION_DIAS, de otros eventos o con
+# más de SYNC_MAXIMO_CAMBIOS pendientes recibe otra vez la respuesta completa.
+
+CAMPOS_EVENTO = ('id', 'nombre', 'tipo', 'fecha_inicio', 'fecha_fin', 'jornada', 'activo')
+CAMPOS_QR = ('id', 'codigo', 'usuario_id', 'evento_id', 'punto_id', 'fecha_expiracion')
+CAMPOS_USUARIO = ('id', 'documento', 'nombre', 'apellido', 'ficha', 'jornada', 'rol')
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def registrar(modelo, objetos):
+    # objetos: pares (objeto_id, evento_id)
+    CambioSync.objects.bulk_create(
+        CambioSync(modelo=modelo, objeto_id=objeto_id, evento_id=evento_id) for objeto_id, evento_id in objetos
+    )
+
+
+def _huella(eventos):
+    return hashlib.sha1(','.join(map(str, sorted(eventos))).encode()).hexdigest()[:8]
+
+
+def _cursor(cambio_id, fecha, eventos):
+    return f'{cambio_id}.{int(fecha.timestamp())}.{_huella(eventos)}'
+
+
+def _leer_cursor(cursor):
+    try:
+        cambio_id, segundos, huella = cursor.split('.')
+        return int(cambio_id), datetime.datetime.fromtimestamp(int(segundos), datetime.timezone.utc), huella
+    except (ValueError, OverflowError, OSError):
+        raise CursorInvalido(cursor)
+
+
+def _ultimo_confirmado(ahora):
+    # Mayor id de los cambios anteriores al margen; se recorre desde el más reciente
+    corte = ahora - datetime.timedelta(seconds=settings.SYNC_MARGEN_SEGUNDOS)
+    return CambioSync.objects.filter(fecha__lt=corte).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _vigentes(eventos, ahora):
+    return QR.objects.filter(evento_id__in=eventos, activo=True).filter(
+        Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gt=ahora)
+    )
+
+
+def _codigos_y_padron(qrs):
+    # Una sola consulta con los datos del dueño de cada código
+    codigos, padron = [], {}
+    for fila in qrs.values(*CAMPOS_QR, *(f'usuario__{campo}' for campo in CAMPOS_USUARIO[1:])):
+        codigos.append({campo: fila[campo] for campo in CAMPOS_QR})
+        padron[fila['usuario_id']] = {
+            'id': fila['usuario_id'], **{campo: fila[f'usuario__{campo}'] for campo in CAMPOS_USUARIO[1:]},
+        }
+    return codigos, padron
+
+
+def completo(eventos, ahora=None):
+    ahora = ahora or timezone.now()
+    # El cursor se toma antes de leer: lo confirmado después llega en la siguiente sincronización
+    cambio_id = _ultimo_confirmado(ahora)
+    existentes = list(Evento.objects.filter(pk__in=eventos).order_by('id').values(*CAMPOS_EVENTO))
+    codigos, padron = _codigos_y_padron(_vigentes(eventos, ahora).order_by('id'))
+    return {
+        'cursor': _cursor(cambio_id, ahora, eventos),
+        'completo': True,
+        'eventos': existentes,
+        'eventos_eliminados': sorted(set(eventos) - {evento['id'] for evento in existentes}),
+        'codigos': codigos,
+        'codigos_bajas': [],
+        'usuarios': list(padron.values()),
+    }
+
+
+def sincronizar(eventos, cursor=None):
+    ahora = timezone.now()
+    if cursor is None:
+        return completo(eventos, ahora)
+    desde, fecha, huella = _leer_cursor(cursor)
+    # Los cambios posteriores al cursor pueden ser hasta SYNC_MARGEN_SEGUNDOS anteriores a su fecha
+    retenido = ahora - datetime.timedelta(days=settings.SYNC_RETENCION_DIAS, seconds=-settings.SYNC_MARGEN_SEGUNDOS)
+    if huella != _huella(eventos) or fecha < retenido:
+        return completo(eventos, ahora)
+
+    cambio_id = _ultimo_confirmado(ahora)
+    cambios = list(
+        CambioSync.objects.filter(id__gt=desde)
+        .filter(Q(evento_id__in=eventos) | Q(evento_id__isnull=True))
+        .values_list('modelo', 'objeto_id')[:settings.SYNC_MAXIMO_CAMBIOS + 1]
+    )
+    if len(cambios) > settings.SYNC_MAXIMO_CAMBIOS:
+        return completo(eventos, ahora)
+    ids = {'qr': set(), 'evento': set(), 'usuario': set()}
+    for modelo, objeto_id in cambios:
+        ids[modelo].add(objeto_id)
+
+    eventos_cambiados, eventos_eliminados = [], []
+    if ids['evento']:
+        eventos_cambiados = list(Evento.objects.filter(pk__in=ids['evento']).order_by('id').values(*CAMPOS_EVENTO))
+        eventos_eliminados = sorted(ids['evento'] - {evento['id'] for evento in eventos_cambiados})
+
+    codigos, padron = [], {}
+    if ids['qr']:
+        codigos, padron = _codigos_y_padron(_vigentes(eventos, ahora).filter(pk__in=ids['qr']).order_by('id'))
+    # Bajas: QR cambiados que ya no son válidos (desactivados, borrados) y los que expiraron
+    # desde la sincronización anterior
+    bajas = ids['qr'] - {codigo['id'] for codigo in codigos}
+    bajas.update(
+        QR.objects.filter(evento_id__in=eventos, activo=True, fecha_expiracion__gt=fecha, fecha_expiracion__lte=ahora)
+        .values_list('id', flat=True)
+    )
+
+    # Usuarios editados que tienen algún código válido en estos eventos
+    editados = ids['usuario'] - padron.keys()
+    if editados:
+        for usuario in (
+            User.objects.filter(pk__in=editados, qr__in=_vigentes(eventos, ahora)).distinct().values(*CAMPOS_USUARIO)
+        ):
+            padron[usuario['id']] = usuario
+
+    return {
+        'cursor': _cursor(max(desde, cambio_id), ahora, eventos),
+        'completo': False,
+        'eventos': eventos_cambiados,
+        'eventos_eliminados': eventos_eliminados,
+        'codigos': codigos,
+        'codigos_bajas': sorted(bajas),
+        'usuarios': list(padron.values()),
+    }
+
+
+def purgar():
+    # Borra los cambios más viejos que la retención; sus cursores ya reciben la respuesta completa
+    limite = timezone.now() - datetime.timedelta(days=settings.SYNC_RETENCION_DIAS)
+    borrados, _ = CambioSync.objects.filter(fecha__lt=limite).delete()
+    return borrados
@@ -1,3 +1,1962 @@
-from django.test import TestCase
+import base64
+import bisect
+import csv
+import datetime
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import Count, Q
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    archivo, cierre_eventos, estadisticas, generacion_qr, geolocalizacion, imagenes_qr, importacion, metricas,
+    qr_firmado, registro_asistencias, resumenes, routers, sincronizacion, urls, validacion_qr,
+)
+from .authentication import (
+    JWTCacheAuthentication, JWTClaimsAuthentication, aautenticar, emitir_tokens, usuario_completo,
+)
+from .models import (
+    User, Evento, PuntoDeControl, Asistencia, AsistenciaArchivada, QR, Estadisticas, AsistenciasPorDia,
+    MarcaResumen, ResumenAsistencias, CambioSync,
+)
+from .pagination import KeysetPagination
+from .serializers import (
+    UserSerializer, EventoSerializer, AsistenciaSerializer, QRSerializer,
+    user_listado, evento_listado, asistencia_listado, qr_listado,
+)
+from .verificacion_login import Saturado, VerificadorPasswords
+
+
+# --------------------------
+# Datos de prueba
+
+def crear_datos(aprendices=200, eventos=5, asistencias_por_usuario=5):
+    ahora = timezone.now()
+    User.objects.bulk_create(
+        User(
+            documento=f'doc{i}', nombre=f'Nombre{i}', apellido=f'Apellido{i}', email=f'u{i}@cba.test',
+            rol='Aprendiz' if i % 10 else 'Instructor', ficha=f'F{i % 7}', jornada='mañana', password='!',
+        )
+        for i in range(aprendices)
+    )
+    usuarios = list(User.objects.order_by('id'))
+    Evento.objects.bulk_create(
+        Evento(nombre=f'Evento {i}', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora + datetime.timedelta(hours=4),
+               jornada='mañana', activo=i % 2 == 0, docente=usuarios[0])
+        for i in range(eventos)
+    )
+    lista_eventos = list(Evento.objects.order_by('id'))
+    PuntoDeControl.objects.bulk_create(
+        PuntoDeControl(nombre=f'Punto {i}', descripcion='', latitud=4.6 + i / 1000, longitud=-74.0, evento=evento)
+        for i, evento in enumerate(lista_eventos)
+    )
+    QR.objects.bulk_create(
+        QR(usuario=usuario, evento=evento, codigo=f'qr-{usuario.pk}-{evento.pk}', activo=usuario.pk % 5 != 0)
+        for usuario in usuarios for evento in lista_eventos
+    )
+    Asistencia.objects.bulk_create(
+        Asistencia(usuario=usuario, evento=lista_eventos[j % eventos], metodo='qr', estado='presente')
+        for usuario in usuarios for j in range(asistencias_por_usuario)
+    )
+    return usuarios, lista_eventos
+
+
+# --------------------------
+# Planes de ejecución de las consultas frecuentes
+
+class PlanesConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.eventos = crear_datos()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Con pocos datos PostgreSQL prefiere un Seq Scan aunque exista el índice;
+            # al desactivarlo solo aparece si ningún índice sirve para la consulta
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            self.addCleanup(self.restaurar_seqscan)
+
+    def restaurar_seqscan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertSinScanSecuencial(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan, plan)
+        elif connection.vendor == 'sqlite':
+            # "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+            for linea in plan.splitlines():
+                self.assertFalse(re.search(r'\bSCAN app1_\w+$', linea.strip()), plan)
+
+    def test_qr_por_codigo(self):
+        self.assertSinScanSecuencial(QR.objects.filter(codigo='qr-1-1'))
+
+    def test_qr_activos_de_evento(self):
+        self.assertSinScanSecuencial(QR.objects.filter(evento=self.eventos[0], activo=True))
+
+    def test_qr_de_usuario_para_evento(self):
+        self.assertSinScanSecuencial(QR.objects.filter(usuario=self.usuarios[3], evento=self.eventos[1]))
+
+    def test_historial_de_usuario(self):
+        self.assertSinScanSecuencial(
+            Asistencia.objects.filter(usuario=self.usuarios[3]).order_by('-fecha_registro', '-id')[:101]
+        )
+
+    def test_asistencias_de_evento(self):
+        self.assertSinScanSecuencial(Asistencia.objects.filter(evento=self.eventos[2]).order_by('fecha_registro', 'id'))
+
+    def test_asistencias_del_dia_como_rango(self):
+        inicio = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.assertSinScanSecuencial(
+            Asistencia.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=inicio + datetime.timedelta(days=1))
+        )
+
+    def test_usuarios_por_rol(self):
+        self.assertSinScanSecuencial(User.objects.filter(rol='Aprendiz'))
+
+    def test_pagina_de_usuarios(self):
+        paginador = KeysetPagination()
+        paginador.campos, paginador.descendente = ['fecha_registro', 'id'], False
+        ultimo = self.usuarios[100]
+        self.assertSinScanSecuencial(
+            User.objects.filter(paginador.filtro_posterior([ultimo.fecha_registro, ultimo.pk]))
+            .order_by('fecha_registro', 'id')[:101]
+        )
+
+    def test_estadisticas(self):
+        self.assertSinScanSecuencial(Estadisticas.objects.filter(pk=1))
+
+
+# --------------------------
+# Serialización rápida de listados: mismo JSON que los serializadores de DRF
+
+class SerializacionListadoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.eventos = crear_datos(aprendices=30, eventos=3, asistencias_por_usuario=2)
+        # Valores nulos, relaciones vacías y fechas sin microsegundos
+        usuario = cls.usuarios[1]
+        User.objects.filter(pk=usuario.pk).update(ficha=None, jornada=None, tipo_documento='Tarjeta de identidad')
+        Evento.objects.filter(pk=cls.eventos[1].pk).update(docente=None, jornada=None)
+        QR.objects.filter(usuario=usuario).update(
+            fecha_expiracion=timezone.now().replace(microsecond=0) + datetime.timedelta(days=1),
+            punto=PuntoDeControl.objects.first(),
+        )
+        Asistencia.objects.filter(usuario=usuario).update(punto=PuntoDeControl.objects.first(), estado='tarde')
+
+    def assertMismoJSON(self, serializer_class, listado, queryset):
+        esperado = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        obtenido = JSONRenderer().render(listado.serializar(listado.valores(queryset)))
+        self.assertEqual(obtenido, esperado)
+
+    def test_usuarios(self):
+        self.assertMismoJSON(UserSerializer, user_listado, User.objects.order_by('id'))
+
+    def test_eventos(self):
+        self.assertMismoJSON(EventoSerializer, evento_listado, Evento.objects.order_by('id'))
+
+    def test_asistencias(self):
+        self.assertMismoJSON(AsistenciaSerializer, asistencia_listado, Asistencia.objects.order_by('id'))
+
+    def test_qrs(self):
+        self.assertMismoJSON(QRSerializer, qr_listado, QR.objects.order_by('id'))
+
+
+# --------------------------
+# Presupuesto de consultas por endpoint
+#
+# Cada URL de app1/urls.py se ejecuta con dos volúmenes de datos y caches vacías. El número
+# de consultas debe ser el mismo en ambos (sin N+1) y no superar el presupuesto declarado.
+# nombre de la URL: (método, kwargs de la URL, cuerpo o parámetros de un GET, presupuesto)
+
+PRESUPUESTOS = {
+    'register': ('post', None, lambda c: {
+        'documento': 'nuevo', 'nombre': 'Nuevo', 'apellido': 'Usuario', 'email': 'nuevo@cba.test',
+        'rol': 'Aprendiz', 'password': 'clave', 'confirm': 'clave',
+    }, 11),
+    'login': ('post', None, lambda c: {'documento': 'login', 'password': 'clave'}, 2),
+    'login_metricas': ('get', None, None, 1),
+    'metricas': ('get', None, None, 1),
+    'perfil': ('get', None, None, 2),
+    'perfil_async': ('get', None, None, 2),
+    'admin-stats': ('get', None, None, 2),
+    'crear_evento': ('post', None, lambda c: {
+        'nombre': 'Nuevo', 'tipo': 'clase', 'fecha_inicio': '2026-01-01T08:00:00Z',
+        'fecha_fin': '2026-01-01T12:00:00Z', 'docente_id': c['docente'].pk,
+    }, 8),
+    'listar_eventos': ('get', None, None, 3),
+    'editar_evento': ('put', lambda c: {'pk': c['eventos'][0].pk}, lambda c: {'nombre': 'Editado'}, 8),
+    'eliminar_evento': ('delete', lambda c: {'pk': c['eventos'][0].pk}, None, 18),
+    'cerrar_evento': ('post', lambda c: {'pk': c['eventos'][0].pk}, None, 11),
+    'registrar_asistencia': ('post', None, lambda c: {
+        'evento_id': c['evento_registro'].pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'qr-registro',
+    }, 8),
+    'registrar_asistencia_async': ('post', None, lambda c: {
+        'evento_id': c['evento_registro'].pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'qr-registro',
+    }, 8),
+    'registrar_asistencias_lote': ('post', None, lambda c: {'registros': [
+        {'usuario_id': usuario.pk, 'evento_id': c['evento_registro'].pk, 'metodo': 'qr', 'estado': 'presente',
+         'codigo_qr': f'qr-registro-{usuario.pk}'}
+        for usuario in c['usuarios'][2:5]
+    ]}, 9),
+    'listar_asistencias': ('get', None, None, 2),
+    'historial_asistencia': ('get', None, None, 3),
+    'exportar_asistencias': ('get', lambda c: {'pk': c['eventos'][0].pk}, None, 4),
+    'reporte_asistencias': ('get', None, None, 2),
+    'generar_qr': ('post', None, lambda c: {'evento_id': c['evento_nuevo'].pk}, 7),
+    'generar_qr_evento': ('post', lambda c: {'pk': c['evento_nuevo'].pk}, None, 10),
+    'listar_qr': ('get', None, None, 3),
+    'imagen_qr': ('get', lambda c: {'pk': c['qr_registro'].pk}, None, 2),
+    'archivo_imagen_qr': ('get', lambda c: {
+        'pk': c['qr_registro'].pk, 'huella': imagenes_qr.huella('qr-registro', 'png'), 'formato': 'png',
+    }, None, 2),
+    'validar_qr': ('post', None, lambda c: {'evento_id': c['evento_registro'].pk, 'codigo_qr': 'qr-registro'}, 3),
+    'sincronizar': ('get', None, lambda c: {'eventos': f"{c['evento_registro'].pk},{c['eventos'][0].pk}"}, 5),
+    'listar_usuarios': ('get', None, None, 2),
+    'crear_usuario': ('post', None, lambda c: {
+        'documento': 'creado', 'nombre': 'Creado', 'apellido': 'Usuario', 'email': 'creado@cba.test', 'rol': 'Aprendiz',
+    }, 11),
+    'importar_usuarios': ('post', None, lambda c: {'csv': (
+        'documento,nombre,apellido,email,rol\n'
+        'imp1,Uno,Importado,imp1@cba.test,Aprendiz\n'
+        'imp2,Dos,Importado,imp2@cba.test,Aprendiz\n'
+    )}, 11),
+    'editar_usuario': ('put', lambda c: {'pk': c['usuarios'][2].pk}, lambda c: {'nombre': 'Editado'}, 8),
+    'eliminar_usuario': ('delete', lambda c: {'pk': c['usuarios'][2].pk}, None, 18),
+    'usuario_por_documento': ('get', lambda c: {'documento': c['usuarios'][2].documento}, None, 2),
+}
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    IMPORTACION_PROCESOS=1,
+    DATABASE_REPLICAS=[],  # Todas las consultas en la conexión que se mide
+)
+class PresupuestoConsultasTests(TestCase):
+    # (aprendices, eventos, asistencias por usuario)
+    VOLUMENES = ((10, 2, 2), (40, 6, 6))
+
+    def setUp(self):
+        # Las imágenes de QR se generan en un directorio temporal
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(QR_IMAGENES_DIR=directorio.name))
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        nombres = {patron.name for patron in urls.urlpatterns}
+        self.assertEqual(nombres - PRESUPUESTOS.keys(), set(), "URLs sin presupuesto de consultas")
+        self.assertEqual(PRESUPUESTOS.keys() - nombres, set(), "Presupuestos de URLs que ya no existen")
+
+    def test_consultas_constantes_y_dentro_del_presupuesto(self):
+        pequeño, grande = (self.medir(*volumen) for volumen in self.VOLUMENES)
+        for nombre, (_, _, _, presupuesto) in PRESUPUESTOS.items():
+            with self.subTest(nombre):
+                self.assertEqual(grande[nombre], pequeño[nombre], f"{nombre}: las consultas crecen con las filas")
+                self.assertLessEqual(grande[nombre], presupuesto, f"{nombre}: supera su presupuesto")
+
+    def medir(self, aprendices, eventos, asistencias_por_usuario):
+        with transaction.atomic():
+            contexto = self.crear_contexto(aprendices, eventos, asistencias_por_usuario)
+            consultas = {nombre: self.contar(nombre, contexto) for nombre in PRESUPUESTOS}
+            transaction.set_rollback(True)
+        return consultas
+
+    def crear_contexto(self, aprendices, eventos, asistencias_por_usuario):
+        usuarios, lista_eventos = crear_datos(aprendices, eventos, asistencias_por_usuario)
+        ahora = timezone.now()
+        evento_registro, evento_nuevo = Evento.objects.bulk_create(
+            Evento(nombre=nombre, tipo='clase', fecha_inicio=ahora, fecha_fin=ahora + datetime.timedelta(hours=4))
+            for nombre in ('Registro', 'Nuevo')
+        )
+        qr_registro, *_ = QR.objects.bulk_create(
+            [QR(usuario=usuarios[1], evento=evento_registro, codigo='qr-registro')]
+            + [QR(usuario=usuario, evento=evento_registro, codigo=f'qr-registro-{usuario.pk}') for usuario in usuarios[2:5]]
+        )
+        # Quien hace las peticiones es administrativo (/api/metricas/ lo exige)
+        usuarios[1].rol = 'Administrativo'
+        usuarios[1].save(update_fields=['rol'])
+        User.objects.create_user(
+            documento='login', nombre='Login', apellido='Usuario', email='login@cba.test', rol='Aprendiz', password='clave'
+        )
+        return {
+            'usuarios': usuarios,
+            'eventos': lista_eventos,
+            'docente': usuarios[0],
+            'evento_registro': evento_registro,
+            'evento_nuevo': evento_nuevo,
+            'qr_registro': qr_registro,
+            'token': str(emitir_tokens(usuarios[1]).access_token),
+        }
+
+    def contar(self, nombre, contexto):
+        metodo, kwargs, datos, _ = PRESUPUESTOS[nombre]
+        ruta = reverse(nombre, kwargs=kwargs(contexto) if kwargs else None)
+        cuerpo = ''
+        if datos and metodo == 'get':
+            ruta += '?' + urlencode(datos(contexto))
+        elif datos:
+            cuerpo = json.dumps(datos(contexto))
+        # Caches vacías: se mide el peor caso, sin depender del orden de las peticiones
+        for cache in caches.all():
+            cache.clear()
+        geolocalizacion._indices.clear()
+        shutil.rmtree(settings.QR_IMAGENES_DIR, ignore_errors=True)
+
+        with transaction.atomic(), CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.generic(
+                metodo.upper(), ruta, cuerpo, content_type='application/json',
+                headers={'Authorization': f"Bearer {contexto['token']}"},
+            )
+            contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+            transaction.set_rollback(True)
+        self.assertLess(respuesta.status_code, 400, f"{nombre}: {respuesta.status_code} {contenido[:300]}")
+        return len(consultas)
+
+
+# --------------------------
+# Réplicas de lectura (app1.routers)
+#
+# cbaPointBackend.test_settings agrega el alias 'replica', una segunda conexión a la base de
+# pruebas; se distingue por las consultas que pasan por cada conexión. Es un
+# TransactionTestCase: la otra conexión solo ve datos confirmados.
+
+@skipUnless('replica' in settings.DATABASES, "Sin el alias 'replica' (use --settings=cbaPointBackend.test_settings)")
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicasLecturaTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        routers._retrasos.clear()
+        self.usuario, self.otro = User.objects.bulk_create(
+            User(documento=documento, nombre='Réplica', apellido='Usuario', email=f'{documento}@cba.test', rol='Administrativo')
+            for documento in ('replica-1', 'replica-2')
+        )
+        Evento.objects.create(nombre='Réplica', tipo='clase', fecha_inicio=timezone.now(), fecha_fin=timezone.now())
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    def pedir(self, metodo, nombre, cuerpo=None, headers=None):
+        # Devuelve las tablas consultadas en cada alias
+        alias = [DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS]
+        with ExitStack() as pila:
+            capturas = {nombre_alias: pila.enter_context(CaptureQueriesContext(connections[nombre_alias])) for nombre_alias in alias}
+            respuesta = self.client.generic(
+                metodo, reverse(nombre), json.dumps(cuerpo) if cuerpo else '', content_type='application/json',
+                headers=headers or self.headers,
+            )
+        self.assertLess(respuesta.status_code, 400, respuesta.content[:300])
+        return {
+            nombre_alias: ' '.join(consulta['sql'] for consulta in captura.captured_queries)
+            for nombre_alias, captura in capturas.items()
+        }
+
+    def leidas_en_replica(self, consultas):
+        return ' '.join(consultas[nombre_alias] for nombre_alias in settings.DATABASE_REPLICAS)
+
+    def test_listado_lee_de_la_replica(self):
+        consultas = self.pedir('GET', 'listar_eventos')
+        self.assertIn('app1_evento', self.leidas_en_replica(consultas))
+        self.assertNotIn('app1_evento', consultas[DEFAULT_DB_ALIAS])
+        # El usuario autenticado se lee de la primaria
+        self.assertIn('app1_user', consultas[DEFAULT_DB_ALIAS])
+
+    def test_vista_sin_marca_usa_la_primaria(self):
+        self.assertEqual(self.leidas_en_replica(self.pedir('GET', 'perfil')), '')
+
+    def test_escritura_fija_al_cliente_en_la_primaria(self):
+        self.pedir('POST', 'crear_evento', {
+            'nombre': 'Nuevo', 'tipo': 'clase', 'fecha_inicio': '2026-01-01T08:00:00Z', 'fecha_fin': '2026-01-01T12:00:00Z',
+        })
+        self.assertEqual(self.leidas_en_replica(self.pedir('GET', 'listar_eventos')), '')
+        # Otro cliente sigue leyendo de la réplica
+        otro = {'Authorization': f'Bearer {emitir_tokens(self.otro).access_token}'}
+        self.assertIn('app1_evento', self.leidas_en_replica(self.pedir('GET', 'listar_eventos', headers=otro)))
+
+    @override_settings(REPLICA_LAG_MAXIMO=-1)
+    def test_replica_atrasada_lee_de_la_primaria(self):
+        consultas = self.pedir('GET', 'listar_eventos')
+        self.assertIn('app1_evento', consultas[DEFAULT_DB_ALIAS])
+        self.assertNotIn('app1_evento', self.leidas_en_replica(consultas))
+
+    def test_cache_de_un_proceso(self):
+        # Sin DEBUG las réplicas exigen una cache compartida entre workers
+        with override_settings(DEBUG=False), self.assertRaises(ImproperlyConfigured):
+            routers.comprobar_cache()
+        with override_settings(DEBUG=True):
+            routers.comprobar_cache()
+        with tempfile.TemporaryDirectory() as directorio, override_settings(DEBUG=False, CACHES={
+            **settings.CACHES, 'replicas': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio},
+        }):
+            routers.comprobar_cache()
+
+
+# --------------------------
+# Códigos QR firmados (app1.qr_firmado)
+
+@override_settings(QR_FIRMA_CLAVES={'1': 'secreto-1', '2': 'secreto-2'}, QR_FIRMA_CLAVE_ACTUAL='1', QR_FIRMA_RETIRO={})
+class QRFirmadoTests(TestCase):
+    def test_emitir_y_verificar(self):
+        expiracion = timezone.now().replace(microsecond=0) + datetime.timedelta(hours=1)
+        codigo = qr_firmado.emitir(5, 7, 9, expiracion)
+        datos = qr_firmado.verificar(codigo)
+        self.assertEqual(
+            (datos['usuario_id'], datos['evento_id'], datos['punto_id'], datos['fecha_expiracion']),
+            (5, 7, 9, expiracion),
+        )
+        self.assertEqual(qr_firmado.verificar(qr_firmado.emitir(5))['evento_id'], None)
+        self.assertNotEqual(qr_firmado.emitir(5, 7), qr_firmado.emitir(5, 7))
+
+    def test_expirado(self):
+        self.assertIsNone(qr_firmado.verificar(qr_firmado.emitir(5, 7, fecha_expiracion=timezone.now() - datetime.timedelta(seconds=1))))
+
+    def test_datos_alterados(self):
+        partes = qr_firmado.emitir(5, 7).split('.')
+        for posicion, valor in ((2, '6'), (3, '8'), (5, '9999999999')):
+            with self.subTest(posicion):
+                alterado = list(partes)
+                alterado[posicion] = valor
+                self.assertIsNone(qr_firmado.verificar('.'.join(alterado)))
+
+    def test_firma_alterada(self):
+        codigo = qr_firmado.emitir(5, 7)
+        mensaje, firma = codigo.rsplit('.', 1)
+        otra = ('A' if firma[0] != 'A' else 'B') + firma[1:]
+        self.assertIsNone(qr_firmado.verificar(f'{mensaje}.{otra}'))
+        self.assertIsNone(qr_firmado.verificar(mensaje))
+        self.assertIsNone(qr_firmado.verificar(f'{codigo}.extra'))
+
+    def test_clave_desconocida(self):
+        codigo = qr_firmado.emitir(5, 7)
+        with override_settings(QR_FIRMA_CLAVES={'3': 'secreto-1'}, QR_FIRMA_CLAVE_ACTUAL='3'):
+            self.assertIsNone(qr_firmado.verificar(codigo))
+        self.assertIsNone(qr_firmado.verificar(codigo.replace('v1.1.', 'v1.9.', 1)))
+
+    def test_rotacion(self):
+        anterior = qr_firmado.emitir(5, 7)
+        with override_settings(QR_FIRMA_CLAVE_ACTUAL='2'):
+            nuevo = qr_firmado.emitir(5, 7)
+            self.assertTrue(nuevo.startswith('v1.2.'))
+            self.assertIsNotNone(qr_firmado.verificar(nuevo))
+            # Sin fecha de retiro la clave anterior ya no vale
+            self.assertIsNone(qr_firmado.verificar(anterior))
+            manana = (timezone.now() + datetime.timedelta(days=1)).isoformat()
+            with override_settings(QR_FIRMA_RETIRO={'1': manana}):
+                self.assertIsNotNone(qr_firmado.verificar(anterior))
+            ayer = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+            with override_settings(QR_FIRMA_RETIRO={'1': ayer}):
+                self.assertIsNone(qr_firmado.verificar(anterior))
+
+    def test_revocacion(self):
+        usuario = User.objects.create(documento='firmado', nombre='F', apellido='F', email='firmado@cba.test', rol='Aprendiz')
+        evento = Evento.objects.create(nombre='Firmado', tipo='clase', fecha_inicio=timezone.now(), fecha_fin=timezone.now())
+        codigo = qr_firmado.emitir(usuario.pk, evento.pk)
+        caches[settings.QR_CACHE_ALIAS].clear()
+        # Sin revocación basta la firma, aunque el código no esté en la tabla
+        self.assertIsNotNone(validacion_qr.validar_qr(codigo, evento.pk))
+        self.assertIsNone(validacion_qr.validar_qr(codigo, evento.pk + 1))
+        with override_settings(QR_FIRMA_REVOCACION=True):
+            self.assertIsNone(validacion_qr.validar_qr(codigo, evento.pk))
+            qr = QR.objects.create(usuario=usuario, evento=evento, codigo=codigo)
+            self.assertIsNotNone(validacion_qr.validar_qr(codigo, evento.pk))
+            qr.activo = False
+            with self.captureOnCommitCallbacks(execute=True):
+                qr.save()
+            self.assertIsNone(validacion_qr.validar_qr(codigo, evento.pk))
+
+    def test_clave_de_desarrollo_sin_debug(self):
+        with override_settings(DEBUG=False, QR_FIRMA_CLAVES={'1': 'django-insecure-abc'}):
+            with self.assertRaises(ImproperlyConfigured):
+                qr_firmado.comprobar_claves()
+        with override_settings(DEBUG=False, QR_FIRMA_CLAVES={'1': None}):
+            with self.assertRaises(ImproperlyConfigured):
+                qr_firmado.comprobar_claves()
+        with override_settings(DEBUG=False):
+            qr_firmado.comprobar_claves()
+        with override_settings(QR_FIRMA_CLAVE_ACTUAL='9'):
+            with self.assertRaises(ImproperlyConfigured):
+                qr_firmado.comprobar_claves()
+
+
+# --------------------------
+# Registro de asistencias por lote
+
+class RegistroLoteTests(TestCase):
+    def setUp(self):
+        caches[settings.QR_CACHE_ALIAS].clear()
+        ahora = timezone.now()
+        self.usuarios = User.objects.bulk_create(
+            User(documento=f'lote{i}', nombre='Lote', apellido=str(i), email=f'lote{i}@cba.test', rol='Aprendiz')
+            for i in range(7)
+        )
+        self.evento, self.otro_evento = Evento.objects.bulk_create(
+            Evento(nombre=nombre, tipo='clase', fecha_inicio=ahora, fecha_fin=ahora) for nombre in ('Lote', 'Otro')
+        )
+        self.punto, self.punto_ajeno = PuntoDeControl.objects.bulk_create(
+            PuntoDeControl(nombre='P', descripcion='', latitud=4.6, longitud=-74.0, evento=evento)
+            for evento in (self.evento, self.otro_evento)
+        )
+        u = self.usuarios
+        QR.objects.bulk_create([
+            QR(usuario=u[0], evento=self.evento, codigo='valido-0'),
+            QR(usuario=u[1], evento=self.evento, codigo='inactivo', activo=False),
+            QR(usuario=u[2], evento=self.evento, codigo='expirado', fecha_expiracion=ahora - datetime.timedelta(minutes=1)),
+            QR(usuario=u[3], evento=self.otro_evento, codigo='otro-evento'),
+            QR(usuario=u[4], evento=self.evento, codigo='valido-4'),
+            QR(usuario=u[5], evento=self.evento, codigo='ya-registrado'),
+        ])
+        self.existente = Asistencia.objects.create(usuario=u[5], evento=self.evento, metodo='qr', estado='presente')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(u[0]).access_token}'}
+
+    def registrar(self, registros):
+        respuesta = self.client.post(
+            reverse('registrar_asistencias_lote'), {'registros': registros},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        return respuesta.json()
+
+    def escaneo(self, codigo, **extra):
+        return {'evento_id': self.evento.pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': codigo, **extra}
+
+    def test_filas_validas_e_invalidas(self):
+        firmado = qr_firmado.emitir(self.usuarios[6].pk, self.evento.pk)
+        datos = self.registrar([
+            self.escaneo('valido-0'),
+            self.escaneo('inactivo'),
+            self.escaneo('expirado'),
+            self.escaneo('otro-evento'),
+            self.escaneo('valido-4', punto_id=self.punto_ajeno.pk),
+            self.escaneo('valido-0'),
+            self.escaneo('ya-registrado'),
+            self.escaneo('valido-0', metodo='gps'),
+            'no es un registro',
+            self.escaneo(firmado, punto_id=self.punto.pk),
+        ])
+        errores = {resultado['indice']: resultado.get('error') for resultado in datos['resultados'] if not resultado['ok']}
+        self.assertEqual(errores, {
+            1: 'Código QR no válido para este evento',
+            2: 'Código QR no válido para este evento',
+            3: 'Código QR no válido para este evento',
+            4: 'El punto de control no pertenece al evento',
+            7: 'El registro por lote solo admite el método qr',
+            8: 'Registro inválido',
+        })
+        self.assertEqual((datos['registradas'], datos['duplicadas'], datos['rechazadas']), (2, 2, 6))
+        resultados = datos['resultados']
+        # Duplicado dentro del lote: la misma asistencia que su primera aparición
+        self.assertEqual((resultados[0]['duplicado'], resultados[5]['duplicado']), (False, True))
+        self.assertEqual(resultados[5]['asistencia']['id'], resultados[0]['asistencia']['id'])
+        # Duplicado de una asistencia anterior
+        self.assertTrue(resultados[6]['duplicado'])
+        self.assertEqual(resultados[6]['asistencia']['id'], self.existente.pk)
+        self.assertEqual(resultados[9]['asistencia']['punto'], self.punto.pk)
+
+        self.assertEqual(
+            set(Asistencia.objects.filter(evento=self.evento).values_list('usuario_id', flat=True)),
+            {self.usuarios[0].pk, self.usuarios[5].pk, self.usuarios[6].pk},
+        )
+
+    def test_repetir_el_lote(self):
+        lote = [self.escaneo('valido-0'), self.escaneo('valido-4')]
+        primero = self.registrar(lote)
+        segundo = self.registrar(lote)
+        self.assertEqual((primero['registradas'], segundo['registradas'], segundo['duplicadas']), (2, 0, 2))
+        self.assertEqual(
+            [resultado['asistencia']['id'] for resultado in segundo['resultados']],
+            [resultado['asistencia']['id'] for resultado in primero['resultados']],
+        )
+        self.assertEqual(Asistencia.objects.filter(evento=self.evento).count(), 3)
+
+    def test_lote_vacio_o_demasiado_grande(self):
+        for cuerpo in ({}, {'registros': []}, {'registros': 'x'}):
+            respuesta = self.client.post(
+                reverse('registrar_asistencias_lote'), cuerpo, content_type='application/json', headers=self.headers,
+            )
+            self.assertEqual(respuesta.status_code, 400)
+        with override_settings(ASISTENCIAS_LOTE_MAXIMO=1):
+            respuesta = self.client.post(
+                reverse('registrar_asistencias_lote'), {'registros': [self.escaneo('valido-0')] * 2},
+                content_type='application/json', headers=self.headers,
+            )
+            self.assertEqual(respuesta.status_code, 400)
+
+
+# --------------------------
+# Importación masiva de usuarios
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], IMPORTACION_PROCESOS=1)
+class ImportacionUsuariosTests(TestCase):
+    CSV = (
+        'documento,nombre,apellido,email,rol,password\n'
+        'imp1,Uno,Importado,imp1@cba.test,Aprendiz,clave-uno\n'
+        'imp2,Dos,Importado,imp2@cba.test,Rector,\n'
+        'imp1,Tres,Importado,imp3@cba.test,Aprendiz,\n'
+        'imp4,Cuatro,Importado,existente@cba.test,Aprendiz,\n'
+        'imp5,Cinco,Importado,imp5@cba.test,Instructor,\n'
+    )
+
+    def setUp(self):
+        admin = User.objects.create(documento='admin', nombre='A', apellido='A', email='existente@cba.test', rol='Administrativo')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(admin).access_token}'}
+
+    def importar(self, datos, parcial=False, **kwargs):
+        url = reverse('importar_usuarios') + ('?parcial=true' if parcial else '')
+        return self.client.post(url, datos, headers=self.headers, **kwargs)
+
+    def test_todo_o_nada(self):
+        respuesta = self.importar({'csv': self.CSV})
+        self.assertEqual(respuesta.status_code, 400)
+        datos = respuesta.json()
+        self.assertEqual(datos['importados'], 0)
+        self.assertEqual([error['fila'] for error in datos['errores']], [3, 4, 5])
+        self.assertIn('documento: repetido en la fila 2', datos['errores'][1]['errores'])
+        self.assertIn('email: ya existe un usuario con este email', datos['errores'][2]['errores'])
+        self.assertFalse(User.objects.filter(documento__startswith='imp').exists())
+
+    def test_parcial(self):
+        respuesta = self.importar({'csv': self.CSV}, parcial=True)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['importados'], 2)
+        self.assertEqual([error['fila'] for error in respuesta.json()['errores']], [3, 4, 5])
+        uno, cinco = User.objects.filter(documento__in=['imp1', 'imp5']).order_by('documento')
+        self.assertEqual((uno.nombre, cinco.rol), ('Uno', 'Instructor'))
+        self.assertTrue(uno.check_password('clave-uno'))
+        self.assertTrue(cinco.check_password('imp5'))  # Sin contraseña se usa el documento
+        self.assertEqual(QR.objects.filter(usuario__in=[uno, cinco]).count(), 2)
+
+    def test_archivo(self):
+        subido = SimpleUploadedFile('usuarios.csv', ('\ufeff' + self.CSV).encode('utf-8'), content_type='text/csv')
+        self.assertEqual(self.importar({'archivo': subido}, parcial=True).json()['importados'], 2)
+        latin = SimpleUploadedFile('usuarios.csv', 'documento,nombre,apellido,email,rol\nñ,Ñ,Ñ,n@cba.test,Aprendiz\n'.encode('latin-1'))
+        self.assertEqual(self.importar({'archivo': latin}).status_code, 400)
+        self.assertEqual(self.importar({'csv': 'documento,nombre\nx,y\n'}).json()['error'], 'Faltan columnas obligatorias: apellido, email, rol')
+
+    def test_usuario_creado_durante_la_importacion(self):
+        # Otro registro crea imp5 después de validar y antes de insertar
+        hashear = importacion.hashear
+
+        def hashear_y_registrar(passwords, procesos=None):
+            User.objects.create(documento='imp5', nombre='Otro', apellido='Registro', email='otro@cba.test', rol='Aprendiz')
+            return hashear(passwords, procesos)
+
+        with mock.patch.object(importacion, 'hashear', hashear_y_registrar):
+            respuesta = self.importar({'csv': self.CSV}, parcial=True)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['importados'], 1)
+        self.assertIn(
+            {'fila': 6, 'errores': ['documento: ya existe un usuario con este documento']}, respuesta.json()['errores'],
+        )
+        self.assertEqual(User.objects.get(documento='imp5').nombre, 'Otro')
+        self.assertTrue(User.objects.filter(documento='imp1').exists())
+
+    @override_settings(IMPORTACION_PROCESOS=2)
+    def test_pool_compartido(self):
+        primero = importacion.hashear(['a', 'b', 'c'])
+        pool = importacion.pool_compartido()
+        segundo = importacion.hashear(['d', 'e'])
+        self.assertIs(importacion.pool_compartido(), pool)
+        self.assertTrue(all(map(check_password, 'abcde', primero + segundo)))
+
+
+# --------------------------
+# Archivo de asistencias
+
+class ArchivoAsistenciasTests(TestCase):
+    def setUp(self):
+        self.usuarios, self.eventos = crear_datos(10, 2, 2)
+        ids = list(Asistencia.objects.order_by('id').values_list('id', flat=True))
+        self.enero, self.febrero, self.vigentes = ids[:6], ids[6:12], ids[12:]
+        zona = timezone.get_current_timezone()
+        # Primer y último instante de cada mes, para que una frontera mal calculada se note
+        Asistencia.objects.filter(id__in=self.enero[:3]).update(fecha_registro=datetime.datetime(2025, 1, 1, tzinfo=zona))
+        Asistencia.objects.filter(id__in=self.enero[3:]).update(fecha_registro=datetime.datetime(2025, 1, 31, 23, 59, 59, tzinfo=zona))
+        Asistencia.objects.filter(id__in=self.febrero).update(fecha_registro=datetime.datetime(2025, 2, 14, tzinfo=zona))
+        self.del_primero = list(Asistencia.objects.filter(usuario=self.usuarios[0]).order_by('id').values_list('id', flat=True))
+
+    def test_archivar_dos_meses(self):
+        total = Estadisticas.objects.get(pk=1).total_asistencias
+        self.assertEqual(archivo.archivar(datetime.date(2025, 7, 1), chunk=4), 12)
+
+        self.assertEqual(set(AsistenciaArchivada.objects.values_list('id', flat=True)), set(self.enero + self.febrero))
+        self.assertEqual(list(Asistencia.objects.order_by('id').values_list('id', flat=True)), self.vigentes)
+        self.assertEqual(Estadisticas.objects.get(pk=1).total_asistencias, total)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                    'WHERE i.inhparent = %s::regclass ORDER BY 1', [AsistenciaArchivada._meta.db_table],
+                )
+                self.assertEqual([fila[0] for fila in cursor.fetchall()], [
+                    f'{AsistenciaArchivada._meta.db_table}_2025_01', f'{AsistenciaArchivada._meta.db_table}_2025_02',
+                ])
+
+        # Otra corrida no mueve nada; el historial sigue mostrando lo archivado
+        self.assertEqual(archivo.archivar(datetime.date(2025, 7, 1)), 0)
+        vigentes, archivadas = archivo.historial(self.usuarios[0])
+        self.assertEqual(
+            sorted([*vigentes.values_list('id', flat=True), *archivadas.values_list('id', flat=True)]), self.del_primero,
+        )
+        self.assertTrue(archivadas.exists())
+
+    def test_semestre_sin_cerrar(self):
+        # Antes de enero de 2025 no hay nada que archivar
+        self.assertEqual(archivo.archivar(datetime.date(2024, 12, 31)), 0)
+        self.assertFalse(AsistenciaArchivada.objects.exists())
+
+
+# --------------------------
+# Registro idempotente de asistencias
+
+class RegistroIdempotenteTests(TestCase):
+    def setUp(self):
+        for alias in (settings.QR_CACHE_ALIAS, settings.ASISTENCIAS_VENTANA_CACHE, settings.AUTENTICACION_CACHE):
+            caches[alias].clear()
+        ahora = timezone.now()
+        self.usuario = User.objects.create(documento='idem', nombre='I', apellido='D', email='idem@cba.test', rol='Aprendiz')
+        self.evento = Evento.objects.create(nombre='Idem', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        self.punto, self.otro_punto = PuntoDeControl.objects.bulk_create(
+            PuntoDeControl(nombre=nombre, descripcion='', latitud=4.6, longitud=-74.0, evento=self.evento) for nombre in 'AB'
+        )
+        QR.objects.create(usuario=self.usuario, evento=self.evento, codigo='idem-qr')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    def registrar(self, clave=None, **datos):
+        headers = {**self.headers, **({'Idempotency-Key': clave} if clave else {})}
+        datos = {'evento_id': self.evento.pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'idem-qr', **datos}
+        return self.client.post(reverse('registrar_asistencia'), datos, content_type='application/json', headers=headers)
+
+    def test_reintento_con_clave(self):
+        primera = self.registrar('clave-1', punto_id=self.punto.pk)
+        self.assertEqual(primera.status_code, 201)
+        # Sin la ventana en memoria el reintento llega a la base de datos y choca con la clave,
+        # aunque el cliente cambie el punto
+        caches[settings.ASISTENCIAS_VENTANA_CACHE].clear()
+        reintento = self.registrar('clave-1', punto_id=self.otro_punto.pk)
+        self.assertEqual(reintento.status_code, 200)
+        self.assertEqual(reintento.json()['id'], primera.json()['id'])
+        self.assertEqual(Asistencia.objects.count(), 1)
+        # La clave también se acepta en el cuerpo
+        caches[settings.ASISTENCIAS_VENTANA_CACHE].clear()
+        self.assertEqual(self.registrar(clave_idempotencia='clave-1').json()['id'], primera.json()['id'])
+
+    def test_ventana_de_repetidos(self):
+        primera = self.registrar(punto_id=self.punto.pk)
+        with self.assertNumQueries(0):
+            repetida = self.registrar(punto_id=self.punto.pk)
+        self.assertEqual((repetida.status_code, repetida.json()), (200, primera.json()))
+        # Otro punto es otra asistencia
+        self.assertEqual(self.registrar(punto_id=self.otro_punto.pk).status_code, 201)
+        with override_settings(ASISTENCIAS_VENTANA_SEGUNDOS=0):
+            caches[settings.ASISTENCIAS_VENTANA_CACHE].clear()
+            self.assertEqual(self.registrar(punto_id=self.punto.pk).status_code, 200)
+        self.assertEqual(Asistencia.objects.count(), 2)
+
+    def test_restricciones_unicas(self):
+        Asistencia.objects.create(usuario=self.usuario, evento=self.evento, punto=self.punto, metodo='qr', estado='presente')
+        Asistencia.objects.create(usuario=self.usuario, evento=self.evento, metodo='qr', estado='presente')
+        for punto in (self.punto, None):
+            with self.subTest(punto=punto), self.assertRaises(IntegrityError), transaction.atomic():
+                Asistencia.objects.create(usuario=self.usuario, evento=self.evento, punto=punto, metodo='manual', estado='tarde')
+
+    def test_clave_por_usuario(self):
+        # La misma clave de otro usuario no devuelve la asistencia ajena
+        otro = User.objects.create(documento='idem2', nombre='I', apellido='D', email='idem2@cba.test', rol='Aprendiz')
+        QR.objects.create(usuario=otro, evento=self.evento, codigo='idem-qr-2')
+        primera = self.registrar('compartida')
+        headers = {'Authorization': f'Bearer {emitir_tokens(otro).access_token}', 'Idempotency-Key': 'compartida'}
+        datos = {'evento_id': self.evento.pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'idem-qr-2'}
+        for limpiar in (False, True):
+            if limpiar:
+                caches[settings.ASISTENCIAS_VENTANA_CACHE].clear()
+            respuesta = self.client.post(reverse('registrar_asistencia'), datos, content_type='application/json', headers=headers)
+            self.assertEqual(respuesta.json()['usuario'], otro.pk)
+            self.assertNotEqual(respuesta.json()['id'], primera.json()['id'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Asistencia.objects.filter(clave_idempotencia='compartida').count(), 2)
+
+    def test_validacion(self):
+        # Se rechaza antes de consultar la ventana o la base de datos (el usuario ya está en cache)
+        self.registrar(metodo='fax')
+        with self.assertNumQueries(0):
+            for datos, codigo in (
+                ({'metodo': 'fax'}, 400), ({'estado': 'ausente?'}, 400), ({'evento_id': 'x'}, 404),
+            ):
+                self.assertEqual(self.registrar(**datos).status_code, codigo)
+            self.assertEqual(self.registrar('k' * 101).status_code, 400)
+        self.assertFalse(Asistencia.objects.exists())
+
+    def test_registro_concurrente(self):
+        # Otra petición insertó primero: el INSERT no falla y devuelve la asistencia existente
+        existente = Asistencia.objects.create(usuario=self.usuario, evento=self.evento, metodo='qr', estado='presente')
+        asistencia, creada = registro_asistencias.registrar(self.usuario.pk, self.evento.pk, 'qr', 'tarde')
+        self.assertEqual((asistencia.pk, asistencia.estado, creada), (existente.pk, 'presente', False))
+        asistencia, creada = registro_asistencias.registrar(self.usuario.pk, self.evento.pk, 'qr', 'tarde', self.punto.pk)
+        self.assertTrue(creada)
+        self.assertEqual(Asistencia.objects.count(), 2)
+
+
+# La FK del punto se comprueba al confirmar, así que se necesita una transacción real
+class RegistroPuntoInvalidoTests(TransactionTestCase):
+    def test_punto_inexistente(self):
+        caches[settings.ASISTENCIAS_VENTANA_CACHE].clear()
+        caches[settings.QR_CACHE_ALIAS].clear()
+        ahora = timezone.now()
+        usuario = User.objects.create(documento='pin', nombre='P', apellido='I', email='pin@cba.test', rol='Aprendiz')
+        evento = Evento.objects.create(nombre='Punto', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        QR.objects.create(usuario=usuario, evento=evento, codigo='pin-qr')
+        datos = {'evento_id': evento.pk, 'punto_id': 999999, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'pin-qr'}
+        respuesta = self.client.post(
+            reverse('registrar_asistencia'), datos, content_type='application/json',
+            headers={'Authorization': f'Bearer {emitir_tokens(usuario).access_token}'},
+        )
+        self.assertEqual((respuesta.status_code, respuesta.json()), (400, {'error': 'Punto de control no válido'}))
+        self.assertFalse(Asistencia.objects.exists())
+
+
+# --------------------------
+# Generación masiva de QR de un evento
+
+class GeneracionQRTests(TestCase):
+    def setUp(self):
+        ahora = timezone.now()
+        self.usuarios = User.objects.bulk_create(
+            User(documento=f'gen{i}', nombre='Gen', apellido=f'{i:02}', email=f'gen{i}@cba.test', rol='Aprendiz',
+                 ficha='F1' if i < 6 else 'F2', jornada='mañana')
+            for i in range(8)
+        )
+        User.objects.create(documento='inst', nombre='I', apellido='I', email='inst@cba.test', rol='Instructor', ficha='F1')
+        self.evento = Evento.objects.create(nombre='Gen', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora, jornada='mañana')
+        u = self.usuarios
+        QR.objects.bulk_create([
+            QR(usuario=u[0], evento=self.evento, codigo='gen-activo'),
+            QR(usuario=u[1], evento=self.evento, codigo='gen-inactivo', activo=False),
+            QR(usuario=u[2], evento=self.evento, codigo='gen-expirado', fecha_expiracion=ahora - datetime.timedelta(days=1)),
+        ])
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(u[0]).access_token}'}
+
+    def generar(self, **datos):
+        respuesta = self.client.post(
+            reverse('generar_qr_evento', kwargs={'pk': self.evento.pk}), datos,
+            content_type='application/json', headers=self.headers,
+        )
+        contenido = b''.join(respuesta.streaming_content).decode() if respuesta.streaming else None
+        return respuesta, contenido
+
+    def manifiesto(self, contenido):
+        return {fila['documento']: fila for fila in map(json.loads, contenido.splitlines())}
+
+    @override_settings(GENERACION_QR_CHUNK=2)
+    def test_generar_por_bloques_y_repetir(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta, contenido = self.generar(formato='ndjson', fichas=['F1'])
+        self.assertEqual((respuesta.status_code, respuesta['X-QR-Creados']), (201, '3'))
+        inserts = [consulta['sql'] for consulta in consultas if consulta['sql'].startswith(f'INSERT INTO "{QR._meta.db_table}"')]
+        self.assertEqual(len(inserts), 2)  # 3 QR en bloques de 2
+        filas = self.manifiesto(contenido)
+        self.assertEqual(list(filas), [f'gen{i}' for i in range(6)])  # Sin el instructor ni la ficha F2
+        self.assertEqual(
+            {documento: (fila['nuevo'], fila['vigente']) for documento, fila in filas.items()},
+            {'gen0': (False, True), 'gen1': (False, False), 'gen2': (False, False),
+             'gen3': (True, True), 'gen4': (True, True), 'gen5': (True, True)},
+        )
+        for documento in ('gen3', 'gen4', 'gen5'):
+            self.assertTrue(qr_firmado.verificar(filas[documento]['codigo']))
+        self.assertEqual(filas['gen1']['codigo'], 'gen-inactivo')
+
+        # Repetir no crea nada y devuelve los mismos códigos
+        respuesta, contenido = self.generar(formato='ndjson', fichas=['F1'])
+        self.assertEqual(respuesta['X-QR-Creados'], '0')
+        repetido = self.manifiesto(contenido)
+        self.assertEqual({d: f['codigo'] for d, f in repetido.items()}, {d: f['codigo'] for d, f in filas.items()})
+        self.assertFalse(any(fila['nuevo'] for fila in repetido.values()))
+        self.assertEqual(QR.objects.filter(evento=self.evento).count(), 6)
+
+    def test_creado_por_otra_peticion(self):
+        # gen3 genera su QR por /qr/crear/ mientras corre la operación: el INSERT lo descarta y
+        # no sale como nuevo aunque su fecha sea posterior al inicio
+        insertar = generacion_qr._insertar
+
+        def insertar_con_concurrente(evento, usuario_ids, ahora):
+            if self.usuarios[3].pk in usuario_ids:
+                QR.objects.create(usuario=self.usuarios[3], evento=evento, codigo='gen-concurrente')
+            return insertar(evento, usuario_ids, ahora)
+
+        with mock.patch.object(generacion_qr, '_insertar', insertar_con_concurrente):
+            respuesta, contenido = self.generar(formato='ndjson', fichas=['F1'])
+        self.assertEqual(respuesta['X-QR-Creados'], '2')
+        filas = self.manifiesto(contenido)
+        self.assertEqual((filas['gen3']['codigo'], filas['gen3']['nuevo']), ('gen-concurrente', False))
+        self.assertEqual([filas[d]['nuevo'] for d in ('gen4', 'gen5')], [True, True])
+
+    def test_csv_y_filtros(self):
+        respuesta, contenido = self.generar()
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        lineas = contenido.splitlines()
+        self.assertEqual(lineas[0], 'documento,nombre,apellido,ficha,jornada,codigo,nuevo,vigente')
+        self.assertEqual(len(lineas), 9)
+        for datos in ({'formato': 'xml'}, {'fichas': []}, {'roles': ['Rector']}):
+            self.assertEqual(self.generar(**datos)[0].status_code, 400)
+
+
+# --------------------------
+# Métricas de Prometheus
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        caches[settings.AUTENTICACION_CACHE].clear()
+        self.aprendiz, self.administrativo = User.objects.bulk_create(
+            User(documento=rol, nombre='M', apellido='M', email=f'{rol}@cba.test', rol=rol) for rol in ('Aprendiz', 'Administrativo')
+        )
+
+    def pedir(self, autorizacion=None):
+        headers = {'Authorization': autorizacion} if autorizacion else {}
+        return self.client.get(reverse('metricas'), headers=headers)
+
+    def jwt(self, usuario):
+        return f'Bearer {emitir_tokens(usuario).access_token}'
+
+    def test_sin_token_configurado(self):
+        with override_settings(METRICAS_TOKEN=None):
+            self.assertEqual(self.pedir().status_code, 401)
+            self.assertEqual(self.pedir(self.jwt(self.aprendiz)).status_code, 403)
+            respuesta = self.pedir(self.jwt(self.administrativo))
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertIn(b'cbapoint_login_', respuesta.content)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.pedir().status_code, 200)
+
+    @override_settings(METRICAS_TOKEN='secreto-prometheus')
+    def test_token_fijo(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.pedir('Bearer secreto-prometheus').status_code, 200)
+        self.assertEqual(self.pedir('Bearer otro').status_code, 401)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.pedir().status_code, 401)
+        self.assertEqual(self.pedir(self.jwt(self.administrativo)).status_code, 200)
+
+
+# --------------------------
+# Instrumentación de /api/* (app1.middleware, app1.metricas)
+
+class InstrumentacionTests(TestCase):
+    SERVER_TIMING = re.compile(r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) consultas", render;dur=[\d.]+$')
+
+    def setUp(self):
+        caches[settings.AUTENTICACION_CACHE].clear()
+        self.usuario = User.objects.create(documento='ins', nombre='I', apellido='N', email='ins@cba.test', rol='Aprendiz')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    def totales(self, vista='PerfilUsuarioView'):
+        with metricas.registro.lock:
+            if vista not in metricas.registro.duracion:
+                return 0, [0] * (len(metricas.BUCKETS_CONSULTAS) + 1), 0.0
+            return (
+                metricas.registro.duracion[vista].total, list(metricas.registro.consultas[vista].buckets),
+                metricas.registro.tiempo_render[vista],
+            )
+
+    @override_settings(INSTRUMENTACION_MUESTREO=1.0)
+    def test_server_timing_e_histogramas(self):
+        total, buckets, render = self.totales()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('perfil'), headers=self.headers)
+        self.assertEqual(respuesta.status_code, 200)
+        medido = self.SERVER_TIMING.match(respuesta['Server-Timing'])
+        self.assertIsNotNone(medido, respuesta['Server-Timing'])
+        self.assertEqual(int(medido.group(1)), len(consultas))
+
+        # Una observación más en el bucket de su número de consultas; la respuesta de DRF se renderizó
+        nuevo_total, nuevos_buckets, nuevo_render = self.totales()
+        self.assertEqual(nuevo_total, total + 1)
+        indice = bisect.bisect_left(metricas.BUCKETS_CONSULTAS, len(consultas))
+        buckets[indice] += 1
+        self.assertEqual(nuevos_buckets, buckets)
+        self.assertGreater(nuevo_render, render)
+        texto = metricas.registro.prometheus()
+        self.assertIn(f'cbapoint_peticion_segundos_count{{vista="PerfilUsuarioView"}} {nuevo_total}', texto)
+        self.assertIn('cbapoint_peticion_consultas_bucket{vista="PerfilUsuarioView",le="+Inf"}', texto)
+
+    @override_settings(INSTRUMENTACION_MUESTREO=0)
+    def test_sin_muestreo(self):
+        antes = self.totales()
+        respuesta = self.client.get(reverse('perfil'), headers=self.headers)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('Server-Timing', respuesta)
+        self.assertEqual(self.totales(), antes)
+
+    def test_fuera_de_api(self):
+        with override_settings(INSTRUMENTACION_MUESTREO=1.0):
+            self.assertNotIn('Server-Timing', self.client.get('/no-existe/'))
+
+    def test_histograma(self):
+        histograma = metricas.Histograma((1, 5))
+        for valor in (0, 1, 2, 5, 9):
+            histograma.observar(valor)
+        self.assertEqual((histograma.buckets, histograma.total, histograma.suma), ([2, 2, 1], 5, 17))
+        registro = metricas.RegistroMetricas()
+        medicion = metricas.Medicion()
+        medicion.consultas = 3
+        registro.registrar('Vista"Rara', 0.02, medicion)
+        texto = registro.prometheus([('cbapoint_extra', 'Extra', 7)])
+        self.assertIn('cbapoint_peticion_consultas_bucket{vista="Vista\\"Rara",le="3"} 1', texto)
+        self.assertIn('cbapoint_peticion_consultas_bucket{vista="Vista\\"Rara",le="2"} 0', texto)
+        self.assertIn('cbapoint_peticion_segundos_bucket{vista="Vista\\"Rara",le="0.01"} 0', texto)
+        self.assertIn('cbapoint_peticion_segundos_bucket{vista="Vista\\"Rara",le="0.025"} 1', texto)
+        self.assertIn('cbapoint_extra 7', texto)
+
+
+# --------------------------
+# Cache de validación de QR (app1.validacion_qr)
+
+class ValidacionQRCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.QR_CACHE_ALIAS].clear()
+        ahora = timezone.now()
+        self.usuarios = User.objects.bulk_create(
+            User(documento=f'val{i}', nombre='V', apellido=str(i), email=f'val{i}@cba.test', rol='Aprendiz') for i in range(4)
+        )
+        self.evento, self.cerrado = Evento.objects.bulk_create(
+            Evento(nombre=nombre, tipo='clase', fecha_inicio=ahora, fecha_fin=ahora, activo=activo)
+            for nombre, activo in (('Abierto', True), ('Cerrado', False))
+        )
+        u = self.usuarios
+        self.qr_a, self.qr_b, self.qr_expirado, self.qr_cerrado = QR.objects.bulk_create([
+            QR(usuario=u[0], evento=self.evento, codigo='val-a'),
+            QR(usuario=u[1], evento=self.evento, codigo='val-b'),
+            QR(usuario=u[2], evento=self.evento, codigo='val-expirado', fecha_expiracion=ahora - datetime.timedelta(seconds=1)),
+            QR(usuario=u[0], evento=self.cerrado, codigo='val-cerrado'),
+        ])
+
+    def test_precarga_del_evento(self):
+        # Evento y todos sus códigos activos en dos consultas; los demás escaneos no leen la base
+        with self.assertNumQueries(2):
+            self.assertEqual(validacion_qr.validar_qr('val-a', self.evento.pk)['usuario_id'], self.usuarios[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(validacion_qr.validar_qr('val-b', self.evento.pk)['id'], self.qr_b.pk)
+            self.assertIsNone(validacion_qr.validar_qr('val-a', self.cerrado.pk))
+            self.assertIsNone(validacion_qr.validar_qr('', self.evento.pk))
+            self.assertIsNone(validacion_qr.validar_qr(None, self.evento.pk))
+            # Activo pero expirado: precargado y rechazado al validar
+            self.assertIsNone(validacion_qr.validar_qr('val-expirado', self.evento.pk))
+        # Un código desconocido se busca en la base: pudo crearse después de la precarga
+        with self.assertNumQueries(1):
+            self.assertIsNone(validacion_qr.validar_qr('val-desconocido', self.evento.pk))
+        nuevo = QR.objects.create(usuario=self.usuarios[3], evento=self.evento, codigo='val-nuevo')
+        with self.assertNumQueries(1):
+            self.assertEqual(validacion_qr.validar_qr('val-nuevo', self.evento.pk)['id'], nuevo.pk)
+
+    def test_evento_cerrado_sin_precarga(self):
+        with self.assertNumQueries(2):  # Evento y el código, sin precargar el resto
+            self.assertEqual(validacion_qr.validar_qr('val-cerrado', self.cerrado.pk)['id'], self.qr_cerrado.pk)
+        self.assertIsNone(caches[settings.QR_CACHE_ALIAS].get(f'evento:{self.cerrado.pk}:precargado'))
+
+    def test_invalidacion(self):
+        self.assertIsNotNone(validacion_qr.validar_qr('val-a', self.evento.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qr_a.activo = False
+            self.qr_a.save()
+        self.assertIsNone(validacion_qr.validar_qr('val-a', self.evento.pk))
+
+        # Editar el evento descarta su entrada y la marca de precarga
+        with self.captureOnCommitCallbacks(execute=True):
+            self.evento.activo = False
+            self.evento.save()
+        with self.assertNumQueries(1):
+            self.assertFalse(validacion_qr.obtener_evento(self.evento.pk)['activo'])
+        self.assertIsNone(caches[settings.QR_CACHE_ALIAS].get(f'evento:{self.evento.pk}:precargado'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qr_b.delete()
+        self.assertIsNone(validacion_qr.validar_qr('val-b', self.evento.pk))
+
+
+# --------------------------
+# Contadores del dashboard (app1.estadisticas)
+
+class ContadoresTests(TestCase):
+    def setUp(self):
+        estadisticas.guardar(estadisticas.contar(), estadisticas.contar_por_dia())
+
+    def assertContadoresAlDia(self):
+        guardadas = Estadisticas.objects.filter(pk=estadisticas.ID_ESTADISTICAS).values(*estadisticas.contar()).get()
+        self.assertEqual(guardadas, estadisticas.contar())
+        self.assertEqual(dict(AsistenciasPorDia.objects.exclude(total=0).values_list('fecha', 'total')), estadisticas.contar_por_dia())
+
+    def test_signals(self):
+        ahora = timezone.now()
+        aprendiz = User.objects.create(documento='c1', nombre='C', apellido='1', email='c1@cba.test', rol='Aprendiz')
+        instructor = User.objects.create(documento='c2', nombre='C', apellido='2', email='c2@cba.test', rol='Instructor')
+        evento = Evento.objects.create(nombre='C', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        otro = Evento.objects.create(nombre='D', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora, activo=False)
+        self.assertContadoresAlDia()
+
+        # Cambios de rol y de estado del evento
+        instructor.rol = 'Aprendiz'
+        instructor.save()
+        evento.activo = False
+        evento.save(update_fields=['activo'])
+        otro.nombre = 'Sin cambio de estado'
+        otro.save(update_fields=['nombre'])
+        self.assertContadoresAlDia()
+
+        # Asistencias individuales, por lote y borradas en cascada
+        Asistencia.objects.create(usuario=aprendiz, evento=evento, metodo='qr', estado='presente')
+        registro_asistencias.registrar(instructor.pk, evento.pk, 'qr', 'presente')
+        registro_asistencias.registrar(aprendiz.pk, otro.pk, 'qr', 'tarde')
+        self.assertEqual(estadisticas.leer(timezone.localdate()).asistencias_del_dia, 3)
+        self.assertContadoresAlDia()
+        evento.delete()
+        self.assertContadoresAlDia()
+        aprendiz.delete()
+        self.assertContadoresAlDia()
+        self.assertEqual(Estadisticas.objects.get(pk=estadisticas.ID_ESTADISTICAS).total_asistencias, 0)
+
+    def test_dashboard(self):
+        usuarios, eventos = crear_datos(10, 2, 2)
+        estadisticas.guardar(estadisticas.contar(), estadisticas.contar_por_dia())
+        headers = {'Authorization': f'Bearer {emitir_tokens(usuarios[0]).access_token}'}
+        respuesta = self.client.get(reverse('admin-stats'), headers=headers)
+        self.assertEqual(respuesta.json(), {
+            'totalAprendices': 9, 'activeEvents': 1, 'todayAttendance': 20,
+            'attendancePercentage': round(20 / (2 * 10) * 100, 2),
+        })
+
+    def test_recalcular_estadisticas(self):
+        crear_datos(10, 2, 2)  # bulk_create sin signals: los contadores quedan atrasados
+        with self.assertRaises(CommandError):
+            call_command('recalcular_estadisticas', '--verificar', stdout=io.StringIO())
+        salida = io.StringIO()
+        call_command('recalcular_estadisticas', stdout=salida)
+        self.assertIn('total_asistencias: guardado=0 real=20', salida.getvalue())
+        self.assertContadoresAlDia()
+        call_command('recalcular_estadisticas', '--verificar', stdout=io.StringIO())
+
+
+# --------------------------
+# Paginación por keyset (app1.pagination)
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        caches[settings.AUTENTICACION_CACHE].clear()
+        self.usuarios, self.eventos = crear_datos(aprendices=23, eventos=12, asistencias_por_usuario=12)
+        # Empates en la primera columna del orden: el id decide
+        instante = timezone.now().replace(microsecond=0)
+        User.objects.filter(pk__in=[u.pk for u in self.usuarios[5:15]]).update(fecha_registro=instante)
+        self.usuario = self.usuarios[1]
+        Asistencia.objects.filter(usuario=self.usuario, evento__in=self.eventos[:6]).update(fecha_registro=instante)
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    def recorrer(self, nombre, **params):
+        url = reverse(nombre) + '?' + urlencode(params)
+        ids = []
+        while url:
+            respuesta = self.client.get(url, headers=self.headers)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            datos = respuesta.json()
+            self.assertLessEqual(len(datos['results']), params.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE']))
+            ids += [fila['id'] for fila in datos['results']]
+            url = datos['next']
+        return ids
+
+    def test_orden_ascendente_con_empates(self):
+        esperado = list(User.objects.order_by('fecha_registro', 'id').values_list('id', flat=True))
+        self.assertEqual(self.recorrer('listar_usuarios', page_size=4), esperado)
+
+    def test_orden_descendente(self):
+        esperado = list(
+            Asistencia.objects.filter(usuario=self.usuario).order_by('-fecha_registro', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.recorrer('listar_asistencias', page_size=5), esperado)
+
+    def test_historial_con_archivo(self):
+        # La página que termina en la última asistencia vigente sigue con el archivo. Los
+        # resúmenes avanzan por id, así que lo archivado son los ids más bajos
+        Asistencia.objects.filter(Q(usuario=self.usuarios[0]) | Q(usuario=self.usuario, evento__in=self.eventos[:6])).update(
+            fecha_registro=datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc),
+        )
+        esperado = list(
+            Asistencia.objects.filter(usuario=self.usuario).order_by('-fecha_registro', '-id').values_list('id', flat=True)
+        )
+        archivo.archivar(datetime.date(2025, 1, 1))
+        self.assertEqual(AsistenciaArchivada.objects.filter(usuario=self.usuario).count(), 6)
+        self.assertEqual(self.recorrer('historial_asistencia', page_size=4), esperado)
+        self.assertEqual(self.recorrer('historial_asistencia', page_size=4, desde='2025-01-01'), esperado[:6])
+        self.assertEqual(self.recorrer('historial_asistencia', page_size=4, hasta='2025-01-01'), esperado[6:])
+
+    def test_tamano_de_pagina(self):
+        url = reverse('listar_eventos')
+        self.assertEqual(len(self.client.get(url, {'page_size': 0}, headers=self.headers).json()['results']), 12)
+        self.assertEqual(len(self.client.get(url, {'page_size': 'x'}, headers=self.headers).json()['results']), 12)
+        self.assertEqual(len(self.client.get(url, {'page_size': 5}, headers=self.headers).json()['results']), 5)
+        peticion = Request(RequestFactory().get(url, {'page_size': 5000}))
+        self.assertEqual(KeysetPagination().get_page_size(peticion), KeysetPagination.max_page_size)
+
+    def test_cursor_invalido(self):
+        posicion = base64.urlsafe_b64encode(json.dumps(['no es fecha', 1]).encode()).decode()
+        incompleto = base64.urlsafe_b64encode(json.dumps([1]).encode()).decode()
+        for cursor in ('%%%', 'bm8gZXMganNvbg==', incompleto, posicion):
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get(reverse('listar_usuarios'), {'cursor': cursor}, headers=self.headers)
+                self.assertEqual(respuesta.status_code, 404)
+                self.assertEqual(respuesta.json(), {'detail': 'Cursor inválido'})
+
+
+# --------------------------
+# Exportación de asistencias por evento
+
+class ExportacionAsistenciasTests(TestCase):
+    def setUp(self):
+        self.usuarios, self.eventos = crear_datos(aprendices=6, eventos=2, asistencias_por_usuario=2)
+        self.evento = self.eventos[0]
+        usuario = self.usuarios[1]
+        User.objects.filter(pk=usuario.pk).update(nombre='Ana, María', ficha=None)
+        punto = PuntoDeControl.objects.get(evento=self.evento)
+        Asistencia.objects.filter(usuario=usuario, evento=self.evento).update(punto=punto)
+        # La más antigua queda en el archivo
+        self.archivada = Asistencia.objects.filter(evento=self.evento).order_by('id').first()
+        Asistencia.objects.filter(pk=self.archivada.pk).update(fecha_registro=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        archivo.archivar(datetime.date(2025, 1, 1))
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(usuario).access_token}'}
+
+    def exportar(self, **params):
+        respuesta = self.client.get(
+            reverse('exportar_asistencias', kwargs={'pk': params.pop('pk', self.evento.pk)}), params, headers=self.headers,
+        )
+        contenido = b''.join(respuesta.streaming_content).decode() if respuesta.streaming else None
+        return respuesta, contenido
+
+    def esperado(self):
+        return [self.archivada.pk] + list(
+            Asistencia.objects.filter(evento=self.evento).order_by('fecha_registro', 'id').values_list('id', flat=True)
+        )
+
+    def test_csv(self):
+        respuesta, contenido = self.exportar()
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(respuesta['Content-Disposition'], f'attachment; filename="asistencias_evento_{self.evento.pk}.csv"')
+        filas = list(csv.DictReader(io.StringIO(contenido)))
+        self.assertEqual([int(fila['id']) for fila in filas], self.esperado())
+        self.assertEqual(filas[0]['fecha_registro'], timezone.localtime(datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)).isoformat())
+        ana = next(fila for fila in filas if fila['documento'] == self.usuarios[1].documento)
+        self.assertEqual((ana['nombre'], ana['ficha'], ana['punto']), ('Ana, María', '', 'Punto 0'))
+
+    @override_settings(EXPORTACION_CHUNK=2)
+    def test_ndjson(self):
+        respuesta, contenido = self.exportar(formato='ndjson')
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], self.esperado())
+        self.assertEqual(set(filas[0]), {'id', 'fecha_registro', 'metodo', 'estado', 'documento', 'nombre', 'apellido', 'ficha', 'punto'})
+        self.assertIsNone(next(fila for fila in filas if fila['documento'] == self.usuarios[1].documento)['ficha'])
+
+    def test_errores(self):
+        self.assertEqual(self.exportar(formato='xlsx')[0].status_code, 400)
+        self.assertEqual(self.exportar(pk=0)[0].status_code, 404)
+
+
+# --------------------------
+# Verificación de contraseñas en el login (app1.verificacion_login)
+
+class PBKDF2Rapido(PBKDF2PasswordHasher):
+    algorithm = 'pbkdf2_rapido'
+    iterations = 10
+
+
+@override_settings(PASSWORD_HASHERS=['app1.tests.PBKDF2Rapido'])
+class VerificacionLoginTests(TestCase):
+    def test_control_de_admision(self):
+        # Un hilo y un lugar en cola: la tercera verificación simultánea se rechaza sin esperar
+        verificador = VerificadorPasswords(1, 1)
+        liberar = threading.Event()
+
+        def verificar_lento(password, encoded):
+            liberar.wait(5)
+            return True, False
+
+        encoded = make_password('clave')
+        with mock.patch('app1.verificacion_login.verify_password', verificar_lento), ThreadPoolExecutor(2) as clientes:
+            esperando = [clientes.submit(verificador.verificar, 'clave', encoded, 5) for _ in range(2)]
+            try:
+                while verificador.metricas()['en_curso'] != 1 or verificador.metricas()['en_cola'] != 1:
+                    time.sleep(0.001)
+                with self.assertRaises(Saturado):
+                    verificador.verificar('clave', encoded)
+                self.assertEqual(verificador.metricas(), {'en_curso': 1, 'en_cola': 1, 'completadas': 0, 'rechazadas': 1, 'rehasheadas': 0})
+            finally:
+                liberar.set()
+            self.assertEqual([futuro.result() for futuro in esperando], [(True, None), (True, None)])
+        self.assertEqual(verificador.metricas()['completadas'], 2)
+        # Los cupos se devolvieron
+        self.assertEqual(verificador.verificar('clave', encoded), (True, None))
+        self.assertEqual(verificador.verificar('otra', encoded), (False, None))
+
+    def test_timeout(self):
+        verificador = VerificadorPasswords(1, 0)
+        liberar = threading.Event()
+        with mock.patch('app1.verificacion_login.verify_password', lambda *args: (liberar.wait(5), False)):
+            with self.assertRaises(Saturado):
+                verificador.verificar('clave', make_password('clave'), timeout=0.01)
+            liberar.set()
+        self.assertEqual(verificador.metricas()['rechazadas'], 1)
+
+    def test_login(self):
+        usuario = User.objects.create_user(
+            documento='login', nombre='L', apellido='L', email='login@cba.test', rol='Aprendiz', password='clave',
+        )
+        # Hash con menos iteraciones que las actuales: el login lo actualiza
+        User.objects.filter(pk=usuario.pk).update(password=PBKDF2Rapido().encode('clave', 'sal', iterations=5))
+        respuesta = self.client.post(reverse('login'), {'documento': 'login', 'password': 'clave'}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['role'], respuesta.json()['user']['documento']), ('Aprendiz', 'login'))
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password.startswith('pbkdf2_rapido$10$'))
+        self.assertTrue(usuario.check_password('clave'))
+
+        for datos in ({'documento': 'login', 'password': 'mala'}, {'documento': 'nadie', 'password': 'clave'}):
+            self.assertEqual(self.client.post(reverse('login'), datos, content_type='application/json').status_code, 400)
+
+        with mock.patch.object(VerificadorPasswords, 'verificar', side_effect=Saturado):
+            respuesta = self.client.post(reverse('login'), {'documento': 'login', 'password': 'clave'}, content_type='application/json')
+        self.assertEqual((respuesta.status_code, respuesta['Retry-After']), (503, str(settings.LOGIN_RETRY_AFTER)))
+
+        metricas = self.client.get(reverse('login_metricas'), headers={'Authorization': f'Bearer {emitir_tokens(usuario).access_token}'})
+        self.assertEqual(set(metricas.json()), {'en_curso', 'en_cola', 'completadas', 'rechazadas', 'rehasheadas'})
+
+
+# --------------------------
+# Registro por GPS (app1.geolocalizacion)
+
+class GeolocalizacionTests(TestCase):
+    def setUp(self):
+        geolocalizacion._indices.clear()
+        for alias in (settings.QR_CACHE_ALIAS, settings.ASISTENCIAS_VENTANA_CACHE):
+            caches[alias].clear()
+        ahora = timezone.now()
+        self.usuario = User.objects.create(documento='gps', nombre='G', apellido='P', email='gps@cba.test', rol='Aprendiz')
+        self.evento = Evento.objects.create(nombre='GPS', tipo='recorrido', fecha_inicio=ahora, fecha_fin=ahora)
+        # Dos puntos a ~30 m entre sí y uno inactivo justo encima del primero
+        self.norte, self.sur, self.inactivo = PuntoDeControl.objects.bulk_create([
+            PuntoDeControl(nombre='Norte', descripcion='', latitud=4.60030, longitud=-74.08000, evento=self.evento),
+            PuntoDeControl(nombre='Sur', descripcion='', latitud=4.60000, longitud=-74.08000, evento=self.evento),
+            PuntoDeControl(nombre='Inactivo', descripcion='', latitud=4.60031, longitud=-74.08000, evento=self.evento, activo=False),
+        ])
+
+    def fuerza_bruta(self, puntos, latitud, longitud, radio):
+        candidatos = [
+            (punto['id'], math.radians(punto['latitud']), math.radians(punto['longitud']), math.cos(math.radians(punto['latitud'])))
+            for punto in puntos
+        ]
+        distancias = geolocalizacion.distancias_haversine(math.radians(latitud), math.radians(longitud), candidatos)
+        distancia, punto_id = min(zip(distancias, (punto['id'] for punto in puntos)))
+        return punto_id if distancia <= radio else None
+
+    def test_igual_a_fuerza_bruta(self):
+        azar = random.Random(7)
+        puntos = [
+            {'id': i, 'latitud': 4.6 + azar.uniform(-0.01, 0.01), 'longitud': -74.08 + azar.uniform(-0.01, 0.01)}
+            for i in range(300)
+        ]
+        indice = geolocalizacion.IndiceEspacial(puntos, 50)
+        encontrados = 0
+        for _ in range(2000):
+            latitud, longitud = 4.6 + azar.uniform(-0.011, 0.011), -74.08 + azar.uniform(-0.011, 0.011)
+            cercano = indice.cercano(latitud, longitud)
+            self.assertEqual(cercano and cercano['id'], self.fuerza_bruta(puntos, latitud, longitud, 50))
+            encontrados += cercano is not None
+        self.assertGreater(encontrados, 100)  # Con y sin punto dentro del radio
+
+    def test_indice_del_evento(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(geolocalizacion.punto_cercano(self.evento.pk, 4.60029, -74.08)['id'], self.norte.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(geolocalizacion.punto_cercano(self.evento.pk, 4.60002, -74.08)['id'], self.sur.pk)
+            self.assertIsNone(geolocalizacion.punto_cercano(self.evento.pk, 4.6012, -74.08))  # ~100 m al norte
+        # Mover un punto reconstruye el índice
+        with self.captureOnCommitCallbacks(execute=True):
+            self.norte.latitud = 4.6010
+            self.norte.save()
+        self.assertEqual(geolocalizacion.punto_cercano(self.evento.pk, 4.6012, -74.08)['id'], self.norte.pk)
+        with override_settings(GPS_INDICE_TTL=-1), self.assertNumQueries(1):
+            geolocalizacion.punto_cercano(self.evento.pk, 4.6, -74.08)
+
+    def test_registro_por_gps(self):
+        headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+        def registrar(**datos):
+            return self.client.post(
+                reverse('registrar_asistencia'), {'evento_id': self.evento.pk, 'metodo': 'gps', 'estado': 'presente', **datos},
+                content_type='application/json', headers=headers,
+            )
+
+        respuesta = registrar(latitud=4.60005, longitud=-74.08001)
+        self.assertEqual((respuesta.status_code, respuesta.json()['punto']), (201, self.sur.pk))
+        self.assertEqual(registrar(latitud=4.7, longitud=-74.08).status_code, 400)
+        for latitud, longitud in ((None, -74.08), ('x', -74.08), (91, -74.08), (4.6, 181)):
+            self.assertEqual(registrar(latitud=latitud, longitud=longitud).json(), {'error': 'Coordenadas inválidas'})
+
+
+# --------------------------
+# GET condicional (app1.versiones)
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        caches[settings.AUTENTICACION_CACHE].clear()
+        ahora = timezone.now()
+        self.usuario, self.otro = User.objects.bulk_create(
+            User(documento=f'etag{i}', nombre='E', apellido=str(i), email=f'etag{i}@cba.test', rol='Aprendiz') for i in range(2)
+        )
+        self.evento = Evento.objects.create(nombre='ETag', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        self.qr = QR.objects.create(usuario=self.usuario, evento=self.evento, codigo='etag-qr')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    def pedir(self, nombre, etag=None, **params):
+        headers = {**self.headers, **({'If-None-Match': etag} if etag else {})}
+        return self.client.get(reverse(nombre), params, headers=headers)
+
+    def assertCambia(self, nombre, cambio, **params):
+        etag = self.pedir(nombre, **params)['ETag']
+        # Vigente: 304 con una sola lectura de app1_versionrecurso (el usuario ya está en cache)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.pedir(nombre, etag, **params).status_code, 304)
+        cambio()
+        respuesta = self.pedir(nombre, etag, **params)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def assertNoCambia(self, nombre, cambio):
+        etag = self.pedir(nombre)['ETag']
+        cambio()
+        self.assertEqual(self.pedir(nombre, etag).status_code, 304)
+
+    def test_perfil(self):
+        def editar():
+            self.client.put(
+                reverse('editar_usuario', kwargs={'pk': self.usuario.pk}), {'nombre': 'Editado'},
+                content_type='application/json', headers=self.headers,
+            )
+        self.assertCambia('perfil', editar)
+        self.assertNoCambia('perfil', lambda: User.objects.get(pk=self.otro.pk).save())
+
+    def test_eventos(self):
+        ahora = timezone.now()
+        self.assertCambia('listar_eventos', lambda: Evento.objects.create(nombre='Otro', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora))
+        # Otra página u otro formato es otra representación
+        self.assertNotEqual(self.pedir('listar_eventos')['ETag'], self.pedir('listar_eventos', page_size=1)['ETag'])
+
+    def test_qrs(self):
+        self.assertCambia('listar_qr', lambda: QR.objects.filter(pk=self.qr.pk).get().save())
+        self.assertNoCambia('listar_qr', lambda: QR.objects.create(usuario=self.otro, evento=self.evento, codigo='etag-otro'))
+        # Borrar el evento deja sus QR con evento NULL sin post_save
+        self.assertCambia('listar_qr', self.evento.delete)
+        ahora = timezone.now()
+        nuevo = Evento.objects.create(nombre='Masivo', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        self.assertCambia('listar_qr', lambda: generacion_qr.generar(nuevo, User.objects.filter(pk=self.usuario.pk)))
+
+
+# --------------------------
+# Vistas asíncronas (app1.views_async), por la pila ASGI de AsyncClient
+
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        for alias in (settings.QR_CACHE_ALIAS, settings.ASISTENCIAS_VENTANA_CACHE, settings.AUTENTICACION_CACHE):
+            caches[alias].clear()
+        ahora = timezone.now()
+        self.usuario = User.objects.create(documento='asy', nombre='A', apellido='S', email='asy@cba.test', rol='Aprendiz')
+        self.evento = Evento.objects.create(nombre='Async', tipo='clase', fecha_inicio=ahora, fecha_fin=ahora)
+        QR.objects.create(usuario=self.usuario, evento=self.evento, codigo='async-qr')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'}
+
+    async def registrar(self, clave=None, **datos):
+        headers = {**self.headers, **({'Idempotency-Key': clave} if clave else {})}
+        datos = {'evento_id': self.evento.pk, 'metodo': 'qr', 'estado': 'presente', 'codigo_qr': 'async-qr', **datos}
+        return await self.async_client.post(
+            reverse('registrar_asistencia_async'), datos, content_type='application/json', headers=headers,
+        )
+
+    async def test_sin_token(self):
+        for metodo, nombre in (('get', 'perfil_async'), ('post', 'registrar_asistencia_async'), ('post', 'validar_qr')):
+            for headers in ({}, {'Authorization': 'Bearer no-es-un-jwt'}):
+                with self.subTest(nombre=nombre, headers=headers):
+                    respuesta = await getattr(self.async_client, metodo)(reverse(nombre), headers=headers)
+                    self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(await Asistencia.objects.acount(), 0)
+
+    def editar(self):
+        # on_commit se registra en la conexión del hilo de sync_to_async, no en la del event loop
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.nombre = 'Cambiado'
+            self.usuario.save()
+
+    async def test_perfil_condicional(self):
+        respuesta = await self.async_client.get(reverse('perfil_async'), headers=self.headers)
+        self.assertEqual((respuesta.status_code, respuesta.json()['documento']), (200, 'asy'))
+        etag = respuesta['ETag']
+        respuesta = await self.async_client.get(reverse('perfil_async'), headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual((respuesta.status_code, respuesta['ETag']), (304, etag))
+
+        await sync_to_async(self.editar)()
+        respuesta = await self.async_client.get(reverse('perfil_async'), headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual((respuesta.status_code, respuesta.json()['nombre']), (200, 'Cambiado'))
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    async def test_registro_idempotente(self):
+        primera = await self.registrar('async-1')
+        self.assertEqual(primera.status_code, 201)
+        repetida = await self.registrar('async-1')
+        self.assertEqual((repetida.status_code, repetida.json()), (200, primera.json()))
+        # Sin la ventana en memoria la base de datos devuelve la misma asistencia
+        await caches[settings.ASISTENCIAS_VENTANA_CACHE].aclear()
+        reintento = await self.registrar('async-1')
+        self.assertEqual((reintento.status_code, reintento.json()['id']), (200, primera.json()['id']))
+        self.assertEqual(await Asistencia.objects.acount(), 1)
+
+    async def test_qr_invalido(self):
+        respuesta = await self.registrar(codigo_qr='no-existe')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json(), {'error': 'Código QR no válido para este evento'})
+        for datos, codigo in (({'evento_id': 0}, 404), ({'metodo': 'fax'}, 400)):
+            self.assertEqual((await self.registrar(**datos)).status_code, codigo)
+        self.assertEqual(await Asistencia.objects.acount(), 0)
+
+        url = reverse('validar_qr')
+        for codigo, valido in (('no-existe', False), ('async-qr', True)):
+            respuesta = await self.async_client.post(
+                url, {'evento_id': self.evento.pk, 'codigo_qr': codigo}, content_type='application/json', headers=self.headers,
+            )
+            self.assertEqual((respuesta.status_code, respuesta.json()['valido']), (200, valido))
+        respuesta = await self.async_client.post(url, 'no es json', content_type='application/json', headers=self.headers)
+        self.assertEqual(respuesta.status_code, 400)
+
+
+# --------------------------
+# Autenticación JWT sin consultar usuarios (app1.authentication)
+
+class AutenticacionTests(TestCase):
+    def setUp(self):
+        caches[settings.AUTENTICACION_CACHE].clear()
+        self.usuario = User.objects.create(documento='auth', nombre='A', apellido='U', email='auth@cba.test', rol='Instructor')
+
+    def peticion(self, token=None):
+        token = token or emitir_tokens(self.usuario).access_token
+        return Request(RequestFactory().get('/', headers={'Authorization': f'Bearer {token}'}))
+
+    def test_cache(self):
+        autenticador = JWTCacheAuthentication()
+        with self.assertNumQueries(1):
+            self.assertEqual(autenticador.authenticate(self.peticion())[0].pk, self.usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(autenticador.authenticate(self.peticion())[0].rol, 'Instructor')
+            self.assertEqual(async_to_sync(aautenticar)(self.peticion()).pk, self.usuario.pk)
+
+        # Editar o desactivar al usuario lo saca de la cache al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.rol = 'Administrativo'
+            self.usuario.save()
+        self.assertEqual(autenticador.authenticate(self.peticion())[0].rol, 'Administrativo')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        with self.assertRaises(AuthenticationFailed):
+            autenticador.authenticate(self.peticion())
+
+    def test_usuario_eliminado(self):
+        token = emitir_tokens(self.usuario).access_token
+        JWTCacheAuthentication().authenticate(self.peticion(token))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.delete()
+        with self.assertRaises(AuthenticationFailed):
+            JWTCacheAuthentication().authenticate(self.peticion(token))
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(aautenticar)(self.peticion(token))
+
+    def test_claims(self):
+        autenticador = JWTClaimsAuthentication()
+        with self.assertNumQueries(0):
+            user, _ = autenticador.authenticate(self.peticion())
+        self.assertEqual((user.pk, user.rol, user.desde_token), (self.usuario.pk, 'Instructor', True))
+        with self.assertNumQueries(1):
+            self.assertEqual(usuario_completo(user).email, 'auth@cba.test')
+
+        # La desactivación solo se ve en tokens nuevos
+        self.usuario.is_active = False
+        with self.assertRaises(AuthenticationFailed):
+            autenticador.authenticate(self.peticion(emitir_tokens(self.usuario).access_token))
+
+        # Token sin claims (emitido antes): se resuelve contra la base de datos
+        sin_claims = RefreshToken.for_user(self.usuario).access_token
+        User.objects.filter(pk=self.usuario.pk).update(is_active=True)
+        with self.assertNumQueries(1):
+            self.assertFalse(getattr(autenticador.authenticate(self.peticion(sin_claims))[0], 'desde_token', False))
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_AUTHENTICATION_CLASSES': ['app1.authentication.JWTClaimsAuthentication']})
+    def test_perfil_con_claims(self):
+        # La vista completa el usuario que llega solo con los claims
+        respuesta = self.client.get(reverse('perfil'), headers={'Authorization': f'Bearer {emitir_tokens(self.usuario).access_token}'})
+        self.assertEqual((respuesta.status_code, respuesta.json()['email']), (200, 'auth@cba.test'))
+
+
+# --------------------------
+# Resúmenes de asistencia (app1.resumenes)
+
+class ResumenesTests(TestCase):
+    def setUp(self):
+        self.usuarios, self.eventos = crear_datos(aprendices=10, eventos=3, asistencias_por_usuario=3)
+        self.ids = list(Asistencia.objects.order_by('id').values_list('id', flat=True))
+        self.hace_una_hora = timezone.now() - datetime.timedelta(hours=1)
+        Asistencia.objects.update(fecha_registro=self.hace_una_hora)
+
+    def marca(self):
+        return MarcaResumen.objects.get(nombre=resumenes.MARCA).ultimo_id
+
+    def totales(self, granularidad='dia', dimension='evento'):
+        totales = Counter()
+        for valor, total in ResumenAsistencias.objects.filter(granularidad=granularidad, dimension=dimension).values_list('valor', 'total'):
+            totales[valor] += total
+        return dict(totales)
+
+    def esperado(self):
+        return {
+            str(evento_id): total
+            for evento_id, total in Asistencia.objects.values('evento_id').annotate(total=Count('id')).values_list('evento_id', 'total')
+        }
+
+    def test_marca_y_margen(self):
+        # Las últimas 5 son más recientes que el margen: esperan a la siguiente corrida
+        Asistencia.objects.filter(id__in=self.ids[-5:]).update(fecha_registro=timezone.now())
+        self.assertEqual(resumenes.actualizar(chunk=7), 25)
+        self.assertEqual(self.marca(), self.ids[24])
+        self.assertEqual(resumenes.actualizar(chunk=7), 0)
+
+        Asistencia.objects.filter(id__in=self.ids[-5:]).update(fecha_registro=self.hace_una_hora)
+        self.assertEqual(resumenes.actualizar(), 5)
+        self.assertEqual(self.totales(), self.esperado())
+        self.assertEqual(self.totales('hora'), self.esperado())
+        self.assertEqual(sum(self.totales(dimension='ficha').values()), 30)
+
+    def test_transaccion_lenta(self):
+        # Un id bajo confirmado tarde (fecha reciente) detiene la marca aunque lo posterior sea viejo
+        Asistencia.objects.filter(pk=self.ids[10]).update(fecha_registro=timezone.now())
+        self.assertEqual(resumenes.actualizar(), 10)
+        self.assertEqual(self.marca(), self.ids[9])
+        self.assertEqual(resumenes.actualizar(margen=0), 20)
+        self.assertEqual(self.totales(), self.esperado())
+
+    def test_reconstruir_con_archivo(self):
+        resumenes.actualizar()
+        antes = self.totales()
+        Asistencia.objects.filter(id__in=self.ids[:12]).update(fecha_registro=datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc))
+        archivo.archivar(datetime.date(2025, 1, 1))
+        self.assertEqual(AsistenciaArchivada.objects.count(), 12)
+        salida = io.StringIO()
+        call_command('actualizar_resumenes', '--reconstruir', stdout=salida)
+        self.assertIn('30 asistencias sumadas', salida.getvalue())
+        self.assertEqual(self.totales(), antes)
+
+    def test_reporte(self):
+        resumenes.actualizar()
+        headers = {'Authorization': f'Bearer {emitir_tokens(self.usuarios[0]).access_token}'}
+        url = reverse('reporte_asistencias')
+        datos = self.client.get(url, {'dimension': 'evento', 'granularidad': 'dia', 'valor': self.eventos[0].pk}, headers=headers).json()
+        self.assertEqual(sum(fila['total'] for fila in datos['resultados']), self.esperado()[str(self.eventos[0].pk)])
+        for params in ({'dimension': 'usuario'}, {'granularidad': 'mes'}, {'desde': 'ayer'}):
+            self.assertEqual(self.client.get(url, params, headers=headers).status_code, 400)
+        with override_settings(RESUMEN_MAXIMO_FILAS=0):
+            self.assertEqual(self.client.get(url, headers=headers).status_code, 400)
+
+
+# --------------------------
+# Cierre de eventos (app1.cierre_eventos)
+
+class CierreEventosTests(TestCase):
+    def setUp(self):
+        # 20 usuarios (18 aprendices) con asistencia solo en el primer evento
+        self.usuarios, self.eventos = crear_datos(aprendices=20, eventos=3, asistencias_por_usuario=1)
+        estadisticas.guardar(estadisticas.contar())
+
+    def ausentes(self, evento):
+        return set(Asistencia.objects.filter(evento=evento, estado='ausente').values_list('usuario_id', flat=True))
+
+    def test_cerrar_por_bloques(self):
+        evento = self.eventos[1]
+        # Una asistencia previa, otra jornada y un aprendiz mixto
+        Asistencia.objects.create(usuario=self.usuarios[1], evento=evento, metodo='qr', estado='presente')
+        User.objects.filter(pk=self.usuarios[2].pk).update(jornada='tarde')
+        User.objects.filter(pk=self.usuarios[3].pk).update(jornada='mixto')
+        User.objects.filter(pk=self.usuarios[4].pk).update(is_active=False)
+
+        self.assertEqual(cierre_eventos.cerrar(evento, chunk=4), 15)
+        esperados = {u.pk for i, u in enumerate(self.usuarios) if i % 10 and i not in (1, 2, 4)}
+        self.assertEqual(self.ausentes(evento), esperados)
+        evento.refresh_from_db()
+        self.assertFalse(evento.activo)
+        self.assertEqual(Estadisticas.objects.get(pk=estadisticas.ID_ESTADISTICAS).total_asistencias, 36)
+
+        # Repetir el cierre no duplica
+        self.assertEqual(cierre_eventos.cerrar(evento, chunk=4), 0)
+        self.assertEqual(Asistencia.objects.filter(evento=evento).count(), 16)
+
+    def test_fichas_y_roles(self):
+        evento = self.eventos[2]
+        self.assertEqual(cierre_eventos.cerrar(evento, fichas=['F1'], roles=['Aprendiz']), 3)
+        self.assertEqual(cierre_eventos.cerrar(evento, roles=['Instructor']), 2)
+        self.assertEqual(cierre_eventos.cerrar(self.eventos[0]), 0)
+
+    def test_comando(self):
+        salida = io.StringIO()
+        call_command('cerrar_evento', str(self.eventos[1].pk), '--ficha', 'F2', '--chunk', '1', stdout=salida)
+        self.assertIn('3 ausencias registradas', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('cerrar_evento', '0')
+
+    def test_endpoint(self):
+        headers = {'Authorization': f'Bearer {emitir_tokens(self.usuarios[0]).access_token}'}
+        url = reverse('cerrar_evento', kwargs={'pk': self.eventos[1].pk})
+        for datos in ({'fichas': 'F1'}, {'roles': []}, {'roles': ['Rector']}):
+            self.assertEqual(self.client.post(url, datos, content_type='application/json', headers=headers).status_code, 400)
+        respuesta = self.client.post(url, {'fichas': ['F1', 'F3']}, content_type='application/json', headers=headers)
+        self.assertEqual(respuesta.json(), {'evento': self.eventos[1].pk, 'activo': False, 'ausentes_registradas': 5})
+        self.assertEqual(self.client.post(reverse('cerrar_evento', kwargs={'pk': 0}), headers=headers).status_code, 404)
+
+
+# --------------------------
+# Imágenes de QR con dirección por contenido (app1.imagenes_qr)
+
+class ImagenesQRTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(QR_IMAGENES_DIR=directorio.name))
+        self.usuarios, self.eventos = crear_datos(aprendices=3, eventos=2, asistencias_por_usuario=0)
+        self.qr = QR.objects.get(codigo=f'qr-{self.usuarios[1].pk}-{self.eventos[0].pk}')
+        self.headers = {'Authorization': f'Bearer {emitir_tokens(self.usuarios[1]).access_token}'}
+
+    def test_huella(self):
+        huella = imagenes_qr.huella('abc', 'png')
+        self.assertTrue(imagenes_qr.es_huella(huella))
+        self.assertFalse(imagenes_qr.es_huella('../' + huella[3:]))
+        self.assertNotEqual(huella, imagenes_qr.huella('abc', 'svg'))
+        with override_settings(QR_IMAGEN_ESCALA=4):
+            self.assertNotEqual(huella, imagenes_qr.huella('abc', 'png'))
+
+        # Generar dos veces reutiliza el archivo
+        ruta = imagenes_qr.generar('abc', 'png')
+        self.assertEqual(ruta, imagenes_qr.ruta(huella, 'png'))
+        modificado = os.path.getmtime(ruta)
+        self.assertEqual(imagenes_qr.generar('abc', 'png'), ruta)
+        self.assertEqual(os.path.getmtime(ruta), modificado)
+        with open(ruta, 'rb') as archivo:
+            self.assertEqual(archivo.read(8), b'\x89PNG\r\n\x1a\n')
+
+    def test_redireccion_y_etag(self):
+        respuesta = self.client.get(reverse('imagen_qr', kwargs={'pk': self.qr.pk}), {'formato': 'png'}, headers=self.headers)
+        huella = imagenes_qr.huella(self.qr.codigo, 'png')
+        destino = reverse('archivo_imagen_qr', kwargs={'pk': self.qr.pk, 'huella': huella, 'formato': 'png'})
+        self.assertEqual((respuesta.status_code, respuesta['Location']), (302, destino))
+
+        respuesta = self.client.get(destino, headers=self.headers)
+        self.assertEqual((respuesta.status_code, respuesta['Content-Type'], respuesta['ETag']), (200, 'image/png', f'"{huella}"'))
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertEqual(b''.join(respuesta.streaming_content)[:4], b'\x89PNG')
+        respuesta = self.client.get(destino, headers={**self.headers, 'If-None-Match': f'"{huella}"'})
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_errores(self):
+        url = reverse('imagen_qr', kwargs={'pk': self.qr.pk})
+        self.assertEqual(self.client.get(url, {'formato': 'gif'}, headers=self.headers).status_code, 400)
+        # QR de otro usuario
+        otro = QR.objects.get(codigo=f'qr-{self.usuarios[2].pk}-{self.eventos[0].pk}')
+        self.assertEqual(self.client.get(reverse('imagen_qr', kwargs={'pk': otro.pk}), headers=self.headers).status_code, 404)
+        # Huella inválida o que no corresponde al código
+        for huella in ('x' * 64, imagenes_qr.huella('otro-codigo', 'svg')):
+            destino = reverse('archivo_imagen_qr', kwargs={'pk': self.qr.pk, 'huella': huella, 'formato': 'svg'})
+            self.assertEqual(self.client.get(destino, headers=self.headers).status_code, 404)
+
+    def test_regenera_si_falta(self):
+        huella = imagenes_qr.huella(self.qr.codigo, 'svg')
+        destino = reverse('archivo_imagen_qr', kwargs={'pk': self.qr.pk, 'huella': huella, 'formato': 'svg'})
+        ruta = imagenes_qr.ruta(huella, 'svg')
+        self.assertFalse(os.path.exists(ruta))
+        respuesta = self.client.get(destino, headers=self.headers)
+        self.assertEqual((respuesta.status_code, respuesta['Content-Type']), (200, 'image/svg+xml'))
+        self.assertIn(b'<svg', b''.join(respuesta.streaming_content))
+        self.assertTrue(os.path.exists(ruta))
+
+    def test_borrada_al_abrir(self):
+        # Una limpieza concurrente borra el archivo justo después de generarlo: no es un 500
+        generar = imagenes_qr.generar
+
+        def generar_y_borrar(codigo, formato):
+            ruta = generar(codigo, formato)
+            os.remove(ruta)
+            return ruta
+
+        huella = imagenes_qr.huella(self.qr.codigo, 'svg')
+        destino = reverse('archivo_imagen_qr', kwargs={'pk': self.qr.pk, 'huella': huella, 'formato': 'svg'})
+        with mock.patch.object(imagenes_qr, 'generar', generar_y_borrar):
+            respuesta = self.client.get(destino, headers=self.headers)
+        self.assertEqual((respuesta.status_code, respuesta['ETag']), (200, f'"{huella}"'))
+        self.assertIn(b'<svg', b''.join(respuesta.streaming_content))
+
+    def test_precalentar(self):
+        salida = io.StringIO()
+        call_command('precalentar_imagenes_qr', str(self.eventos[0].pk), '--formato', 'svg', '--procesos', '1', stdout=salida)
+        activos = QR.objects.filter(evento=self.eventos[0], activo=True).count()
+        self.assertIn(f'{activos} imágenes generadas', salida.getvalue())
+        self.assertEqual(imagenes_qr.precalentar(
+            QR.objects.filter(evento=self.eventos[0], activo=True).values_list('codigo', flat=True), ['svg'], procesos=1,
+        ), 0)
+        with self.assertRaises(CommandError):
+            call_command('precalentar_imagenes_qr', '0')
+
+
+# --------------------------
+# Sincronización de escáneres sin conexión (app1.sincronizacion)
+
+@override_settings(SYNC_MARGEN_SEGUNDOS=0)
+class SincronizacionTests(TestCase):
+    def setUp(self):
+        self.usuarios, self.eventos = crear_datos(aprendices=6, eventos=2, asistencias_por_usuario=0)
+        self.evento = self.eventos[0]
+        self.activos = list(QR.objects.filter(evento=self.evento, activo=True).order_by('id'))
+
+    def ids(self, lista):
+        return [fila['id'] for fila in lista]
+
+    def test_completo(self):
+        datos = sincronizacion.sincronizar([self.evento.pk, 0])
+        self.assertTrue(datos['completo'])
+        self.assertEqual(self.ids(datos['eventos']), [self.evento.pk])
+        self.assertEqual(datos['eventos_eliminados'], [0])
+        self.assertEqual(self.ids(datos['codigos']), [qr.pk for qr in self.activos])
+        self.assertEqual(sorted(self.ids(datos['usuarios'])), sorted(qr.usuario_id for qr in self.activos))
+        self.assertEqual(set(datos['usuarios'][0]), set(sincronizacion.CAMPOS_USUARIO))
+
+    def test_cambios(self):
+        eventos = [self.evento.pk]
+        cursor = sincronizacion.sincronizar(eventos)['cursor']
+        vacio = sincronizacion.sincronizar(eventos, cursor)
+        self.assertEqual((vacio['completo'], vacio['codigos'], vacio['codigos_bajas'], vacio['usuarios']), (False, [], [], []))
+
+        desactivado, expirado, editado = self.activos[:3]
+        desactivado.activo = False
+        desactivado.save()
+        QR.objects.filter(pk=expirado.pk).update(fecha_expiracion=timezone.now())
+        usuario = User.objects.get(pk=editado.usuario_id)
+        usuario.nombre = 'Editado'
+        usuario.save(update_fields=['nombre'])
+        # Los cambios fuera del padrón o de otros eventos no se envían
+        usuario_sin_qr = User.objects.create(documento='s1', nombre='S', apellido='1', email='s1@cba.test', rol='Aprendiz')
+        usuario_sin_qr.nombre = 'Sin QR'
+        usuario_sin_qr.save()
+        QR.objects.create(usuario=usuario_sin_qr, evento=self.eventos[1], codigo='otro-evento')
+        dueño = User.objects.create(documento='s2', nombre='S', apellido='2', email='s2@cba.test', rol='Aprendiz')
+        nuevo = QR.objects.create(usuario=dueño, evento=self.evento, codigo='nuevo')
+        self.evento.nombre = 'Renombrado'
+        self.evento.save()
+
+        datos = sincronizacion.sincronizar(eventos, cursor)
+        self.assertFalse(datos['completo'])
+        self.assertEqual([(e['id'], e['nombre']) for e in datos['eventos']], [(self.evento.pk, 'Renombrado')])
+        self.assertEqual(self.ids(datos['codigos']), [nuevo.pk])
+        self.assertEqual(datos['codigos_bajas'], sorted([desactivado.pk, expirado.pk]))
+        self.assertIn({campo: getattr(usuario, campo) for campo in sincronizacion.CAMPOS_USUARIO}, datos['usuarios'])
+        self.assertIn(dueño.pk, self.ids(datos['usuarios']))
+        self.assertNotIn(usuario_sin_qr.pk, self.ids(datos['usuarios']))
+
+        # Con el cursor nuevo no se repiten los cambios; el cursor guarda segundos enteros, así
+        # que una expiración del mismo segundo puede volver a llegar como baja
+        siguiente = sincronizacion.sincronizar(eventos, datos['cursor'])
+        self.assertEqual((siguiente['codigos'], siguiente['usuarios']), ([], []))
+        self.assertLessEqual(set(siguiente['codigos_bajas']), {expirado.pk})
+
+        # Borrados
+        nuevo_id = nuevo.pk
+        nuevo.delete()
+        self.evento.delete()
+        datos = sincronizacion.sincronizar(eventos, siguiente['cursor'])
+        self.assertEqual((datos['eventos'], datos['eventos_eliminados']), ([], eventos))
+        self.assertIn(nuevo_id, datos['codigos_bajas'])
+
+    @override_settings(SYNC_MARGEN_SEGUNDOS=60)
+    def test_margen(self):
+        # Un cambio más reciente que el margen se repite hasta que lo supera
+        eventos = [self.evento.pk]
+        cursor = sincronizacion.sincronizar(eventos)['cursor']
+        self.activos[0].save()
+        datos = sincronizacion.sincronizar(eventos, cursor)
+        self.assertEqual(self.ids(datos['codigos']), [self.activos[0].pk])
+        self.assertEqual(self.ids(sincronizacion.sincronizar(eventos, datos['cursor'])['codigos']), [self.activos[0].pk])
+        CambioSync.objects.update(fecha=timezone.now() - datetime.timedelta(minutes=2))
+        datos = sincronizacion.sincronizar(eventos, datos['cursor'])
+        self.assertEqual(self.ids(datos['codigos']), [self.activos[0].pk])
+        self.assertEqual(self.ids(sincronizacion.sincronizar(eventos, datos['cursor'])['codigos']), [])
+
+    def test_vuelve_a_completo(self):
+        eventos = [self.evento.pk]
+        cursor = sincronizacion.sincronizar(eventos)['cursor']
+        self.assertTrue(sincronizacion.sincronizar([self.evento.pk, self.eventos[1].pk], cursor)['completo'])
+        self.activos[0].save()
+        self.activos[1].save()
+        with override_settings(SYNC_MAXIMO_CAMBIOS=1):
+            self.assertTrue(sincronizacion.sincronizar(eventos, cursor)['completo'])
+        desde, _, huella = cursor.split('.')
+        viejo = f'{desde}.{int((timezone.now() - datetime.timedelta(days=31)).timestamp())}.{huella}'
+        self.assertTrue(sincronizacion.sincronizar(eventos, viejo)['completo'])
+        for invalido in ('abc', '1.2', '1.x.y'):
+            with self.assertRaises(sincronizacion.CursorInvalido):
+                sincronizacion.sincronizar(eventos, invalido)
+
+    def test_purgar(self):
+        self.activos[0].save()
+        self.activos[1].save()
+        CambioSync.objects.filter(objeto_id=self.activos[0].pk).update(fecha=timezone.now() - datetime.timedelta(days=31))
+        salida = io.StringIO()
+        call_command('purgar_cambios_sync', stdout=salida)
+        self.assertIn('1 cambios anteriores a 30 días borrados', salida.getvalue())
+        self.assertEqual(list(CambioSync.objects.values_list('objeto_id', flat=True)), [self.activos[1].pk])
+
+    def test_endpoint(self):
+        headers = {'Authorization': f'Bearer {emitir_tokens(self.usuarios[1]).access_token}'}
+        url = reverse('sincronizar')
+        for params in ({}, {'eventos': '1,a'}, {'eventos': self.evento.pk, 'cursor': 'abc'}):
+            self.assertEqual(self.client.get(url, params, headers=headers).status_code, 400)
+        with override_settings(SYNC_MAXIMO_EVENTOS=1):
+            params = {'eventos': f'{self.evento.pk},{self.eventos[1].pk}'}
+            self.assertEqual(self.client.get(url, params, headers=headers).status_code, 400)
+        datos = self.client.get(url, {'eventos': self.evento.pk}, headers=headers).json()
+        self.assertEqual(len(datos['codigos']), len(self.activos))
+        datos = self.client.get(url, {'eventos': self.evento.pk, 'cursor': datos['cursor']}, headers=headers).json()
+        self.assertFalse(datos['completo'])
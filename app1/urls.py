@@ -1,19 +1,24 @@
 from django.urls import path
 from .views import (
-    RegisterView, LoginView, PerfilUsuarioView,
-    CrearEventoView, GetEventosView,
-    RegistrarAsistenciaView, GetAsistenciasView, HistorialAsistenciaView,
-    GenerarQRView, GetQRsView,
+    RegisterView, LoginView, LoginMetricasView, MetricasView, PerfilUsuarioView,
+    CrearEventoView, GetEventosView, CerrarEventoView,
+    RegistrarAsistenciaView, RegistrarAsistenciasLoteView, GetAsistenciasView, HistorialAsistenciaView,
+    ExportarAsistenciasView, ReporteAsistenciasView,
+    GenerarQRView, GenerarQRsEventoView, GetQRsView, ImagenQRView, ArchivoImagenQRView, SincronizarView,
     GetUsersView, GetUserByDocumentoView, AdminStatsView,
-    CreateUserView, UpdateUserView, DeleteUserView, UpdateEventoView, DeleteEventoView
+    CreateUserView, ImportarUsersView, UpdateUserView, DeleteUserView, UpdateEventoView, DeleteEventoView
 )
+from .views_async import PerfilUsuarioAsyncView, ValidarQRAsyncView, RegistrarAsistenciaAsyncView
 
 urlpatterns = [
     # --------------------------
     # Autenticación
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('login/metricas/', LoginMetricasView.as_view(), name='login_metricas'),
+    path('metricas/', MetricasView.as_view(), name='metricas'),  # Prometheus
     path('perfil/', PerfilUsuarioView.as_view(), name='perfil'),
+    path('perfil/async/', PerfilUsuarioAsyncView.as_view(), name='perfil_async'),  # ASGI
 
     # --------------------------
     # Admin Stats (Dashboard)
@@ -25,22 +30,33 @@ urlpatterns = [
     path('eventos/listar/', GetEventosView.as_view(), name='listar_eventos'),
     path('eventos/<int:pk>/update/', UpdateEventoView.as_view(), name='editar_evento'),  # PUT
     path('eventos/<int:pk>/delete/', DeleteEventoView.as_view(), name='eliminar_evento'),  # DELETE
+    path('eventos/<int:pk>/cerrar/', CerrarEventoView.as_view(), name='cerrar_evento'),  # POST, registra ausencias
 
     # --------------------------
     # Asistencias
     path('asistencias/registrar/', RegistrarAsistenciaView.as_view(), name='registrar_asistencia'),
+    path('asistencias/registrar/async/', RegistrarAsistenciaAsyncView.as_view(), name='registrar_asistencia_async'),  # ASGI
+    path('asistencias/registrar/lote/', RegistrarAsistenciasLoteView.as_view(), name='registrar_asistencias_lote'),  # POST
     path('asistencias/listar/', GetAsistenciasView.as_view(), name='listar_asistencias'),
     path('asistencias/historial/', HistorialAsistenciaView.as_view(), name='historial_asistencia'),
+    path('eventos/<int:pk>/asistencias/exportar/', ExportarAsistenciasView.as_view(), name='exportar_asistencias'),  # GET ?formato=csv|ndjson
+    path('reportes/asistencias/', ReporteAsistenciasView.as_view(), name='reporte_asistencias'),  # GET ?dimension=&granularidad=&desde=&hasta=
 
     # --------------------------
     # QR
     path('qr/crear/', GenerarQRView.as_view(), name='generar_qr'),
+    path('eventos/<int:pk>/qr/generar/', GenerarQRsEventoView.as_view(), name='generar_qr_evento'),  # POST, manifiesto csv|ndjson
     path('qr/listar/', GetQRsView.as_view(), name='listar_qr'),
+    path('qr/<int:pk>/imagen/', ImagenQRView.as_view(), name='imagen_qr'),  # GET ?formato=svg|png, redirige
+    path('qr/<int:pk>/imagen/<str:huella>.<str:formato>', ArchivoImagenQRView.as_view(), name='archivo_imagen_qr'),  # inmutable
+    path('qr/validar/', ValidarQRAsyncView.as_view(), name='validar_qr'),  # POST, ASGI
+    path('sync/', SincronizarView.as_view(), name='sincronizar'),  # GET ?eventos=1,2&cursor=, escáneres sin conexión
 
     # --------------------------
     # Usuarios - Gestión Admin
     path('users/', GetUsersView.as_view(), name='listar_usuarios'),  # GET all
     path('users/create/', CreateUserView.as_view(), name='crear_usuario'),  # POST
+    path('users/importar/', ImportarUsersView.as_view(), name='importar_usuarios'),  # POST CSV (?parcial=true)
     path('users/<int:pk>/update/', UpdateUserView.as_view(), name='editar_usuario'),  # PUT
     path('users/<int:pk>/delete/', DeleteUserView.as_view(), name='eliminar_usuario'),  # DELETE
     path('users/<str:documento>/', GetUserByDocumentoView.as_view(), name='usuario_por_documento'),  # GET by documento
@@ -0,0 +1,187 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import QR, Evento
+from . import qr_firmado
+
+# --------------------------
+# Cache de validación de códigos QR
+#
+# Guarda en memoria los eventos y los códigos activos de los eventos en curso, de modo
+# que un escaneo válido no necesite leer la base de datos. El tamaño y la expiración
+# los controla el backend configurado en CACHES (LocMemCache descarta por LRU al
+# llegar a MAX_ENTRIES y cada entrada vence a los TIMEOUT segundos). Con varios
+# workers y un backend local, el TIMEOUT acota cuánto tarda un cambio en verse en los
+# demás procesos; con un backend compartido la invalidación es inmediata.
+#
+# Los códigos firmados (app1.qr_firmado) se validan por su firma, sin cache ni base de
+# datos. Con QR_FIRMA_REVOCACION además deben existir y estar activos en la tabla QR,
+# comprobación que pasa por la misma cache que los códigos uuid.
+
+CAMPOS_QR = ('id', 'codigo', 'usuario_id', 'evento_id', 'punto_id', 'fecha_expiracion', 'activo')
+
+
+def _cache():
+    return caches[settings.QR_CACHE_ALIAS]
+
+
+def _clave_qr(codigo):
+    # Se usa un hash para que cualquier código sea una clave válida en cualquier backend
+    return 'qr:' + hashlib.sha1(codigo.encode()).hexdigest()
+
+
+def _clave_evento(evento_id):
+    return f'evento:{evento_id}'
+
+
+def _clave_precargado(evento_id):
+    return f'evento:{evento_id}:precargado'
+
+
+def obtener_evento(evento_id):
+    if evento_id is None:
+        return None
+    cache = _cache()
+    evento = cache.get(_clave_evento(evento_id))
+    if evento is None:
+        evento = Evento.objects.filter(pk=evento_id).values('id', 'activo', 'fecha_inicio', 'fecha_fin').first()
+        if evento is None:
+            return None
+        cache.set(_clave_evento(evento_id), evento)
+    return evento
+
+
+def precargar_evento(evento_id):
+    cache = _cache()
+    codigos = {
+        _clave_qr(qr['codigo']): qr
+        for qr in QR.objects.filter(evento_id=evento_id, activo=True).values(*CAMPOS_QR)
+    }
+    cache.set_many(codigos)
+    cache.set(_clave_precargado(evento_id), True)
+    return codigos
+
+
+def validar_qr(codigo, evento_id):
+    if not isinstance(codigo, str) or not codigo:
+        return None
+    if qr_firmado.es_firmado(codigo):
+        datos = qr_firmado.verificar(codigo)
+        if datos is None or datos['evento_id'] != evento_id:
+            return None
+        if not settings.QR_FIRMA_REVOCACION:
+            return datos
+    cache = _cache()
+    clave = _clave_qr(codigo)
+    qr = cache.get(clave)
+
+    if qr is None:
+        evento = obtener_evento(evento_id)
+        if evento and evento['activo'] and not cache.get(_clave_precargado(evento_id)):
+            # Primer escaneo del evento en este proceso: cargar todos sus códigos activos
+            qr = precargar_evento(evento_id).get(clave)
+        if qr is None:
+            # El código pudo crearse en otro proceso después de la precarga
+            qr = QR.objects.filter(codigo=codigo).values(*CAMPOS_QR).first()
+            if qr is None:
+                return None
+            cache.set(clave, qr)
+
+    if qr['evento_id'] != evento_id or not qr['activo']:
+        return None
+    if qr['fecha_expiracion'] and qr['fecha_expiracion'] <= timezone.now():
+        return None
+    return qr
+
+
+def validar_qrs(codigos):
+    # Mismas reglas que validar_qr para un lote (RegistrarAsistenciasLoteView): firma vigente
+    # o fila activa y sin expirar, con una sola consulta para los códigos que la necesitan.
+    # Devuelve {codigo: datos} solo con los válidos; el evento lo compara quien llama
+    validos, pendientes, firmados = {}, [], {}
+    for codigo in codigos:
+        if not isinstance(codigo, str) or not codigo:
+            continue
+        if qr_firmado.es_firmado(codigo):
+            datos = qr_firmado.verificar(codigo)
+            if datos is None:
+                continue
+            if not settings.QR_FIRMA_REVOCACION:
+                validos[codigo] = datos
+                continue
+            firmados[codigo] = datos
+        pendientes.append(codigo)
+    if pendientes:
+        ahora = timezone.now()
+        for qr in QR.objects.filter(codigo__in=pendientes, activo=True).values(*CAMPOS_QR):
+            if qr['fecha_expiracion'] and qr['fecha_expiracion'] <= ahora:
+                continue
+            validos[qr['codigo']] = firmados.get(qr['codigo'], qr)
+    return validos
+
+
+# Versiones asíncronas para las vistas ASGI (app1.views_async)
+
+async def aobtener_evento(evento_id):
+    if evento_id is None:
+        return None
+    cache = _cache()
+    evento = await cache.aget(_clave_evento(evento_id))
+    if evento is None:
+        evento = await Evento.objects.filter(pk=evento_id).values('id', 'activo', 'fecha_inicio', 'fecha_fin').afirst()
+        if evento is None:
+            return None
+        await cache.aset(_clave_evento(evento_id), evento)
+    return evento
+
+
+async def aprecargar_evento(evento_id):
+    cache = _cache()
+    codigos = {
+        _clave_qr(qr['codigo']): qr
+        async for qr in QR.objects.filter(evento_id=evento_id, activo=True).values(*CAMPOS_QR)
+    }
+    await cache.aset_many(codigos)
+    await cache.aset(_clave_precargado(evento_id), True)
+    return codigos
+
+
+async def avalidar_qr(codigo, evento_id):
+    if not isinstance(codigo, str) or not codigo:
+        return None
+    if qr_firmado.es_firmado(codigo):
+        datos = qr_firmado.verificar(codigo)
+        if datos is None or datos['evento_id'] != evento_id:
+            return None
+        if not settings.QR_FIRMA_REVOCACION:
+            return datos
+    cache = _cache()
+    clave = _clave_qr(codigo)
+    qr = await cache.aget(clave)
+
+    if qr is None:
+        evento = await aobtener_evento(evento_id)
+        if evento and evento['activo'] and not await cache.aget(_clave_precargado(evento_id)):
+            qr = (await aprecargar_evento(evento_id)).get(clave)
+        if qr is None:
+            qr = await QR.objects.filter(codigo=codigo).values(*CAMPOS_QR).afirst()
+            if qr is None:
+                return None
+            await cache.aset(clave, qr)
+
+    if qr['evento_id'] != evento_id or not qr['activo']:
+        return None
+    if qr['fecha_expiracion'] and qr['fecha_expiracion'] <= timezone.now():
+        return None
+    return qr
+
+
+def invalidar_qr(codigo):
+    _cache().delete(_clave_qr(codigo))
+
+
+def invalidar_evento(evento_id):
+    _cache().delete_many([_clave_evento(evento_id), _clave_precargado(evento_id)])
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+# --------------------------
+# Verificación de contraseñas con control de admisión
+#
+# PBKDF2 libera el GIL, así que un pool de hilos pequeño verifica contraseñas en paralelo
+# sin ocupar más CPU de la que se le asigna. Si ya hay LOGIN_MAX_PENDIENTES peticiones
+# esperando turno, la siguiente se rechaza de inmediato en lugar de hacer cola y dejar
+# sin workers al resto de endpoints.
+
+
+class Saturado(Exception):
+    pass
+
+
+class VerificadorPasswords:
+    def __init__(self, hilos, max_pendientes):
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='verificacion-login')
+        self.cupos = threading.BoundedSemaphore(hilos + max_pendientes)
+        self.lock = threading.Lock()
+        self.en_curso = 0
+        self.en_cola = 0
+        self.completadas = 0
+        self.rechazadas = 0
+        self.rehasheadas = 0
+
+    def verificar(self, password, encoded, timeout=None):
+        # Devuelve (valida, nuevo_hash); nuevo_hash no es None si hay que rehashear
+        if not self.cupos.acquire(blocking=False):
+            with self.lock:
+                self.rechazadas += 1
+            raise Saturado()
+
+        with self.lock:
+            self.en_cola += 1
+        futuro = self.pool.submit(self._verificar, password, encoded)
+        futuro.add_done_callback(lambda _: self.cupos.release())
+        try:
+            return futuro.result(timeout)
+        except TimeoutError:
+            with self.lock:
+                self.rechazadas += 1
+            raise Saturado()
+
+    def _verificar(self, password, encoded):
+        with self.lock:
+            self.en_cola -= 1
+            self.en_curso += 1
+        valida = actualizar = False
+        try:
+            valida, actualizar = verify_password(password, encoded)
+            # Los parámetros del hasher cambiaron (p. ej. más iteraciones): rehashear ahora
+            nuevo_hash = make_password(password) if valida and actualizar else None
+        finally:
+            with self.lock:
+                self.en_curso -= 1
+                self.completadas += 1
+                if valida and actualizar:
+                    self.rehasheadas += 1
+        return valida, nuevo_hash
+
+    def metricas(self):
+        with self.lock:
+            return {
+                'en_curso': self.en_curso,
+                'en_cola': self.en_cola,
+                'completadas': self.completadas,
+                'rechazadas': self.rechazadas,
+                'rehasheadas': self.rehasheadas,
+            }
+
+
+_verificador = None
+_lock_verificador = threading.Lock()
+
+
+def verificador():
+    global _verificador
+    if _verificador is None:
+        with _lock_verificador:
+            if _verificador is None:
+                _verificador = VerificadorPasswords(settings.LOGIN_HILOS, settings.LOGIN_MAX_PENDIENTES)
+    return _verificador
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.db import connection
+
+from .models import VersionRecurso
+
+# --------------------------
+# Versiones de recursos para GET condicional
+#
+# Cada cambio en Evento, QR o User incrementa el contador de los recursos que lo
+# muestran (signals y rutas masivas). El ETag de una respuesta se arma con esos
+# contadores, así que un If-None-Match vigente se resuelve con una lectura por clave
+# primaria de app1_versionrecurso, sin consultar las tablas principales ni serializar.
+
+EVENTOS = 'eventos'
+
+
+def qrs(usuario_id):
+    return f'qrs:{usuario_id}'
+
+
+def usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def incrementar(*claves):
+    claves = sorted(set(claves))  # orden fijo para no bloquearse entre transacciones
+    if not claves:
+        return
+    tabla = connection.ops.quote_name(VersionRecurso._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (clave, version) VALUES (%s, 1) '
+            f'ON CONFLICT (clave) DO UPDATE SET version = {tabla}.version + 1',
+            [(clave,) for clave in claves],
+        )
+
+
+def leer(*claves):
+    versiones = dict(VersionRecurso.objects.filter(clave__in=claves).values_list('clave', 'version'))
+    return [versiones.get(clave, 0) for clave in claves]
+
+
+async def aleer(*claves):
+    filas = VersionRecurso.objects.filter(clave__in=claves).values_list('clave', 'version')
+    versiones = {clave: version async for clave, version in filas}
+    return [versiones.get(clave, 0) for clave in claves]
+
+
+def _variante(request, claves):
+    # La representación también depende del recurso, la página pedida y el formato negociado
+    return hashlib.sha1(
+        f"{','.join(claves)}|{request.META.get('QUERY_STRING', '')}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()[:16]
+
+
+def etag(request, *claves):
+    return '-'.join(str(version) for version in leer(*claves)) + f'-{_variante(request, claves)}'
+
+
+async def aetag(request, *claves):
+    return '-'.join(str(version) for version in await aleer(*claves)) + f'-{_variante(request, claves)}'
@@ -2,12 +2,53 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
 from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import etag
 from django.utils import timezone
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User, QR, Evento, Asistencia
-from .serializers import UserSerializer, EventoSerializer, AsistenciaSerializer, QRSerializer
-import uuid
+from .models import User, QR, Evento, Asistencia, PuntoDeControl, ResumenAsistencias, AsistenciaArchivada
+from .serializers import (
+    UserSerializer, EventoSerializer, AsistenciaSerializer, QRSerializer,
+    user_listado, evento_listado, asistencia_listado, qr_listado,
+)
+from .authentication import emitir_tokens, usuario_completo
+from .pagination import KeysetPagination
+from .signals import creacion_masiva
+from .metricas import registro as registro_metricas
+from .verificacion_login import Saturado, verificador
+from . import archivo, cierre_eventos, estadisticas, generacion_qr, geolocalizacion, imagenes_qr, importacion, qr_firmado, registro_asistencias, sincronizacion, validacion_qr, versiones
+import csv
+import hmac
+import itertools
+import json
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fecha(valor):
+    # Acepta fecha (2025-03-01) o fecha y hora ISO; sin zona se interpreta en TIME_ZONE
+    if not valor:
+        return None
+    try:
+        fecha = parse_datetime(valor) or parse_datetime(f'{valor}T00:00:00')
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValueError(valor)
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
 
 
 # --------------------------
@@ -19,8 +60,9 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            QR.objects.create(usuario=user, codigo=str(uuid.uuid4()))
+            with transaction.atomic():
+                user = serializer.save()
+                QR.objects.create(usuario=user, codigo=qr_firmado.emitir(user.pk))
             return Response({"mensaje": "Usuario registrado correctamente"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -34,14 +76,25 @@ class LoginView(APIView):
 
         try:
             user = User.objects.get(documento=documento)
-            if not user.check_password(password):
+            # El hash se verifica en un pool acotado; si está lleno se responde 503 de inmediato
+            valida, nuevo_hash = verificador().verificar(password, user.password, settings.LOGIN_TIMEOUT)
+            if not valida:
                 raise ValueError("Contraseña incorrecta")
         except User.DoesNotExist:
             return Response({"error": "Usuario no encontrado"}, status=400)
         except ValueError as e:
             return Response({"error": str(e)}, status=400)
+        except Saturado:
+            return Response(
+                {"error": "Demasiados inicios de sesión simultáneos, intente de nuevo"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.LOGIN_RETRY_AFTER)},
+            )
 
-        refresh = RefreshToken.for_user(user)
+        if nuevo_hash:
+            User.objects.filter(pk=user.pk).update(password=nuevo_hash)
+
+        refresh = emitir_tokens(user)
         serializer = UserSerializer(user)
 
         return Response({
@@ -52,11 +105,55 @@ class LoginView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class LoginMetricasView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(verificador().metricas(), status=status.HTTP_200_OK)
+
+
+# --------------------------
+# Métricas en formato de texto de Prometheus
+
+class MetricasView(APIView):
+    # Prometheus no maneja el login JWT: entra con el token fijo METRICAS_TOKEN. También
+    # entran los usuarios Administrativo con su JWT; sin token y con DEBUG = True queda abierto
+    permission_classes = [AllowAny]
+
+    def token_metricas(self, request):
+        token = settings.METRICAS_TOKEN
+        return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+    def perform_authentication(self, request):
+        # El token de métricas no es un JWT: con él no se intenta la autenticación
+        if not self.token_metricas(request):
+            request.user
+
+    def get(self, request):
+        if not (
+            self.token_metricas(request)
+            or (settings.DEBUG and not settings.METRICAS_TOKEN)
+            or getattr(request.user, 'rol', None) == 'Administrativo'
+        ):
+            if request.user.is_authenticated:
+                return Response({'error': 'Solo usuarios administrativos'}, status=status.HTTP_403_FORBIDDEN)
+            return Response({'error': 'No autorizado'}, status=status.HTTP_401_UNAUTHORIZED)
+        login = [
+            (f'cbapoint_login_{nombre}', f'Verificación de contraseñas: {nombre}', valor)
+            for nombre, valor in verificador().metricas().items()
+        ]
+        return HttpResponse(
+            registro_metricas.prometheus(login),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
 class PerfilUsuarioView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(etag(lambda request: versiones.etag(request, versiones.usuario(request.user.pk))))
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(usuario_completo(request.user))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -65,24 +162,24 @@ class PerfilUsuarioView(APIView):
 
 class AdminStatsView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
 
     def get(self, request):
-        total_aprendices = User.objects.filter(rol='Aprendiz').count()
-        active_events = Evento.objects.filter(activo=True).count()
-        today = timezone.now().date()
-        today_attendance = Asistencia.objects.filter(fecha_registro__date=today).count()
-        total_asistencias = Asistencia.objects.count()
+        # Una sola lectura por clave primaria de los contadores mantenidos por signals
+        today = timezone.localdate()
+        stats = estadisticas.leer(today)
+        if stats is None:
+            estadisticas.guardar(estadisticas.contar(), estadisticas.contar_por_dia())
+            stats = estadisticas.leer(today)
 
         attendance_percentage = 0
-        total_usuarios = User.objects.count()
-        total_eventos = Evento.objects.count()
-        if total_eventos > 0 and total_usuarios > 0:
-            attendance_percentage = round((total_asistencias / (total_eventos * total_usuarios)) * 100, 2)
+        if stats.total_eventos > 0 and stats.total_usuarios > 0:
+            attendance_percentage = round((stats.total_asistencias / (stats.total_eventos * stats.total_usuarios)) * 100, 2)
 
         return Response({
-            "totalAprendices": total_aprendices,
-            "activeEvents": active_events,
-            "todayAttendance": today_attendance,
+            "totalAprendices": stats.total_aprendices,
+            "activeEvents": stats.eventos_activos,
+            "todayAttendance": stats.asistencias_del_dia,
             "attendancePercentage": attendance_percentage
         })
 
@@ -92,11 +189,13 @@ class AdminStatsView(APIView):
 
 class GetUsersView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+    ordering = ('fecha_registro', 'id')
 
     def get(self, request):
-        usuarios = User.objects.all()
-        serializer = UserSerializer(usuarios, many=True)
-        return Response(serializer.data, status=200)
+        paginator = KeysetPagination()
+        usuarios = paginator.paginate_queryset(user_listado.valores(User.objects.all()), request, view=self)
+        return paginator.get_paginated_response(user_listado.serializar(usuarios))
 
 
 class CreateUserView(APIView):
@@ -112,12 +211,38 @@ class CreateUserView(APIView):
 
         serializer = UserSerializer(data=data)
         if serializer.is_valid():
-            user = serializer.save()
-            QR.objects.create(usuario=user, codigo=str(uuid.uuid4()))
+            with transaction.atomic():
+                user = serializer.save()
+                QR.objects.create(usuario=user, codigo=qr_firmado.emitir(user.pk))
             return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ImportarUsersView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        subido = request.FILES.get('archivo')
+        try:
+            texto = subido.read().decode('utf-8') if subido else request.data.get('csv', '')
+            filas = importacion.leer_csv(texto)
+        except UnicodeDecodeError:
+            return Response({'error': 'El archivo debe estar en UTF-8'}, status=400)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=400)
+        if not filas:
+            return Response({'error': 'El archivo no contiene usuarios'}, status=400)
+
+        parcial = str(request.query_params.get('parcial', '')).lower() in ('1', 'true')
+        try:
+            creados, errores = importacion.importar(filas, parcial=parcial)
+        except IntegrityError:
+            return Response({'error': 'Conflicto con un registro simultáneo, reintente la importación'}, status=409)
+        if errores and not parcial:
+            return Response({'importados': 0, 'errores': errores}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'importados': len(creados), 'errores': errores}, status=status.HTTP_201_CREATED)
+
+
 class UpdateUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -129,7 +254,8 @@ class UpdateUserView(APIView):
 
         serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
@@ -161,15 +287,16 @@ class CrearEventoView(APIView):
             except User.DoesNotExist:
                 return Response({'error': 'Docente no encontrado'}, status=404)
 
-        evento = Evento.objects.create(
-            nombre=data.get('nombre'),
-            tipo=data.get('tipo'),
-            fecha_inicio=parse_datetime(data.get('fecha_inicio')),
-            fecha_fin=parse_datetime(data.get('fecha_fin')),
-            jornada=data.get('jornada', None),
-            docente=docente,
-            activo=data.get('activo', True)
-        )
+        with transaction.atomic():
+            evento = Evento.objects.create(
+                nombre=data.get('nombre'),
+                tipo=data.get('tipo'),
+                fecha_inicio=parse_datetime(data.get('fecha_inicio')),
+                fecha_fin=parse_datetime(data.get('fecha_fin')),
+                jornada=data.get('jornada', None),
+                docente=docente,
+                activo=data.get('activo', True)
+            )
         serializer = EventoSerializer(evento)
         return Response(serializer.data, status=201)
 
@@ -194,7 +321,8 @@ class UpdateEventoView(APIView):
 
         serializer = EventoSerializer(evento, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
@@ -210,13 +338,37 @@ class DeleteEventoView(APIView):
             return Response({'error': 'Evento no encontrado'}, status=404)
 
 
+class CerrarEventoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            evento = Evento.objects.get(pk=pk)
+        except Evento.DoesNotExist:
+            return Response({'error': 'Evento no encontrado'}, status=404)
+
+        fichas = request.data.get('fichas')
+        roles = request.data.get('roles', list(cierre_eventos.ROLES))
+        if fichas is not None and not isinstance(fichas, list):
+            return Response({'error': 'fichas debe ser una lista'}, status=400)
+        validos = {valor for valor, _ in User._meta.get_field('rol').choices}
+        if not isinstance(roles, list) or not roles or not set(roles) <= validos:
+            return Response({'error': f'roles debe ser una lista con valores de {", ".join(sorted(validos))}'}, status=400)
+
+        ausentes = cierre_eventos.cerrar(evento, fichas, roles)
+        return Response({'evento': evento.pk, 'activo': evento.activo, 'ausentes_registradas': ausentes})
+
+
 class GetEventosView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+    ordering = ('id',)
 
+    @method_decorator(etag(lambda request: versiones.etag(request, versiones.EVENTOS)))
     def get(self, request):
-        eventos = Evento.objects.all()
-        serializer = EventoSerializer(eventos, many=True)
-        return Response(serializer.data, status=200)
+        paginator = KeysetPagination()
+        eventos = paginator.paginate_queryset(evento_listado.valores(Evento.objects.all()), request, view=self)
+        return paginator.get_paginated_response(evento_listado.serializar(eventos))
 
 
 # --------------------------
@@ -226,50 +378,325 @@ class RegistrarAsistenciaView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        evento_id = request.data.get('evento_id')
+        evento_id = _entero(request.data.get('evento_id'))
+        punto_id = _entero(request.data.get('punto_id'))
         metodo = request.data.get('metodo')
         estado = request.data.get('estado')
+        clave = request.headers.get('Idempotency-Key') or request.data.get('clave_idempotencia')
+        usuario = request.user
 
-        try:
-            evento = Evento.objects.get(id=evento_id)
-        except Evento.DoesNotExist:
+        if evento_id is None:
+            return Response({'error': 'Evento no encontrado'}, status=404)
+        error = registro_asistencias.validar(metodo, estado, clave)
+        if error:
+            return Response({'error': error}, status=400)
+
+        # Reintento o escaneo repetido reciente: se responde sin tocar la base de datos
+        repetida = registro_asistencias.buscar_en_ventana(usuario.pk, evento_id, punto_id, clave)
+        if repetida is not None:
+            return Response(repetida, status=status.HTTP_200_OK)
+
+        # Evento y código se validan contra la cache en memoria
+        evento = validacion_qr.obtener_evento(evento_id)
+        if evento is None:
             return Response({'error': 'Evento no encontrado'}, status=404)
-
-        usuario = request.user
 
         if metodo == 'qr':
             codigo_qr = request.data.get('codigo_qr')
-            try:
-                qr = QR.objects.get(codigo=codigo_qr, evento=evento)
-            except QR.DoesNotExist:
+            if validacion_qr.validar_qr(codigo_qr, evento_id) is None:
                 return Response({'error': 'Código QR no válido para este evento'}, status=400)
+        elif metodo == 'gps':
+            # El punto de control es el más cercano del evento dentro del radio permitido
+            try:
+                latitud = float(request.data.get('latitud'))
+                longitud = float(request.data.get('longitud'))
+                if not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({'error': 'Coordenadas inválidas'}, status=400)
+            punto = geolocalizacion.punto_cercano(evento_id, latitud, longitud)
+            if punto is None:
+                return Response(
+                    {'error': f'No hay un punto de control del evento a menos de {settings.GPS_RADIO_METROS} m'},
+                    status=400,
+                )
+            punto_id = punto['id']
+
+        try:
+            asistencia, creada = registro_asistencias.registrar(usuario.pk, evento_id, metodo, estado, punto_id, clave)
+        except IntegrityError:
+            # Las repetidas no fallan (ON CONFLICT DO NOTHING): solo la FK del punto se explica aquí
+            if punto_id is None or PuntoDeControl.objects.filter(pk=punto_id).exists():
+                raise
+            return Response({'error': 'Punto de control no válido'}, status=400)
 
-        asistencia = Asistencia.objects.create(
-            usuario=usuario,
-            evento=evento,
-            metodo=metodo,
-            estado=estado
-        )
         serializer = AsistenciaSerializer(asistencia)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        registro_asistencias.guardar_en_ventana(serializer.data, clave)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if creada else status.HTTP_200_OK)
+
+
+class RegistrarAsistenciasLoteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        registros = request.data.get('registros')
+        if not isinstance(registros, list) or not registros:
+            return Response({'error': 'Debe enviar una lista de registros'}, status=400)
+        maximo = settings.ASISTENCIAS_LOTE_MAXIMO
+        if len(registros) > maximo:
+            return Response({'error': f'El lote no puede superar {maximo} registros'}, status=400)
+
+        # Normalizar cada escaneo antes de consultar la base de datos
+        escaneos = []
+        for registro in registros:
+            if not isinstance(registro, dict):
+                escaneos.append(None)
+                continue
+            escaneos.append({
+                'evento_id': _entero(registro.get('evento_id')),
+                'punto_id': _entero(registro.get('punto_id')),
+                'codigo_qr': registro.get('codigo_qr'),
+                'metodo': registro.get('metodo', 'qr'),
+                'estado': registro.get('estado', 'presente'),
+            })
+
+        # Resolver eventos, puntos y códigos del lote completo con una consulta por tabla
+        validos = [e for e in escaneos if e]
+        eventos = Evento.objects.in_bulk({e['evento_id'] for e in validos if e['evento_id']})
+        puntos = PuntoDeControl.objects.in_bulk({e['punto_id'] for e in validos if e['punto_id']})
+        # Mismas reglas que el registro individual: activos, sin expirar o con firma vigente
+        qrs = validacion_qr.validar_qrs({e['codigo_qr'] for e in validos if isinstance(e['codigo_qr'], str)})
+
+        estados = {valor for valor, _ in Asistencia._meta.get_field('estado').choices}
+        resultados = []
+        nuevas = {}
+        for indice, escaneo in enumerate(escaneos):
+            error = None
+            if escaneo is None:
+                error = 'Registro inválido'
+            elif escaneo['metodo'] != 'qr':
+                error = 'El registro por lote solo admite el método qr'
+            elif escaneo['estado'] not in estados:
+                error = 'Estado no válido'
+            elif escaneo['evento_id'] not in eventos:
+                error = 'Evento no encontrado'
+            elif not eventos[escaneo['evento_id']].activo:
+                error = 'El evento no está activo'
+            elif escaneo['punto_id'] and escaneo['punto_id'] not in puntos:
+                error = 'Punto de control no encontrado'
+            elif escaneo['punto_id'] and puntos[escaneo['punto_id']].evento_id != escaneo['evento_id']:
+                error = 'El punto de control no pertenece al evento'
+            else:
+                qr = qrs.get(escaneo['codigo_qr'])
+                if qr is None or qr['evento_id'] != escaneo['evento_id']:
+                    error = 'Código QR no válido para este evento'
+
+            if error:
+                resultados.append({'indice': indice, 'ok': False, 'error': error})
+                continue
+
+            llave = (qrs[escaneo['codigo_qr']]['usuario_id'], escaneo['evento_id'], escaneo['punto_id'])
+            resultados.append({'indice': indice, 'ok': True, 'llave': llave})
+            if llave not in nuevas:
+                nuevas[llave] = Asistencia(
+                    usuario_id=llave[0],
+                    evento_id=llave[1],
+                    punto_id=llave[2],
+                    metodo=escaneo['metodo'],
+                    estado=escaneo['estado'],
+                )
+
+        # Escaneos ya registrados (una asistencia por usuario, evento y punto) se responden
+        # con la asistencia existente; se buscan todos con una sola consulta
+        existentes = {}
+        if nuevas:
+            for asistencia in Asistencia.objects.filter(
+                usuario_id__in={llave[0] for llave in nuevas},
+                evento_id__in={llave[1] for llave in nuevas},
+            ):
+                llave = (asistencia.usuario_id, asistencia.evento_id, asistencia.punto_id)
+                if llave in nuevas:
+                    existentes[llave] = asistencia
+                    del nuevas[llave]
+
+        # Una sola escritura y un solo commit para todo el lote
+        try:
+            with transaction.atomic():
+                creadas = Asistencia.objects.bulk_create(nuevas.values())
+                creacion_masiva.send(sender=Asistencia, instancias=creadas)
+        except IntegrityError:
+            # Otro escáner registró alguno de estos escaneos al mismo tiempo; al reintentar
+            # el lote esos escaneos se responderán como duplicados
+            return Response({'error': 'Conflicto con un registro simultáneo, reintente el lote'}, status=409)
+
+        filas = list(nuevas.items()) + list(existentes.items())
+        datos = dict(zip(
+            [llave for llave, _ in filas],
+            AsistenciaSerializer([asistencia for _, asistencia in filas], many=True).data,
+        ))
+        vistas = set()
+        for resultado in resultados:
+            if resultado['ok']:
+                llave = resultado.pop('llave')
+                resultado['asistencia'] = datos[llave]
+                resultado['duplicado'] = llave in existentes or llave in vistas
+                vistas.add(llave)
+
+        return Response({
+            'registradas': len(creadas),
+            'duplicadas': sum(1 for resultado in resultados if resultado.get('duplicado')),
+            'rechazadas': sum(1 for resultado in resultados if not resultado['ok']),
+            'resultados': resultados,
+        }, status=status.HTTP_201_CREATED)
 
 
 class GetAsistenciasView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+    ordering = ('-fecha_registro', '-id')
 
     def get(self, request):
-        asistencias = Asistencia.objects.filter(usuario=request.user)
-        serializer = AsistenciaSerializer(asistencias, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        asistencias = paginator.paginate_queryset(
+            asistencia_listado.valores(Asistencia.objects.filter(usuario=request.user)), request, view=self
+        )
+        return paginator.get_paginated_response(asistencia_listado.serializar(asistencias))
 
 
 class HistorialAsistenciaView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+    ordering = ('-fecha_registro', '-id')
 
     def get(self, request):
-        asistencias = Asistencia.objects.filter(usuario=request.user)
-        serializer = AsistenciaSerializer(asistencias, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            desde = _fecha(request.query_params.get('desde'))
+            hasta = _fecha(request.query_params.get('hasta'))
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida: {e}'}, status=400)
+
+        # Asistencia y luego el archivo; con desde/hasta PostgreSQL solo lee las particiones del rango
+        paginator = KeysetPagination()
+        asistencias = paginator.paginate_querysets(
+            [asistencia_listado.valores(fuente) for fuente in archivo.historial(request.user, desde, hasta)],
+            request, view=self,
+        )
+        return paginator.get_paginated_response(asistencia_listado.serializar(asistencias))
+
+
+class _ExportacionMixin:
+    # Respuesta en streaming (CSV o NDJSON) de filas de values_list() con las `columnas` de la vista
+    formatos = ('csv', 'ndjson')
+
+    def transmitir(self, filas, formato, archivo, status=200):
+        if formato == 'csv':
+            contenido, content_type = self.generar_csv(filas), 'text/csv; charset=utf-8'
+        else:
+            contenido, content_type = self.generar_ndjson(filas), 'application/x-ndjson'
+
+        response = StreamingHttpResponse(contenido, content_type=content_type, status=status)
+        response['Content-Disposition'] = f'attachment; filename="{archivo}.{formato}"'
+        return response
+
+    def generar_csv(self, filas):
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow([nombre for nombre, _ in self.columnas])
+        for fila in filas:
+            yield escritor.writerow(
+                timezone.localtime(valor).isoformat() if hasattr(valor, 'tzinfo') else valor
+                for valor in fila
+            )
+
+    def generar_ndjson(self, filas):
+        nombres = [nombre for nombre, _ in self.columnas]
+        for fila in filas:
+            yield json.dumps(dict(zip(nombres, fila)), cls=DjangoJSONEncoder) + '\n'
+
+
+class ExportarAsistenciasView(_ExportacionMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    columnas = [
+        ('id', 'id'),
+        ('fecha_registro', 'fecha_registro'),
+        ('metodo', 'metodo'),
+        ('estado', 'estado'),
+        ('documento', 'usuario__documento'),
+        ('nombre', 'usuario__nombre'),
+        ('apellido', 'usuario__apellido'),
+        ('ficha', 'usuario__ficha'),
+        ('punto', 'punto__nombre'),
+    ]
+
+    def get(self, request, pk):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in self.formatos:
+            return Response({'error': 'Formato no soportado, use csv o ndjson'}, status=400)
+        if not Evento.objects.filter(pk=pk).exists():
+            return Response({'error': 'Evento no encontrado'}, status=404)
+
+        # iterator() usa un cursor del lado del servidor en PostgreSQL y trae las filas por
+        # bloques, así que la memoria no depende del número de asistencias del evento
+        # El archivo (semestres cerrados) va primero: todo lo archivado es anterior a Asistencia
+        filas = itertools.chain.from_iterable(
+            modelo.objects.filter(evento_id=pk)
+            .order_by('fecha_registro', 'id')
+            .values_list(*[campo for _, campo in self.columnas])
+            .iterator(chunk_size=settings.EXPORTACION_CHUNK)
+            for modelo in (AsistenciaArchivada, Asistencia)
+        )
+        return self.transmitir(filas, formato, f'asistencias_evento_{pk}')
+
+
+class _Eco:
+    # csv.writer escribe en este objeto y devuelve la línea en lugar de guardarla
+    def write(self, valor):
+        return valor
+
+
+# --------------------------
+# Reportes (solo leen los resúmenes de app1.resumenes)
+
+class ReporteAsistenciasView(APIView):
+    permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+
+    def get(self, request):
+        dimension = request.query_params.get('dimension', 'evento')
+        granularidad = request.query_params.get('granularidad', 'dia')
+        if dimension not in dict(ResumenAsistencias.DIMENSIONES):
+            return Response({'error': 'Dimensión no soportada, use evento, punto, ficha o jornada'}, status=400)
+        if granularidad not in dict(ResumenAsistencias.GRANULARIDADES):
+            return Response({'error': 'Granularidad no soportada, use hora o dia'}, status=400)
+        try:
+            desde = _fecha(request.query_params.get('desde'))
+            hasta = _fecha(request.query_params.get('hasta'))
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida: {e}'}, status=400)
+
+        resumenes = ResumenAsistencias.objects.filter(granularidad=granularidad, dimension=dimension)
+        if 'valor' in request.query_params:
+            resumenes = resumenes.filter(valor=request.query_params['valor'])
+        if desde is not None:
+            resumenes = resumenes.filter(periodo__gte=desde)
+        if hasta is not None:
+            resumenes = resumenes.filter(periodo__lt=hasta)
+
+        maximo = settings.RESUMEN_MAXIMO_FILAS
+        filas = list(
+            resumenes.order_by('periodo', 'valor', 'estado', 'metodo')
+            .values_list('periodo', 'valor', 'estado', 'metodo', 'total')[:maximo + 1]
+        )
+        if len(filas) > maximo:
+            return Response({'error': f'El reporte supera {maximo} filas, acote el rango de fechas o el valor'}, status=400)
+
+        return Response({
+            'dimension': dimension,
+            'granularidad': granularidad,
+            'resultados': [
+                {'periodo': timezone.localtime(periodo), 'valor': valor, 'estado': estado, 'metodo': metodo, 'total': total}
+                for periodo, valor, estado, metodo, total in filas
+            ],
+        })
 
 
 # --------------------------
@@ -287,41 +714,160 @@ class GenerarQRView(APIView):
         except Evento.DoesNotExist:
             return Response({'error': 'Evento no encontrado'}, status=404)
 
-        if QR.objects.filter(usuario=usuario, evento=evento).exists():
+        try:
+            with transaction.atomic():
+                qr = QR.objects.create(
+                    usuario=usuario,
+                    evento=evento,
+                    codigo=qr_firmado.emitir(usuario.pk, evento.pk)
+                )
+        except IntegrityError:
+            # La restricción qr_unico_por_evento resuelve dos peticiones simultáneas
             return Response({'mensaje': 'QR ya generado para este evento'}, status=400)
-
-        qr = QR.objects.create(
-            usuario=usuario,
-            evento=evento,
-            codigo=str(uuid.uuid4())
-        )
         serializer = QRSerializer(qr)
         return Response(serializer.data, status=201)
 
 
+class GenerarQRsEventoView(_ExportacionMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    columnas = [
+        ('documento', 'usuario__documento'),
+        ('nombre', 'usuario__nombre'),
+        ('apellido', 'usuario__apellido'),
+        ('ficha', 'usuario__ficha'),
+        ('jornada', 'usuario__jornada'),
+        ('codigo', 'codigo'),
+        ('nuevo', 'nuevo'),
+        ('vigente', 'vigente'),
+    ]
+
+    def post(self, request, pk):
+        try:
+            evento = Evento.objects.get(pk=pk)
+        except Evento.DoesNotExist:
+            return Response({'error': 'Evento no encontrado'}, status=404)
+
+        formato = request.data.get('formato', 'csv')
+        if formato not in self.formatos:
+            return Response({'error': 'Formato no soportado, use csv o ndjson'}, status=400)
+        filtros = {}
+        for nombre, campo in (('fichas', 'ficha'), ('jornadas', 'jornada'), ('roles', 'rol')):
+            valores = request.data.get(nombre)
+            if valores is None:
+                continue
+            if not isinstance(valores, list) or not valores:
+                return Response({'error': f'{nombre} debe ser una lista no vacía'}, status=400)
+            opciones = User._meta.get_field(campo).choices
+            if opciones and not set(valores) <= {valor for valor, _ in opciones}:
+                return Response({'error': f'{nombre} contiene valores no válidos'}, status=400)
+            filtros[nombre] = valores
+
+        elegibles = cierre_eventos.participantes(
+            evento, filtros.get('fichas'), filtros.get('roles', cierre_eventos.ROLES), filtros.get('jornadas'),
+        )
+        inicio = timezone.now()
+        creados = generacion_qr.generar(evento, elegibles)
+
+        # Manifiesto de todos los elegibles con su QR; nuevo = insertado por esta operación (los
+        # ids que devolvió el INSERT, no la fecha: un QR creado al mismo tiempo por otra petición
+        # no es de esta). Un QR desactivado o expirado no se reemplaza (la restricción
+        # qr_unico_por_evento lo impide): sale con vigente = False para que no se entregue como válido
+        vigente = Q(activo=True) & (Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gt=inicio))
+        campos = [campo for _, campo in self.columnas]
+        posicion = campos.index('nuevo')
+        consulta = (
+            QR.objects.filter(evento=evento, usuario__in=elegibles)
+            .annotate(vigente=ExpressionWrapper(vigente, output_field=BooleanField()))
+            .order_by('usuario__ficha', 'usuario__apellido', 'usuario_id')
+            .values_list('pk', *(campo for campo in campos if campo != 'nuevo'))
+            .iterator(chunk_size=settings.EXPORTACION_CHUNK)
+        )
+        filas = ((*fila[1:posicion + 1], fila[0] in creados, *fila[posicion + 1:]) for fila in consulta)
+        response = self.transmitir(filas, formato, f'qr_evento_{pk}', status=status.HTTP_201_CREATED)
+        response['X-QR-Creados'] = str(len(creados))
+        return response
+
+
 class GetQRsView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
+    ordering = ('id',)
 
+    @method_decorator(etag(lambda request: versiones.etag(request, versiones.qrs(request.user.pk))))
     def get(self, request):
-        qrs = QR.objects.filter(usuario=request.user)
-        serializer = QRSerializer(qrs, many=True)
-        return Response(serializer.data, status=200)
+        paginator = KeysetPagination()
+        qrs = paginator.paginate_queryset(qr_listado.valores(QR.objects.filter(usuario=request.user)), request, view=self)
+        return paginator.get_paginated_response(qr_listado.serializar(qrs))
+
+
+class ImagenQRView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        # Redirige a la URL inmutable de la imagen; el cliente puede guardarla y no volver aquí
+        formato = request.query_params.get('formato', 'svg')
+        if formato not in imagenes_qr.FORMATOS:
+            return Response({'error': 'Formato no soportado, use svg o png'}, status=400)
+        codigo = QR.objects.filter(pk=pk, usuario=request.user).values_list('codigo', flat=True).first()
+        if codigo is None:
+            return Response({'error': 'QR no encontrado'}, status=404)
+        imagenes_qr.generar(codigo, formato)
+        return HttpResponseRedirect(reverse('archivo_imagen_qr', kwargs={
+            'pk': pk, 'huella': imagenes_qr.huella(codigo, formato), 'formato': formato,
+        }))
+
+
+class ArchivoImagenQRView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, huella, formato):
+        # La huella identifica el contenido: si el archivo existe basta con leerlo
+        if formato not in imagenes_qr.FORMATOS or not imagenes_qr.es_huella(huella):
+            return Response({'error': 'Imagen no encontrada'}, status=404)
+        no_modificada = get_conditional_response(request, etag=f'"{huella}"')
+        if no_modificada is not None:
+            return no_modificada
+        try:
+            archivo = open(imagenes_qr.ruta(huella, formato), 'rb')
+        except FileNotFoundError:
+            # Nunca generada aquí, o borrada por una limpieza del directorio
+            codigo = QR.objects.filter(pk=pk).values_list('codigo', flat=True).first()
+            if codigo is None or imagenes_qr.huella(codigo, formato) != huella:
+                return Response({'error': 'Imagen no encontrada'}, status=404)
+            archivo = imagenes_qr.abrir(codigo, formato)
+
+        response = FileResponse(archivo, content_type=imagenes_qr.FORMATOS[formato])
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        response['ETag'] = f'"{huella}"'
+        return response
 
 
 # --------------------------
-# Usuarios
+# Escáneres sin conexión
 
-class GetUsersView(APIView):
+class SincronizarView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        usuarios = User.objects.all()
-        serializer = UserSerializer(usuarios, many=True)
-        return Response(serializer.data, status=200)
+        # ?eventos=1,2 sin cursor: códigos válidos y padrón completos; con ?cursor= solo los cambios
+        eventos = [_entero(valor) for valor in request.query_params.get('eventos', '').split(',') if valor]
+        if not eventos or None in eventos:
+            return Response({'error': 'eventos debe ser una lista de ids separados por coma'}, status=400)
+        if len(set(eventos)) > settings.SYNC_MAXIMO_EVENTOS:
+            return Response({'error': f'Máximo {settings.SYNC_MAXIMO_EVENTOS} eventos por escáner'}, status=400)
+        try:
+            datos = sincronizacion.sincronizar(sorted(set(eventos)), request.query_params.get('cursor'))
+        except sincronizacion.CursorInvalido:
+            return Response({'error': 'Cursor inválido'}, status=400)
+        return Response(datos)
 
 
+# --------------------------
+# Usuarios
+
 class GetUserByDocumentoView(APIView):
     permission_classes = [IsAuthenticated]
+    lectura_en_replica = True  # app1.routers
 
     def get(self, request, documento):
         try:
@@ -329,4 +875,5 @@ class GetUserByDocumentoView(APIView):
             serializer = UserSerializer(usuario)
             return Response(serializer.data, status=200)
         except User.DoesNotExist:
-            return Response({'error': 'Usuario no encontrado'}, status=404)
\ No newline at end of file
+            return Response({'error': 'Usuario no encontrado'}, status=404)
+
@@ -0,0 +1,162 @@
+import json
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .authentication import aautenticar, ausuario_completo
+from .serializers import UserSerializer, AsistenciaSerializer
+from .models import PuntoDeControl
+from . import geolocalizacion, registro_asistencias, validacion_qr, versiones
+
+
+# --------------------------
+# Vistas asíncronas (ASGI)
+#
+# Mismo contrato que las vistas de DRF equivalentes, sin la pila síncrona de DRF. No
+# evitan el pool de hilos de asgiref: las APIs asíncronas del ORM y de las caches de
+# Django (LocMemCache incluida) son sync_to_async por dentro, igual que el INSERT de la
+# asistencia. Lo que cambia es que la petición solo ocupa un hilo mientras corre cada
+# consulta, no mientras espera entre una y otra; el índice de puntos GPS, que vive en
+# memoria del proceso, es lo único que se resuelve sin salir del event loop.
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _datos(request):
+    if request.content_type == 'application/json':
+        try:
+            datos = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return datos if isinstance(datos, dict) else None
+    return request.POST
+
+
+class VistaAutenticadaAsync(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Autenticación por JWT como en APIView: no hay cookie de sesión que proteger con CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            usuario = await aautenticar(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            detalle = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detalle, status=status.HTTP_401_UNAUTHORIZED)
+        if usuario is None:
+            return JsonResponse(
+                {'detail': 'Las credenciales de autenticación no se proveyeron.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        request.user = usuario
+        return await super().dispatch(request, *args, **kwargs)
+
+
+# --------------------------
+# Usuarios
+
+class PerfilUsuarioAsyncView(VistaAutenticadaAsync):
+    async def get(self, request):
+        etag = await versiones.aetag(request, versiones.usuario(request.user.pk))
+        no_modificado = get_conditional_response(request, etag=f'"{etag}"')
+        if no_modificado is not None:
+            no_modificado.headers['ETag'] = f'"{etag}"'
+            return no_modificado
+        serializer = UserSerializer(await ausuario_completo(request.user))
+        respuesta = JsonResponse(serializer.data, status=status.HTTP_200_OK)
+        respuesta.headers['ETag'] = f'"{etag}"'
+        return respuesta
+
+
+# --------------------------
+# QR
+
+class ValidarQRAsyncView(VistaAutenticadaAsync):
+    async def post(self, request):
+        datos = _datos(request)
+        if datos is None:
+            return JsonResponse({'error': 'Cuerpo JSON inválido'}, status=400)
+        evento_id = _entero(datos.get('evento_id'))
+        if await validacion_qr.aobtener_evento(evento_id) is None:
+            return JsonResponse({'error': 'Evento no encontrado'}, status=404)
+        qr = await validacion_qr.avalidar_qr(datos.get('codigo_qr'), evento_id)
+        if qr is None:
+            return JsonResponse({'valido': False}, status=status.HTTP_200_OK)
+        return JsonResponse({
+            'valido': True,
+            'usuario': qr['usuario_id'],
+            'evento': qr['evento_id'],
+            'punto': qr['punto_id'],
+        }, status=status.HTTP_200_OK)
+
+
+# --------------------------
+# Asistencias
+
+class RegistrarAsistenciaAsyncView(VistaAutenticadaAsync):
+    async def post(self, request):
+        datos = _datos(request)
+        if datos is None:
+            return JsonResponse({'error': 'Cuerpo JSON inválido'}, status=400)
+        evento_id = _entero(datos.get('evento_id'))
+        punto_id = _entero(datos.get('punto_id'))
+        metodo = datos.get('metodo')
+        estado = datos.get('estado')
+        clave = request.headers.get('Idempotency-Key') or datos.get('clave_idempotencia')
+        usuario = request.user
+
+        if evento_id is None:
+            return JsonResponse({'error': 'Evento no encontrado'}, status=404)
+        error = registro_asistencias.validar(metodo, estado, clave)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        repetida = await registro_asistencias.abuscar_en_ventana(usuario.pk, evento_id, punto_id, clave)
+        if repetida is not None:
+            return JsonResponse(repetida, status=status.HTTP_200_OK)
+
+        evento = await validacion_qr.aobtener_evento(evento_id)
+        if evento is None:
+            return JsonResponse({'error': 'Evento no encontrado'}, status=404)
+
+        if metodo == 'qr':
+            if await validacion_qr.avalidar_qr(datos.get('codigo_qr'), evento_id) is None:
+                return JsonResponse({'error': 'Código QR no válido para este evento'}, status=400)
+        elif metodo == 'gps':
+            try:
+                latitud = float(datos.get('latitud'))
+                longitud = float(datos.get('longitud'))
+                if not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+                    raise ValueError
+            except (TypeError, ValueError):
+                return JsonResponse({'error': 'Coordenadas inválidas'}, status=400)
+            punto = await geolocalizacion.apunto_cercano(evento_id, latitud, longitud)
+            if punto is None:
+                return JsonResponse(
+                    {'error': f'No hay un punto de control del evento a menos de {settings.GPS_RADIO_METROS} m'},
+                    status=400,
+                )
+            punto_id = punto['id']
+
+        try:
+            asistencia, creada = await registro_asistencias.aregistrar(usuario.pk, evento_id, metodo, estado, punto_id, clave)
+        except IntegrityError:
+            # Las repetidas no fallan (ON CONFLICT DO NOTHING): solo la FK del punto se explica aquí
+            if punto_id is None or await PuntoDeControl.objects.filter(pk=punto_id).aexists():
+                raise
+            return JsonResponse({'error': 'Punto de control no válido'}, status=400)
+
+        serializer = AsistenciaSerializer(asistencia)
+        await registro_asistencias.aguardar_en_ventana(serializer.data, clave)
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED if creada else status.HTTP_200_OK)
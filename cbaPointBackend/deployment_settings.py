@@ -9,9 +9,13 @@ CSRF_TRUSTED_ORIGINS = ['https://' + os.environ.get('RENDER_EXTERNAL_HOSTNAME')]
 
 DEBUG = False
 SECRET_KEY = os.environ.get('SECRET_KEY')
+# settings.py tomó la SECRET_KEY de desarrollo: las claves de los QR se arman de nuevo
+QR_FIRMA_CLAVES = {'1': os.environ.get('QR_FIRMA_CLAVE') or SECRET_KEY}
 
 
 MIDDLEWARE = [
+    'app1.middleware.InstrumentacionMiddleware',  # Server-Timing y métricas de /api/*
+    'app1.middleware.ReplicaMiddleware',  # Lecturas de listados y reportes en réplicas (app1.routers)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Agrega WhiteNoise aquí
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -43,4 +47,16 @@ DATABASES = {
         default=os.environ['DATABASE_URL'],
         conn_max_age=600
     )
-}
\ No newline at end of file
+}
+
+# Réplicas de lectura: DATABASE_REPLICA_URLS=postgres://...,postgres://...
+for numero, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{numero}'] = {**dj_database_url.parse(url, conn_max_age=600), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# La fijación en la primaria tiene que valer en todos los workers (app1.routers.comprobar_cache)
+if os.environ.get('REDIS_URL'):
+    CACHES['replicas'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
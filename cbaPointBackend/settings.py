@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app1.middleware.InstrumentacionMiddleware',  # Server-Timing y métricas de /api/*
+    'app1.middleware.ReplicaMiddleware',  # Lecturas de listados y reportes en réplicas (app1.routers)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +93,66 @@ DATABASES = {
     }
 }
 
+# Réplicas de lectura (app1.routers): cualquier alias además de 'default' es una copia de
+# solo lectura. DATABASE_REPLICA_LOCAL=1 agrega una segunda conexión a la misma base para
+# probar el enrutamiento en local. Las pruebas usan cbaPointBackend.test_settings
+if os.environ.get('DATABASE_REPLICA_LOCAL'):
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['app1.routers.ReplicaRouter']
+REPLICA_LAG_MAXIMO = 5  # Segundos de retraso a partir de los cuales una réplica deja de recibir lecturas
+REPLICA_LAG_INTERVALO = 5  # Segundos entre mediciones del retraso de cada réplica (por proceso)
+REPLICA_FIJAR_SEGUNDOS = 15  # Lecturas en la primaria tras una escritura; mayor que LAG_MAXIMO + LAG_INTERVALO
+# Tiene que ser compartida entre workers (Redis, Memcached) para que la fijación valga en todos;
+# con DEBUG = False la aplicación no arranca con réplicas y una cache de un solo proceso
+REPLICA_CACHE = 'replicas'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Códigos QR y eventos en curso para validar escaneos sin consultar la base de datos
+    'qr': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'qr-validacion',
+        'TIMEOUT': 300,  # Segundos que una entrada puede estar desactualizada en otros workers
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    # Fijación en la primaria tras una escritura (REPLICA_CACHE). En local basta la memoria
+    # del proceso; deployment_settings usa Redis
+    'replicas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'replicas',
+    },
+}
+
+QR_CACHE_ALIAS = 'qr'
+
+# Códigos QR firmados (app1.qr_firmado). El secreto viene de QR_FIRMA_CLAVE; con DEBUG = False
+# la aplicación no arranca si alguna clave falta o es una clave django-insecure-* de desarrollo
+QR_FIRMA_CLAVES = {'1': os.environ.get('QR_FIRMA_CLAVE', SECRET_KEY)}  # id de clave -> secreto; para rotar se agrega una clave nueva
+QR_FIRMA_CLAVE_ACTUAL = '1'  # Clave con la que se firman los códigos nuevos
+QR_FIRMA_RETIRO = {}  # id de clave anterior -> fecha ISO hasta la que se aceptan sus códigos
+QR_FIRMA_REVOCACION = False  # Si es True, un código firmado además debe existir y estar activo en la tabla QR
+
+# Imágenes de QR generadas en el servidor (app1.imagenes_qr)
+QR_IMAGENES_DIR = BASE_DIR / 'qr_imagenes'  # Cache en disco; se puede borrar en cualquier momento
+QR_IMAGEN_ESCALA = 8  # Píxeles por módulo en PNG (y unidades por módulo en SVG)
+QR_IMAGENES_PROCESOS = None  # Procesos de precalentar_imagenes_qr; None usa todos los núcleos
+
+
+# Verificación de contraseñas en el login (app1.verificacion_login)
+
+LOGIN_HILOS = 2  # Contraseñas verificadas en paralelo por proceso
+LOGIN_MAX_PENDIENTES = 8  # Logins que pueden esperar turno antes de responder 503
+LOGIN_TIMEOUT = 5  # Segundos máximos de espera por una verificación
+LOGIN_RETRY_AFTER = 2  # Valor de la cabecera Retry-After en las respuestas 503
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,11 +205,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Usuario en cache con TTL corto; 'app1.authentication.JWTClaimsAuthentication'
+        # evita también la cache y confía en los claims firmados del token
+        'app1.authentication.JWTCacheAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'app1.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,  # Tamaño de página por defecto de los listados (app1.pagination)
 }
 
 AUTHENTICATION_BACKENDS = [
@@ -162,4 +229,51 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,  # Si se deben eliminar los refresh tokens viejos
     'ALGORITHM': 'HS256',  # Algoritmo de encriptación
     'SIGNING_KEY': 'your_secret_key',  # Cambia esto por una clave secreta más segura
-}
\ No newline at end of file
+}
+
+AUTENTICACION_CACHE = 'default'  # Cache de usuarios autenticados (app1.authentication)
+AUTENTICACION_CACHE_TTL = 60  # Segundos máximos que un usuario editado o desactivado puede seguir en cache
+
+# --------------------------
+# Asistencias
+
+ASISTENCIAS_LOTE_MAXIMO = 1000  # Máximo de escaneos aceptados por petición en el registro por lote
+EXPORTACION_CHUNK = 2000  # Filas leídas por bloque al exportar asistencias
+ASISTENCIAS_VENTANA_SEGUNDOS = 30  # Escaneos repetidos dentro de esta ventana se responden desde memoria
+ASISTENCIAS_VENTANA_CACHE = 'default'  # Alias de CACHES donde se guarda esa ventana
+GPS_RADIO_METROS = 50  # Distancia máxima a un punto de control para registrar por GPS
+GPS_INDICE_TTL = 60  # Segundos antes de reconstruir el índice de puntos de un evento
+CIERRE_CHUNK = 5000  # Participantes por INSERT al registrar las ausencias de un evento cerrado
+GENERACION_QR_CHUNK = 1000  # QR por INSERT en la generación masiva de un evento
+ARCHIVO_CHUNK = 5000  # Asistencias movidas al archivo por transacción (comando archivar_asistencias)
+
+
+# --------------------------
+# Importación masiva de usuarios
+
+IMPORTACION_PROCESOS = 2  # Procesos del pool, compartido por las importaciones por HTTP, que hashea contraseñas
+IMPORTACION_CHUNK = 1000  # Filas por INSERT al crear usuarios y QR
+
+
+# --------------------------
+# Instrumentación
+
+INSTRUMENTACION_MUESTREO = 1.0  # Fracción de peticiones a /api/* que se miden (0 desactiva)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')  # /api/metricas/ acepta "Authorization: Bearer <token>" o un JWT Administrativo
+
+
+# --------------------------
+# Resúmenes de asistencia (comando actualizar_resumenes)
+
+RESUMEN_CHUNK = 10000  # Asistencias sumadas por transacción
+RESUMEN_MARGEN_SEGUNDOS = 60  # Asistencias más recientes que esto esperan a la siguiente corrida
+RESUMEN_MAXIMO_FILAS = 5000  # Filas máximas que devuelve /api/reportes/asistencias/
+
+
+# --------------------------
+# Sincronización de escáneres sin conexión (/api/sync/)
+
+SYNC_MAXIMO_EVENTOS = 20  # Eventos por escáner
+SYNC_MAXIMO_CAMBIOS = 5000  # Con más cambios pendientes se envía otra vez la respuesta completa
+SYNC_MARGEN_SEGUNDOS = 30  # Los cambios más recientes que esto se repiten en la siguiente sincronización
+SYNC_RETENCION_DIAS = 30  # Antigüedad de CambioSync que borra purgar_cambios_sync; cursores más viejos reciben todo
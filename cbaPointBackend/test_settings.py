@@ -0,0 +1,9 @@
+from .settings import *
+
+# python manage.py test --settings=cbaPointBackend.test_settings
+#
+# Segunda conexión a la base de pruebas de 'default' para app1.tests.ReplicasLecturaTests.
+# Ninguna vista lee de ella salvo en esas pruebas (override_settings de DATABASE_REPLICAS):
+# las demás corren dentro de una transacción que otra conexión no ve
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = []